@@ -6,11 +6,13 @@
 from framework.controller import *
 import framework.util as util
 import giveaminute.user as mUser
+import giveaminute.homepage as mHomepage
 import giveaminute.idea as mIdea
 import giveaminute.project as mProject
 import giveaminute.metrics as mMetrics
 import giveaminute.projectResource as mProjectResource
 import giveaminute.messaging as mMessaging
+import helpers.censor
 import json
 
 class Admin(Controller):
@@ -223,7 +225,10 @@ class Admin(Controller):
             else:
                 ordinal = None
 
-            return mProject.featureProject(self.db, featuredProjectId, ordinal)
+            isFeatured = mProject.featureProject(self.db, featuredProjectId, ordinal)
+            mHomepage.expireHomepageData()
+
+            return isFeatured
 
     def unfeatureProject(self):
         unfeaturedProjectId = self.request('project_id')
@@ -232,7 +237,10 @@ class Admin(Controller):
             log.error("*** unfeature project submitted w/o project id")
             return False
         else:
-            return mProject.unfeatureProject(self.db, unfeaturedProjectId)
+            ordinal = mProject.unfeatureProject(self.db, unfeaturedProjectId)
+            mHomepage.expireHomepageData()
+
+            return ordinal
 
     def getFlaggedProjects(self):
         sql = """select p.title as project_title,
@@ -401,6 +409,7 @@ class Admin(Controller):
                             where = "homepage_question_id = $id", 
                             is_active = 0, 
                             vars = {'id': id})
+            mHomepage.expireHomepageData()
             return True
         except Exception, e:
             log.info("*** there was a problem deleting homepage question id = %s" % id)
@@ -417,6 +426,7 @@ class Admin(Controller):
                             where = "homepage_question_id = $id", 
                             question = q, 
                             vars = {'id': id})
+            mHomepage.expireHomepageData()
             return True
         except Exception, e:
             log.info("*** there was a problem updating homepage question id = %s" % id)
@@ -435,6 +445,7 @@ class Admin(Controller):
                             where = "homepage_question_id = $id", 
                             is_featured = 1, 
                             vars = {'id': id})
+            mHomepage.expireHomepageData()
             return True
         except Exception, e:
             log.info("*** there was a problem featuring homepage question id = %s" % id)
@@ -561,7 +572,12 @@ class Admin(Controller):
         userId = self.request('user_id')
         userGroupId = self.request('role')
 
-        return mUser.assignUserToGroup(self.db, userId, userGroupId)
+        isAssigned = mUser.assignUserToGroup(self.db, userId, userGroupId)
+
+        if (isAssigned):
+            self.expireUser(userId)
+
+        return isAssigned
 
     def setUserOncall(self):
         userId = self.request('user_id')
@@ -605,6 +621,9 @@ class Admin(Controller):
             self.deleteItemsByUser('project_message', userId)
             self.deleteItemsByUser('idea', userId)
 
+            self.expireUser(userId)
+            mHomepage.expireHomepageData()
+
             # email deleted user
 # TODO: temporarily commenting out because the only place this currently gets sent from is deletion of admins
 #             u = mUser.User(self.db, userId)
@@ -629,7 +648,12 @@ class Admin(Controller):
             log.error("*** delete item attempted w/o id for table = %s" % table)
             return False
         else:
-            return mProject.deleteItem(self.db, table, id)
+            isDeleted = mProject.deleteItem(self.db, table, id)
+
+            if (isDeleted and table in ('idea', 'project')):
+                mHomepage.expireHomepageData()
+
+            return isDeleted
 
     def deleteItemsByUser(self, table, userId):
         if (not userId):
@@ -684,6 +708,10 @@ class Admin(Controller):
             self.db.update('badwords', where = "id = 1",
                                 kill_words = newBlacklist,
                                 warn_words = newGraylist)
+
+            # recompile the badword matcher with the new lists
+            helpers.censor.invalidate()
+
             return True
         except Exception, e:
             log.info("*** couldn't update blacklist")
@@ -3,11 +3,15 @@
     :license: Affero GNU GPL v3, see LICENSE for more details.
 """
 
+import giveaminute.homepage as mHomepage
 import giveaminute.keywords as keywords
 import giveaminute.project as mProject
 import giveaminute.projectResource as mProjectResource
 import giveaminute.location as mLocation
+import os
 import framework.util as util
+import framework.image_pipeline as image_pipeline
+import framework.media_tasks as media_tasks
 from framework.controller import *
 from framework.image_server import *
 from framework.file_server import FileServer, S3FileServer
@@ -25,6 +29,8 @@ class CreateProject(Controller):
             return self.getSimilarProjectsJSON()
         elif (action == 'resources'):
             return self.getSimilarResourcesJSON()
+        elif (action == 'attachment'):
+            return self.getPendingAttachmentThumb()
         else:
             locations_data = mLocation.getSimpleLocationDictionary(self.db)
             locations = dict(json = json.dumps(locations_data), data = locations_data)
@@ -64,6 +70,9 @@ class CreateProject(Controller):
                 mProject.addResourceToProject(self.db, projectId, resourceId)
 
             if (projectId):
+                self.expireUser()
+                mHomepage.expireHomepageData()
+
                 return projectId
             else:
                 log.error("*** couldn't create project")
@@ -152,7 +161,7 @@ class CreateProject(Controller):
         else:
             data = web.data()
 
-        imageId = ImageServer.add(self.db, data, 'giveaminute', [100, 100])
+        imageId = ImageServer.add(self.db, data, 'giveaminute', [100, 100], defer=True)
 
         return imageId
 
@@ -185,74 +194,74 @@ class CreateProject(Controller):
         # Determine whether it's an image or another type of file
         media_type = file_info['type'] = self.getFileMediaType(data)
 
-        # Upload the file to the server
-        media_id = file_info['id'] = fs.add(data, file_name, make_unique=True)
+        # Store the file on the server.  Mirroring it to S3 and making the
+        # thumbnails of an image are left to a media task; until it's done,
+        # the thumbnails are made from the local copy.
+        with image_pipeline.timed('store'):
+            media_id = file_info['id'] = fs.add(data, file_name, make_unique=True, mirror=False)
+            fs.markPending(media_id)
 
-        # If it's an image, upload the thumbnails as well
+        thumbnails = []
         if media_type == 'image':
-            self.saveThumbnailImage(fs, media_type, media_id, data, 'small', self.SMALL_THUMB_SIZE)
-            self.saveThumbnailImage(fs, media_type, media_id, data, 'medium', self.MEDIUM_THUMB_SIZE)
-            self.saveThumbnailImage(fs, media_type, media_id, data, 'large', self.LARGE_THUMB_SIZE)
+            thumbnails = [(mProject.getAttachmentThumbFileName(media_type, media_id, name), size)
+                          for name, size in (('small', self.SMALL_THUMB_SIZE),
+                                             ('medium', self.MEDIUM_THUMB_SIZE),
+                                             ('large', self.LARGE_THUMB_SIZE))]
+        media_tasks.enqueue('file', {'filename': media_id, 'thumbnails': thumbnails})
 
         return file_info
 
 
-    def saveThumbnailImage(self, fs, media_type, media_id, data, name, size):
-        thumb = self.getThumbnailImageData(data, size)
-        thumb_filename = mProject.getAttachmentThumbFileName(media_type, media_id, name)
-
-        if thumb and fs.add(thumb, thumb_filename):
-            log.info("Wrote %s thumbnail image to %s" % (name, thumb_filename))
-        else:
-            log.error("Failed to write %s thumbnail image to %s" % (name, thumb_filename))
-
-
     SMALL_THUMB_SIZE = (100,100)
     MEDIUM_THUMB_SIZE = (240,240)
     LARGE_THUMB_SIZE = (360,360)
 
-    def getThumbnailImageData(self, data, size):
+    def getPendingAttachmentThumb(self):
         """
-        Creates a thumbnail of the given size from the given image data.
-        Return the image data in a string.
+        Controller for the ``/create/attachment`` thumbnail of an image
+        attachment that is waiting for its media task, made from the local
+        copy.  See ``mProject.getAttachmentThumbUrl``.
 
         """
-        from StringIO import StringIO
+        media_id = self.request('media_id') or ''
+        size_name = self.request('size')
+        size = dict(small = self.SMALL_THUMB_SIZE,
+                    medium = self.MEDIUM_THUMB_SIZE,
+                    large = self.LARGE_THUMB_SIZE).get(size_name)
 
-        # Try to open the image
-        try:
-            read_buffer = StringIO(data)
-            img = Image.open(read_buffer)
-            img_format = img.format
-            write_buffer = StringIO()
-        except IOError, e:
-            log.error('*** Error while opening image data: %s' % e)
-            return
-
-        # Try to write the thumbnails
+        if (not media_id or media_id != os.path.basename(media_id) or media_id.startswith('.') or not size):
+            return self.not_found()
+
+        fs = S3FileServer(self.db)
+        data = None
+
+        # The task may have made the thumbnail without having mirrored it.
         try:
-            img.thumbnail(size, Image.ANTIALIAS)
-            img.save(write_buffer, img_format)
-        except IOError, e:
-            log.error('*** Error while saving thumbnail data: %s' %e)
-            return
+            f = open(fs.getLocalPath(mProject.getAttachmentThumbFileName('image', media_id, size_name)), 'rb')
+            data = f.read()
+            f.close()
+        except IOError:
+            try:
+                f = open(fs.getLocalPath(media_id), 'rb')
+                image = image_pipeline.decode(f.read(), size)
+                f.close()
+                data = fs.getThumbnailData(image, size)
+            except Exception, e:
+                log.info("*** couldn't make thumbnail of attachment %s" % media_id)
+                log.error(e)
 
-        return write_buffer.getvalue()
+        if data is None:
+            return self.redirect(mProject.getAttachmentThumbUrl('file', media_id, size_name))
 
+        return self.temp_image(data, image_pipeline.content_type(data))
 
     def getFileMediaType(self, data):
         """
         Determine whether the file is an image or some other type of file.
 
         """
-        try:
-            # If we can open it with the PIL, it's an image.
-            file_buffer = StringIO(data)
-            img = Image.open(file_buffer)
-            return 'image'
-
-        except IOError:
-            return 'file'
+        # If the PIL can read its header, it's an image.
+        return 'image' if image_pipeline.identify(data) else 'file'
 
 
     def getThumbUrl(self, media_type, media_id, max_width=None, max_height=None):
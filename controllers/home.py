@@ -5,6 +5,7 @@
 
 from framework.controller import *
 from framework.config import Config
+import giveaminute.homepage as mHomepage
 import giveaminute.location as mLocation
 import giveaminute.user as mUser
 import giveaminute.project as mProject
@@ -34,7 +35,7 @@ class Home(Controller):
         project_user = dict(is_member = True,
                               is_project_admin = True)
         self.template_data['project_user'] = dict(data = project_user, json = json.dumps(project_user))
-        self.template_data['homepage_question'] = self.getHomepageQuestion()
+        self.template_data['homepage_question'] = mHomepage.getHomepageQuestion(self.db)
 
         if (not action or action == 'home'):
             return self.showHome()
@@ -135,37 +136,27 @@ class Home(Controller):
 
     def showHome(self):
         """
-        Sets up template data and renders homepage template.
+        Sets up template data and renders homepage template.  The data comes
+        from the homepage bundle, which is refreshed in the background.
 
         """
-        homepage = Config.get('homepage')
-        features = Config.get('features')
+        homepage = mHomepage.getHomepageData(self.db)
 
-        locationData = mLocation.getSimpleLocationDictionary(self.db)
-        allIdeasData = mIdea.getMostRecentIdeas(self.db, homepage['num_recent_ideas']);
-
-        locations = dict(data = locationData, json = json.dumps(locationData))
-        allIdeas = dict(data = allIdeasData, json = json.dumps(allIdeasData))
-
-        news = self.getNewsItems()
+        locations = dict(data = homepage['locations'], json = json.dumps(homepage['locations']))
+        allIdeas = dict(data = homepage['all_ideas'], json = json.dumps(homepage['all_ideas']))
 
-        if (bool(features.get('is_display_leaderboard'))):
-            leaderboardProjects = mProject.getLeaderboardProjects(self.db, 6)
-            self.template_data['leaderboard'] = leaderboardProjects
+        if (homepage['leaderboard'] is not None):
+            self.template_data['leaderboard'] = homepage['leaderboard']
 
-        if (bool(features.get('is_display_featured_projects'))):
-            featuredProjects = mProject.getFeaturedProjects(self.db, 6)
-            self.template_data['featured_projects'] = featuredProjects
+        if (homepage['featured_projects'] is not None):
+            self.template_data['featured_projects'] = homepage['featured_projects']
 
-        if (bool(features.get('is_community_leaders_displayed'))):
-            community_leaders = self.orm.query(models.CommunityLeader) \
-                .order_by('`order`') \
-                .all()
-            self.template_data['community_leaders'] = community_leaders
+        if (homepage['community_leaders'] is not None):
+            self.template_data['community_leaders'] = homepage['community_leaders']
 
         self.template_data['locations'] = locations
         self.template_data['all_ideas'] = allIdeas
-        self.template_data['news'] = news
+        self.template_data['news'] = homepage['news']
 
         return self.render('home', {'locations':locations, 'all_ideas':allIdeas})
 
@@ -501,37 +492,6 @@ class Home(Controller):
 
         return True
 
-    def getNewsItems(self):
-        data = []
-        feedUrl = Config.get('blog_host_feed')
-        if (feedUrl):
-            try:
-                # BUGFIX: couldn't parse json from production blog, hence the string conversion
-                # eholda 2011-06-19
-                raw = urllib2.urlopen(feedUrl, timeout = 1)
-                data = json.loads(raw.read())
-                raw.close()
-            except Exception, e:
-                log.info("*** couldn't get feed for news items at %s" % feedUrl)
-                log.error(e)
-
-        return data
-        
-    def getHomepageQuestion(self):
-        q = None
-    
-        if (Config.get('homepage').get('is_question_from_cms')):
-            sql = "select question from homepage_question where is_active = 1 and is_featured = 1"
-            data = list(self.db.query(sql))
-            
-            if (len(data) == 1):
-                q = data[0].question
-                
-        if (not q):
-            q = Config.get('homepage').get('question')
-            
-        return q
-
     def submitFeedback(self):
         name = self.request('name')
         email = self.request('email')
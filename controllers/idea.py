@@ -3,6 +3,7 @@
     :license: Affero GNU GPL v3, see LICENSE for more details.
 """
 
+import giveaminute.homepage as mHomepage
 import giveaminute.idea as mIdea
 import giveaminute.keywords as mKeywords
 import giveaminute.project as mProject
@@ -43,6 +44,7 @@ class Idea(Controller):
         ideaId = mIdea.createIdea(self.db, description, locationId, 'web', userId, email)
         
         if (ideaId):
+            mHomepage.expireHomepageData()
             mMessaging.emailIdeaConfirmation(email, Config.get('email').get('from_address'), locationId)
 
             return ideaId
@@ -72,7 +74,10 @@ class Idea(Controller):
                     log.warning("*** unauthorized idea removal attempt by user_id = %s" % self.user.id)
                     return False
                 else:
-                    return mIdea.setIdeaIsActive(self.db, ideaId, 0)
+                    isRemoved = mIdea.setIdeaIsActive(self.db, ideaId, 0)
+                    mHomepage.expireHomepageData()
+
+                    return isRemoved
             else:
                 log.error("*** idea does not exist for idea id %s" % ideaId)
         else:
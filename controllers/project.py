@@ -133,7 +133,12 @@ class Project(Controller):
     def showConversationRSS(self, projectId):
         if (projectId):
             project = mProject.Project(self.db, projectId)
-            projDictionary = project.getFullDictionary()
+
+            if (not project.data):
+                return self.not_found()
+
+            # The feed only needs the messages, so skip the full page load.
+            projDictionary = project.getConversationDictionary()
 
             self.template_data['project'] = dict(json = json.dumps(projDictionary), data = projDictionary)
 
@@ -192,6 +197,8 @@ class Project(Controller):
             isJoined = mProject.join(self.db, projectId, self.user.id)
 
             if (isJoined):
+                self.expireUser()
+
                 project = mProject.Project(self.db, projectId)
                 
                 # add a message to the queue about the join
@@ -434,8 +441,9 @@ class Project(Controller):
         limit = util.try_f(int, self.request('n_messages'), 10)
         offset = util.try_f(int, self.request('offset'), 0)
         filterBy = self.request('filter')
+        before = self.request('before')
 
-        return self.json(mProject.getMessages(self.db, projectId, limit, offset, filterBy))
+        return self.json(mProject.getMessages(self.db, projectId, limit, offset, filterBy, before))
 
     def getFeaturedProjects(self):
         # overkill to get the full dictionary, but it's a small admin-only call
@@ -479,13 +487,23 @@ class Project(Controller):
         userId = self.session.user_id
         projectId = self.request('project_id')
 
-        return mProject.removeUserFromProject(self.db, projectId, userId)
+        isRemoved = mProject.removeUserFromProject(self.db, projectId, userId)
+
+        if (isRemoved):
+            self.expireUser(userId)
+
+        return isRemoved
 
     def removeUser(self):
         projectId = self.request('project_id')
         userId = self.request('user_id')
 
-        return mProject.removeUserFromProject(self.db, projectId, userId)
+        isRemoved = mProject.removeUserFromProject(self.db, projectId, userId)
+
+        if (isRemoved):
+            self.expireUser(userId)
+
+        return isRemoved
 
     def updateImage(self):
         projectId = self.request('project_id')
@@ -528,7 +546,9 @@ class Project(Controller):
         if projectUser:
             projectUser.is_project_admin = b
             self.orm.commit()
-            
+
+            self.expireUser(userId)
+
             return True
         else:
             return False
@@ -5,6 +5,7 @@
 
 from framework.controller import *
 import framework.util as util
+import giveaminute.keywords as mKeywords
 import giveaminute.location as mLocation
 import giveaminute.projectResource as mProjectResource
 
@@ -85,6 +86,7 @@ class Resource(Controller):
                                         image_id = image_id,
                                         is_hidden = 1,
                                         contact_user_id = self.user.id)
+            mKeywords.setItemKeywords(self.db, 'project_resource', projectResourceId, keywords)
             
             return True
         except Exception,e:
@@ -15,7 +15,10 @@ from framework.util import safestr
 from framework.util import safeuni
 
 from giveaminute import models
+import giveaminute.stats as mStats
 
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload_all, subqueryload_all
 from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
 
 import jinja2
@@ -161,6 +164,31 @@ def _fields_to_dict(fields):
     return dict([_field_to_tuple(field) for field in fields or ()])
 
 
+# Values that serialize as themselves.
+_PLAIN_TYPES = (int, basestring, float, type(None))
+
+
+class _FieldPlan (object):
+    """
+    How a `Serializer` class serializes one field: the output key, the
+    serializer method that computes the value (if any), and the serializer
+    class for the value.  `plain` is set if that class serializes plain
+    values as themselves, so they needn't go through it.
+    """
+    __slots__ = ('key', 'method', 'serializer', 'plain')
+
+    def __init__(self, key, method, serializer):
+        self.key = key
+        self.method = method
+        self.serializer = serializer
+        self.plain = serializer.serialize.im_func is Serializer.serialize.im_func
+
+
+# Compiled plans, by Serializer class: field name -> _FieldPlan, plus the
+# field list under `None` if the class gives `fields`.
+_field_plans = {}
+
+
 class Serializer(object):
     """
     Converts python objects into plain old native types suitable for
@@ -226,10 +254,42 @@ class Serializer(object):
             fields = set(default + list(include)) - set(exclude)
 
         else:
-            fields = _fields_to_list(self.fields)
+            plans = self.get_field_plans()
+            fields = plans.get(None)
+            if fields is None:
+                fields = plans[None] = _fields_to_list(self.fields)
 
         return fields
 
+    def get_field_plans(self):
+        """
+        Return the compiled field plans for this serializer class.
+        """
+        plans = _field_plans.get(type(self))
+        if plans is None:
+            plans = _field_plans[type(self)] = {}
+        return plans
+
+    def get_field_plan(self, fname):
+        """
+        Return the `_FieldPlan` for a field, compiling it the first time the
+        field is serialized by this serializer class.
+        """
+        plans = self.get_field_plans()
+        plan = plans.get(fname)
+
+        if plan is None:
+            method = None
+            if hasattr(type(self), safestr(fname)):
+                meth = getattr(self, safestr(fname))
+                if inspect.ismethod(meth) and len(inspect.getargspec(meth)[0]) == 2:
+                    method = meth.im_func
+
+            plan = plans[fname] = _FieldPlan(self.serialize_key(fname), method,
+                                             self.get_related_serializer(fname))
+
+        return plan
+
     def get_default_fields(self, obj):
         """
         Return the default list of field names/keys for a model instance/dict.
@@ -281,7 +341,8 @@ class Serializer(object):
         """
         Convert a model field or dict value into a serializable representation.
         """
-        related_serializer = self.get_related_serializer(key)
+        plan = self.get_field_plan(key)
+        related_serializer = plan.serializer
 
         if self.depth is None:
             depth = None
@@ -290,6 +351,9 @@ class Serializer(object):
         else:
             depth = self.depth - 1
 
+        if plan.plain and isinstance(obj, _PLAIN_TYPES):
+            return obj
+
         if any([obj is elem for elem in self.stack]):
             return self.serialize_recursion(obj)
         else:
@@ -319,15 +383,16 @@ class Serializer(object):
         data = {}
 
         fields = self.get_fields(instance)
+        is_container = hasattr(instance, '__contains__')
 
         # serialize each required field
         for fname in fields:
-            if hasattr(self, safestr(fname)):
+            plan = self.get_field_plan(fname)
+
+            if plan.method is not None:
                 # check first for a method 'fname' on self first
-                meth = getattr(self, fname)
-                if inspect.ismethod(meth) and len(inspect.getargspec(meth)[0]) == 2:
-                    obj = meth(instance)
-            elif hasattr(instance, '__contains__') and fname in instance:
+                obj = plan.method(self, instance)
+            elif is_container and fname in instance:
                 # check for a key 'fname' on the instance
                 obj = instance[fname]
             elif hasattr(instance, safestr(fname)):
@@ -336,9 +401,7 @@ class Serializer(object):
             else:
                 continue
 
-            key = self.serialize_key(fname)
-            val = self.serialize_val(fname, obj)
-            data[key] = val
+            data[plan.key] = self.serialize_val(fname, obj)
 
         return data
 
@@ -371,6 +434,11 @@ class Serializer(object):
         Convert any object into a serializable representation.
         """
 
+        # Protected types are passed through as is.
+        # (i.e. Primitives like None, numbers, dates, and Decimals.)
+        if isinstance(obj, _PLAIN_TYPES):
+            return obj
+
         if isinstance(obj, (dict, models.Base)):
             # Model instances & dictionaries
             return self.serialize_model(obj)
@@ -384,15 +452,17 @@ class Serializer(object):
             # bound method
             return self.serialize_func(obj)
 
-        # Protected types are passed through as is.
-        # (i.e. Primitives like None, numbers, dates, and Decimals.)
-        if isinstance(obj, (int, basestring, float)) or obj is None:
-            return obj
-
         # All other values are converted to string.
         return self.serialize_fallback(obj)
 
 
+# Compiled column plans, by model class.
+_column_plans = {}
+
+# Loader options for the strategies named in RestController.eager_loads.
+_eager_strategies = {'joined': joinedload_all, 'subquery': subqueryload_all}
+
+
 class RestController (Controller):
     """
     Base controller for REST endpoints.
@@ -407,6 +477,33 @@ class RestController (Controller):
 
     """
 
+    list_params = ('limit', 'cursor', 'fields')
+    """
+    Request parameters that page through and select fields from the results,
+    rather than filter the model.
+    """
+
+    max_limit = 500
+    """
+    The most instances returned in one page.
+    """
+
+    eager_loads = ()
+    """
+    Relationships that ``instance_to_dict`` follows, loaded along with the
+    instances instead of one query per instance.  A list of
+    ``(path, strategy, fields)``, where ``strategy`` is 'joined' or
+    'subquery'.  The relationship is loaded if any of ``fields`` is selected,
+    or always if ``fields`` is empty.
+    """
+
+    version_column = None
+    """
+    The name of a column that changes whenever an instance does, such as
+    'updated_datetime'.  Given one, GET responses are validated against it
+    before they're built; otherwise their ETag is a hash of the response.
+    """
+
     def get_serializer(self):
         return Serializer()
 
@@ -419,20 +516,94 @@ class RestController (Controller):
     def get_model(self):
         return self.model
 
+    def get_primary_key(self):
+        return self.get_model().__mapper__.primary_key[0]
+
+    def get_selected_fields(self):
+        """
+        Return the set of fields named in the ``fields`` parameter, or None if
+        all fields are wanted.
+        """
+        if not hasattr(self, '_selected_fields'):
+            fields = self.request('fields')
+            self._selected_fields = set(field.strip() for field in fields.split(',')) if fields else None
+        return self._selected_fields
+
+    def wants_field(self, field):
+        fields = self.get_selected_fields()
+        return fields is None or field in fields
+
+    def select_fields(self, data):
+        """
+        Drop the fields that weren't selected from a response dict, or from
+        each dict in a response list.
+        """
+        fields = self.get_selected_fields()
+
+        if fields is None:
+            return data
+        elif isinstance(data, dict):
+            return dict((key, val) for key, val in data.iteritems() if key in fields)
+        elif isinstance(data, list):
+            return [self.select_fields(item) for item in data]
+        else:
+            return data
+
+    def get_eager_options(self):
+        return [_eager_strategies[strategy](path)
+                for path, strategy, fields in self.eager_loads
+                if not fields or any(self.wants_field(field) for field in fields)]
+
+    def get_page_params(self, params):
+        """
+        Return the ``(limit, cursor)`` given in the request parameters, either
+        of which may be None.
+        """
+        limit = params.get('limit')
+        cursor = params.get('cursor')
+
+        try:
+            if limit is not None:
+                limit = min(max(int(limit), 1), self.max_limit)
+            if cursor is not None:
+                cursor = int(cursor)
+        except ValueError:
+            raise BadRequest('limit and cursor must be integers')
+
+        return limit, cursor
+
+    def get_column_plan(self, Model):
+        """
+        Return a list of ``(attribute name, is VARCHAR)`` for the columns of a
+        model class, read from its mapper the first time it's needed.
+        """
+        plan = _column_plans.get(Model)
+
+        if plan is None:
+            columns = Model.__mapper__.columns
+            plan = _column_plans[Model] = [
+                (columnName, str(columns.get(columnName).type).startswith('VARCHAR'))
+                for columnName in columns.keys()]
+
+        return plan
+
     def instance_to_dict(self, row):
         if row is None:
             return None
 
         d = {}
-        for columnName in row.__mapper__.columns.keys():
-            d[columnName] = getattr(row, columnName)
-            try:
-                col = row.__mapper__.columns.get('name')
-                if col and str(col.type).startswith('VARCHAR'):
-                    d[columnName] = jinja2.Markup(d[columnName]).unescape()                
-            except Exception, e:
-                log.debug("Exception decoding field %s: %s" % (columnName, e))
-                
+        for columnName, isVarchar in self.get_column_plan(type(row)):
+            val = getattr(row, columnName)
+
+            # VARCHARs are stored escaped; see dict_to_instance.
+            if isVarchar and val is not None:
+                try:
+                    val = jinja2.Markup(val).unescape()
+                except Exception, e:
+                    log.debug("Exception decoding field %s: %s" % (columnName, e))
+
+            d[columnName] = val
+
         return d
 
     def query_to_list(self, query):
@@ -470,16 +641,34 @@ class RestController (Controller):
         # Get rid of things that start with underscore (_).  Things like jQuery
         # will use this prefix for special variables.  You shouldn't.
         for key, val in kwargs.items():
-            if not key.startswith('_'):
+            if not key.startswith('_') and key not in self.list_params:
                 all_kwargs[key] = val
 
         return all_kwargs
 
+    def get_version(self, verb, *args, **kwargs):
+        """
+        Return ``(etag, last_modified)`` for the response to a GET, if its
+        version can be found without building it, or ``(None, None)``.
+        Overridden by the mixins that know how.
+        """
+        return None, None
+
+    def make_version_etag(self, *parts):
+        """
+        Return an ETag for a version of a response, which also depends on the
+        request and the user (through the access rules).
+        """
+        user_id = self.user.id if self.user else None
+        return self.make_etag(self.__class__.__name__, web.ctx.fullpath, user_id, *parts)
+
     def do_HTTP_verb(self, verb, *args, **kwargs):
         method_handler = getattr(self, verb)
 
         response_data = method_handler(*args, **kwargs)
 
+        response_data = self.select_fields(response_data)
+
         serializer = self.get_serializer()
         response_data = serializer.serialize(response_data)
 
@@ -499,6 +688,10 @@ class RestController (Controller):
         try:
             for verb in allowed_verbs:
                 if hasattr(self, verb):
+                    etag, last_modified = self.get_version(verb, *args, **kwargs)
+                    if (etag or last_modified) and self.not_modified(etag, last_modified):
+                        return ''
+
                     response_data = self.do_HTTP_verb(verb, *args, **kwargs)
                     return self.json(response_data)
 
@@ -552,21 +745,65 @@ class ListInstancesMixin (object):
     Derive from this class to add INDEX functionality to a REST controller.
 
     """
+    def get_version(self, verb, *args, **kwargs):
+        """
+        Version a list by the number of matching instances and the latest
+        value of the ``version_column``, which between them change whenever
+        an instance is added, changed or removed.
+        """
+        if verb != 'REST_INDEX' or self.version_column is None:
+            return super(ListInstancesMixin, self).get_version(verb, *args, **kwargs)
+
+        Model = self.get_model()
+        column = getattr(Model, self.version_column)
+
+        query = self.orm.query(func.count(self.get_primary_key()), func.max(column))
+        model_params = self.get_model_params(**dict(kwargs.items() +
+                                                    (self.parameters() or {}).items()))
+        if model_params:
+            query = query.filter_by(**model_params)
+
+        count, last_modified = query.one()
+        return self.make_version_etag(count, last_modified), last_modified
+
     def REST_INDEX(self, *args, **kwargs):
+        """
+        Lists the matching instances.  Given a ``limit``, they are returned a
+        page at a time in primary key order, and if there may be more, the
+        ``cursor`` for the next page is sent in the X-Next-Cursor header.
+        """
         Model = self.get_model()
         orm = self.orm
 
-        query = orm.query(Model)
+        query = orm.query(Model).options(*self.get_eager_options())
 
         params = self.parameters() or {}
         model_params = self.get_model_params(**dict(kwargs.items() +
                                                     params.items()))
         if model_params:
             query = query.filter_by(**model_params)
-        if hasattr(self, 'ordering'):
-            query = query.order_by(self.ordering)
 
-        return self.query_to_list(query)
+        limit, cursor = self.get_page_params(params)
+
+        if limit is None and cursor is None:
+            if hasattr(self, 'ordering'):
+                query = query.order_by(self.ordering)
+
+            return self.query_to_list(query)
+
+        primary_key = self.get_primary_key()
+        if cursor is not None:
+            query = query.filter(primary_key > cursor)
+        query = query.order_by(primary_key)
+        if limit is not None:
+            query = query.limit(limit)
+
+        instances = query.all()
+        if limit is not None and len(instances) == limit:
+            next_cursor = Model.__mapper__.primary_key_from_instance(instances[-1])[0]
+            web.header('X-Next-Cursor', str(next_cursor))
+
+        return self.query_to_list(instances)
 
 
 class ReadInstanceMixin (object):
@@ -574,11 +811,33 @@ class ReadInstanceMixin (object):
     Derive from this class to add READ functionality to a REST controller.
 
     """
+    def get_version(self, verb, *args, **kwargs):
+        """
+        Version an instance by its ``version_column``, read without loading
+        the rest of it.
+        """
+        if verb != 'REST_READ' or self.version_column is None or not args:
+            return super(ReadInstanceMixin, self).get_version(verb, *args, **kwargs)
+
+        Model = self.get_model()
+        column = getattr(Model, self.version_column)
+
+        query = self.orm.query(column).filter(self.get_primary_key() == args[-1])
+        model_params = self.get_model_params(**kwargs)
+        if model_params:
+            query = query.filter_by(**model_params)
+
+        last_modified = query.scalar()
+        if last_modified is None:
+            return None, None
+
+        return self.make_version_etag(last_modified), last_modified
+
     def REST_READ(self, *args, **kwargs):
         Model = self.get_model()
         orm = self.orm
 
-        query = orm.query(Model)
+        query = orm.query(Model).options(*self.get_eager_options())
         model_params = self.get_model_params(**kwargs)
         if model_params:
             query = query.filter_by(**model_params)
@@ -728,6 +987,8 @@ class NeedModelRestController (RestController):
     model = models.Need
     ordering = models.Need.id
     access_rules = NonProjectAdminReadOnly()
+    eager_loads = (('event', 'joined', ('event', 'display_date', 'display_address')),
+                   ('need_volunteers.member', 'subquery', ('volunteers', 'quantity_committed')))
 
     def user_to_dict(self, user):
         """Convert a user instance in the context of being a need volunteer to
@@ -785,17 +1046,22 @@ class NeedModelRestController (RestController):
         # Use the interbediary model (Volunteer) to get at the volunteering
         # members so that we have access to other properties of the intermediary
         # (like quantity).
-        need_dict['volunteers'] = [
-            self.volunteer_to_dict(need_volunteer)
-            for need_volunteer in need.need_volunteers]
-
-        need_dict['event'] = self.event_to_dict(need.event)
-
-        ddate = need.display_date
-        if ddate:
-            need_dict['display_date'] = ddate
-        need_dict['display_address'] = need.display_address
-        need_dict['quantity_committed'] = need.quantity_committed
+        if self.wants_field('volunteers'):
+            need_dict['volunteers'] = [
+                self.volunteer_to_dict(need_volunteer)
+                for need_volunteer in need.need_volunteers]
+
+        if self.wants_field('event'):
+            need_dict['event'] = self.event_to_dict(need.event)
+
+        if self.wants_field('display_date'):
+            ddate = need.display_date
+            if ddate:
+                need_dict['display_date'] = ddate
+        if self.wants_field('display_address'):
+            need_dict['display_address'] = need.display_address
+        if self.wants_field('quantity_committed'):
+            need_dict['quantity_committed'] = need.quantity_committed
 
         return need_dict
 
@@ -865,6 +1131,35 @@ class NeedVolunteerList (CreateInstanceMixin, RestController):
 class PopularKeywordList (ListInstancesMixin, RestController):
     model = models.Project
     access_rules = DefaultAccess()
+    version_column = 'updated_datetime'
+
+    def get_version(self, verb, *args, **kwargs):
+        """
+        The unfiltered list is versioned by the keyword_stats cache namespace,
+        which is bumped whenever a count changes.
+        """
+        params = self.parameters() or {}
+        model_params = self.get_model_params(**dict(kwargs.items() +
+                                                    params.items()))
+        if model_params:
+            return super(PopularKeywordList, self).get_version(verb, *args, **kwargs)
+
+        version = self.cache.namespace_version(mStats.KEYWORD_STATS_CACHE_NAMESPACE)
+        return self.make_version_etag(version), None
+
+    def REST_INDEX(self, *args, **kwargs):
+        """
+        Lists the ten most used keywords on active projects, from the
+        keyword_stats counts.  If the projects are filtered, the keywords are
+        counted from the matching projects instead.
+        """
+        params = self.parameters() or {}
+        model_params = self.get_model_params(**dict(kwargs.items() +
+                                                    params.items()))
+        if model_params:
+            return super(PopularKeywordList, self).REST_INDEX(*args, **kwargs)
+
+        return mStats.getPopularKeywords(self.db, 10)
 
     def query_to_list(self, query):
         project_list = super(PopularKeywordList, self).query_to_list(query)
@@ -887,6 +1182,7 @@ class PopularKeywordList (ListInstancesMixin, RestController):
 class EventModelRestController (RestController):
     model = models.Event
     access_rules = NonProjectAdminReadOnly()
+    eager_loads = (('needs.need_volunteers.member', 'subquery', ('needs',)),)
 
     def user_to_dict(self, user):
         """Convert a user instance in the context of being a need volunteer to
@@ -932,9 +1228,10 @@ class EventModelRestController (RestController):
 
         event_dict['rsvp_service_name'] = event.rsvp_service_name
 
-        event_dict['needs'] = [
-            self.need_to_dict(need)
-            for need in event.needs]
+        if self.wants_field('needs'):
+            event_dict['needs'] = [
+                self.need_to_dict(need)
+                for need in event.needs]
 
         event_dict['start_year'] = event.start_year
         event_dict['start_month'] = event.start_month
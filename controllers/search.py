@@ -8,6 +8,7 @@ import giveaminute.location as mLocation
 import giveaminute.project as mProject
 import giveaminute.idea as mIdea
 import giveaminute.projectResource as mProjectResource
+import giveaminute.search as mSearch
 from framework.controller import *
 from framework.util import EscapingJSONEncoder
 import json
@@ -29,7 +30,7 @@ class Search(Controller):
         locationData = self.getLocationData()
     
         self.template_data['locations_scored'] = json.dumps(locationData)
-        self.template_data['max_score'] = locationData[0]['score']
+        self.template_data['max_score'] = locationData[0]['score'] if locationData else 0
     
         return self.render('map')
         
@@ -44,55 +45,35 @@ class Search(Controller):
         self.template_data['search_terms'] = self.request('terms')
         self.template_data['search_location_id'] = locationId
         
-        projects = mProject.searchProjects(self.db, terms, locationId, limit, offset)
-        resources = mProjectResource.searchProjectResources(self.db, terms, locationId, limit, offset)
-        ideas = mIdea.searchIdeas(self.db, terms, locationId, limit, offset)
-        
-        results = dict(projects = projects, resources = resources, ideas = ideas)
-        
-        self.template_data['results'] = dict(json = json.dumps(results), data = results)
+        # one query for the results and totals of every kind of item
+        search = mSearch.search(self.db, terms, locationId, limit, offset)
 
-        total_count = dict(projects = mProject.searchProjectsCount(self.db, terms, locationId), 
-                          resources = mProjectResource.searchProjectResourcesCount(self.db, terms, locationId), 
-                          ideas = mIdea.searchIdeasCount(self.db, terms, locationId))
+        results = search['results']
+        self.template_data['results'] = dict(json = json.dumps(results), data = results)
 
+        total_count = search['total_count']
         self.template_data['total_count'] = dict(json = json.dumps(total_count), data = total_count)
         
-        locations_list = mLocation.getSimpleLocationDictionary(self.db)
-        self.template_data['locations'] = dict(json = json.dumps(locations_list), data = locations_list)
-        
         locationData = self.getLocationData()
+
+        # the scored locations are the same as the simple location list, in
+        # location_id order before they're sorted by score
+        locations_list = [{'name':item['name'], 'location_id':item['location_id']}
+                          for item in sorted(locationData, key = lambda k:k['location_id'])]
+        self.template_data['locations'] = dict(json = json.dumps(locations_list), data = locations_list)
         
         self.template_data['locations_scored'] = json.dumps(locationData)
-        self.template_data['max_score'] = locationData[0]['score']
+        self.template_data['max_score'] = locationData[0]['score'] if locationData else 0
         
         return self.render('search')
             
     def getLocationData(self):
-        data = mLocation.getLocationsWithScoring(self.db)
-        
-        locations = []
-        
-        for item in data:
-            score = self.calcScore(item.num_projects, item.num_ideas, item.num_project_resources)
-        
-            locations.append(dict(name = item.name, 
-                                location_id = item.location_id, 
-                                lat = str(item.lat), 
-                                lon = str(item.lon),
-                                n_projects = item.num_projects,
-                                n_ideas = item.num_ideas,
-                                n_resources = item.num_project_resources,
-                                score = score))
-                                
-        sortedLocations = sorted(locations, key = lambda k:k['score'], reverse = True) 
-        
-        return sortedLocations
-        
-    def calcScore(self, numProjects, numIdeas, numResources):
-        score = numProjects + numIdeas + numResources
-        
-        return score 
+        """
+        Returns the locations with their scores, highest first, from the
+        cached location_stats rollup.
+
+        """
+        return mLocation.getScoredLocations(self.db)
         
     def searchProjectsJSON(self):
         terms = self.request('terms').split(',') if self.request('terms') else []
@@ -100,7 +81,7 @@ class Search(Controller):
         offset = int(self.request('offset')) if self.request('offset') else 0
         locationId = self.request('location_id')
         
-        return self.json({'results':mProject.searchProjects(self.db, terms, locationId, limit, offset),
+        return self.json({'results':mSearch.search(self.db, terms, locationId, limit, offset, ['projects'], withCounts = False)['results']['projects'],
                           'total_count':100}, encoder=EscapingJSONEncoder)
         
     def searchProjectResourcesJSON(self):
@@ -109,7 +90,7 @@ class Search(Controller):
         offset = int(self.request('offset')) if self.request('offset') else 0
         locationId = self.request('location_id')
         
-        return self.json({'results':mProjectResource.searchProjectResources(self.db, terms, locationId, limit, offset),
+        return self.json({'results':mSearch.search(self.db, terms, locationId, limit, offset, ['resources'], withCounts = False)['results']['resources'],
                           'total_count':100})
 
     def searchIdeasJSON(self):
@@ -118,7 +99,7 @@ class Search(Controller):
         offset = int(self.request('offset')) if self.request('offset') else 0
         locationId = self.request('location_id')
         
-        return self.json({'results':mIdea.searchIdeas(self.db, terms, locationId, limit, offset),
+        return self.json({'results':mSearch.search(self.db, terms, locationId, limit, offset, ['ideas'], withCounts = False)['results']['ideas'],
                           'total_count':100})
 
 
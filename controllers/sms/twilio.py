@@ -7,6 +7,7 @@ import helpers.sms as sms
 from framework import util
 from framework.controller import *
 import giveaminute.user as mUser
+import giveaminute.homepage as mHomepage
 import giveaminute.idea as mIdea
 import giveaminute.messaging as mMessaging
 
@@ -40,6 +41,7 @@ class Twilio(Controller):
                 return mMessaging.stopSMS(self.db, phone)        
             else:
                 if (mIdea.createIdea(self.db, message, -1, 'sms', userId, None, phone)):
+                    mHomepage.expireHomepageData()
                     mMessaging.sendSMSConfirmation(self.db, phone)
                     
                     return True
@@ -35,7 +35,8 @@ class UserAccount(Controller):
         
     def showAccountPage(self):
         if (self.user and self.user.data):
-            self.user.updateAccountPageVisit()
+            if (self.user.updateAccountPageVisit()):
+                self.expireUser()
                     
             userActivity = self.user.getActivityDictionary()
             locations = mLocation.getSimpleLocationDictionary(self.db)
@@ -85,14 +86,15 @@ class UserAccount(Controller):
     def getUserMessages(self):
         limit = self.request('n_messages')
         offset = self.request('offset')
+        before = self.request('before')
         
         messages = []
         
-        if (limit and offset):
+        if (limit and (offset or before)):
             try:
                 limit = int(limit)
-                offset = int(offset)
-                messages = self.user.getMessages(limit, offset)
+                offset = int(offset or 0)
+                messages = self.user.getMessages(limit, offset, before)
             except Exception, e:
                 log.info("*** couldn't get messages")
                 log.error(e)
@@ -103,7 +105,12 @@ class UserAccount(Controller):
         pref = self.request('pref')
         
         if (pref):
-            return self.user.setMessagePreferences(pref)
+            isUpdated = self.user.setMessagePreferences(pref)
+
+            if (isUpdated):
+                self.expireUser()
+
+            return isUpdated
         else:
             return False
     
@@ -117,7 +124,12 @@ class UserAccount(Controller):
         if (not util.strNullOrEmpty(firstName) and
             not util.strNullOrEmpty(lastName) and
             not util.strNullOrEmpty(email)):
-            return self.user.updateInfo(self.user, email, firstName, lastName, imageId, locationId)
+            isUpdated = self.user.updateInfo(self.user, email, firstName, lastName, imageId, locationId)
+
+            if (isUpdated):
+                self.expireUser()
+
+            return isUpdated
         else:
             log.info("*** not enough info to update user")
             return False
@@ -125,7 +137,12 @@ class UserAccount(Controller):
     def editDescription(self):
         description = self.request('description')
         
-        return self.user.updateDescription(description)        
+        isUpdated = self.user.updateDescription(description)
+
+        if (isUpdated):
+            self.expireUser()
+
+        return isUpdated
         
     def changePassword(self):
         password = self.request('new_password')
@@ -0,0 +1,317 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+"""
+Process-wide cache service.
+
+The ``CacheHolder`` keeps a single memcache client for the process (the
+python-memcached client keeps one set of connections per thread, so they are
+reused across requests) behind a small in-process LRU.  The ``Cache`` it hands
+out has the same ``get``/``set``/``add``/``delete``/``incr`` interface as a
+memcache client, plus:
+
+* namespaces, whose keys can all be invalidated at once by bumping the
+  namespace version, and
+* ``get_or_set``, a read-through helper that lets only one caller rebuild a
+  missing value while the others wait for it (dog-pile protection).
+
+"""
+import cPickle
+import threading
+import time
+import memcache
+from framework.config import Config
+from framework.log import log
+from helpers.OrderedDict import OrderedDict
+
+class LruCache (object):
+    """
+    A thread-safe, size-bounded, in-process cache.  Each entry expires after
+    ``ttl`` seconds; when there are more than ``max_items`` entries, the least
+    recently used one is evicted.
+
+    Values are stored pickled, as they are in memcache, so each caller gets
+    its own copy and can't change what other callers will be given.
+
+    """
+
+    def __init__(self, max_items=1000, ttl=5):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.items = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self.items.pop(key, None)
+
+            if entry is None or entry[0] < time.time():
+                self.misses += 1
+                return None
+
+            # Re-insert to mark the entry as the most recently used.
+            self.items[key] = entry
+            self.hits += 1
+
+        return cPickle.loads(entry[1])
+
+    def set(self, key, value, ttl=None):
+        if self.max_items < 1:
+            return
+
+        expires = time.time() + (self.ttl if ttl is None else min(ttl, self.ttl))
+        data = cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL)
+
+        with self._lock:
+            self.items.pop(key, None)
+            self.items[key] = (expires, data)
+
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self.items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.items.clear()
+
+    def get_stats(self):
+        return {'items': len(self.items),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions}
+
+
+class Cache (object):
+    """
+    A two-tier cache: an ``LruCache`` in front of a memcache client.
+
+    Values are only kept in the local tier for a few seconds, since other
+    processes can't invalidate it, and values larger than ``max_local_size``
+    bytes (e.g. images) are only kept in memcache.  As with memcache, ``None``
+    can't be cached; ``get`` returns ``None`` for a miss.
+
+    """
+
+    def __init__(self, client, local=None, max_local_size=64 * 1024,
+                 lock_timeout=10, lock_wait=0.05):
+        self.client = client
+        self.local = local if local is not None else LruCache()
+        self.max_local_size = max_local_size
+        self.lock_timeout = lock_timeout
+        self.lock_wait = lock_wait
+
+    def _set_local(self, key, value, time=0):
+        if isinstance(value, basestring) and len(value) > self.max_local_size:
+            return
+        self.local.set(key, value, time or None)
+
+    def get(self, key):
+        key = str(key)
+        value = self.local.get(key)
+
+        if value is None:
+            try:
+                value = self.client.get(key)
+            except Exception, e:
+                log.warning("*** memcache get failed [%s]: %s" % (e, key))
+                return None
+
+            if value is not None:
+                self._set_local(key, value)
+
+        return value
+
+    def set(self, key, value, time=0):
+        key = str(key)
+        self._set_local(key, value, time)
+
+        try:
+            return self.client.set(key, value, time=time)
+        except Exception, e:
+            log.warning("*** memcache set failed [%s]: %s" % (e, key))
+            return False
+
+    def add(self, key, value, time=0):
+        key = str(key)
+
+        try:
+            isAdded = self.client.add(key, value, time=time)
+        except Exception, e:
+            log.warning("*** memcache add failed [%s]: %s" % (e, key))
+            return False
+
+        if isAdded:
+            self._set_local(key, value, time)
+
+        return isAdded
+
+    def delete(self, key):
+        key = str(key)
+        self.local.delete(key)
+
+        try:
+            return self.client.delete(key)
+        except Exception, e:
+            log.warning("*** memcache delete failed [%s]: %s" % (e, key))
+            return False
+
+    def incr(self, key, delta=1):
+        key = str(key)
+        self.local.delete(key)
+
+        try:
+            return self.client.incr(key, delta)
+        except Exception, e:
+            log.warning("*** memcache incr failed [%s]: %s" % (e, key))
+            return None
+
+    def get_stats(self):
+        try:
+            stats = self.client.get_stats()
+        except Exception, e:
+            log.warning("*** memcache stats failed [%s]" % e)
+            stats = []
+
+        return {'memcache': stats, 'local': self.local.get_stats()}
+
+    # Namespaces
+
+    def namespace_version(self, namespace):
+        """
+        Get the current version of ``namespace``.  The version is part of every
+        key in the namespace, so bumping it orphans all of them at once.
+
+        """
+        version_key = 'ns_version_%s' % namespace
+        version = self.get(version_key)
+
+        if version is None:
+            version = int(time.time())
+            if not self.add(version_key, version):
+                version = self.get(version_key) or version
+
+        return version
+
+    def namespace_key(self, namespace, key):
+        """Get the full key of ``key`` within ``namespace``."""
+        return '%s_%s_%s' % (namespace, self.namespace_version(namespace), key)
+
+    def bump_namespace(self, namespace):
+        """
+        Invalidate every key in ``namespace``.  Other processes may keep
+        serving the old version from their local tier for a few seconds.
+
+        """
+        version_key = 'ns_version_%s' % namespace
+
+        if self.incr(version_key) is None:
+            self.set(version_key, int(time.time()))
+
+    # Read-through
+
+    def get_or_set(self, key, create, time=0, namespace=None):
+        """
+        Get the value of ``key``, calling ``create()`` to build and store it if
+        it is missing.  Only one caller at a time (across every process that
+        shares the memcache server) rebuilds a missing key; the others wait up
+        to ``lock_timeout`` seconds for it to appear before giving up and
+        building it themselves.
+
+        """
+        if namespace is not None:
+            key = self.namespace_key(namespace, key)
+        key = str(key)
+
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        lock_key = 'lock_%s' % key
+
+        try:
+            isLocked = self.client.add(lock_key, 1, time=self.lock_timeout)
+        except Exception, e:
+            log.warning("*** memcache lock failed [%s]: %s" % (e, key))
+            isLocked = False
+
+        if not isLocked:
+            value = self._wait_for(key, lock_key)
+            if value is not None:
+                return value
+
+        try:
+            value = create()
+
+            if value is not None:
+                self.set(key, value, time)
+        finally:
+            if isLocked:
+                try:
+                    self.client.delete(lock_key)
+                except Exception, e:
+                    log.warning("*** memcache unlock failed [%s]: %s" % (e, key))
+
+        return value
+
+    def _wait_for(self, key, lock_key):
+        deadline = time.time() + self.lock_timeout
+
+        while time.time() < deadline:
+            time.sleep(self.lock_wait)
+
+            try:
+                value = self.client.get(key)
+                if value is not None:
+                    self._set_local(key, value)
+                    return value
+
+                # The lock is gone (or memcache is down) without a value
+                # being stored, so stop waiting.
+                if self.client.get(lock_key) is None:
+                    return None
+            except Exception, e:
+                log.warning("*** memcache get failed [%s]: %s" % (e, key))
+                return None
+
+        return None
+
+
+class CacheHolder (object):
+    """
+    Singleton holding the process-wide ``Cache``.  The local tier can be sized
+    with the optional ``local_max_items`` and ``local_ttl`` values in the
+    ``memcache`` config section.
+
+    """
+
+    cache = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_cache(cls):
+        if cls.cache is None:
+            with cls._lock:
+                if cls.cache is None:
+                    cls.cache = cls.create_cache(Config.get('memcache'))
+        return cls.cache
+
+    @classmethod
+    def create_cache(cls, settings):
+        client = memcache.Client(["%s:%s" % (settings['address'], settings['port'])])
+        local = LruCache(max_items=settings.get('local_max_items', 1000),
+                         ttl=settings.get('local_ttl', 5))
+        log.info("Created cache for memcache at %s:%s" % (settings['address'], settings['port']))
+        return Cache(client, local)
+
+    @classmethod
+    def set(cls, cache):
+        """Replace the process-wide cache (e.g. with a stub in tests)."""
+        cls.cache = cache
+        return cls.cache
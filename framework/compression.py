@@ -0,0 +1,218 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+"""
+Response compression.
+
+``compress_processor`` is a web.py processor that compresses text responses
+(pages, JSON, XML and CSV) for clients that send a matching Accept-Encoding:
+with brotli if the brotli module is installed and the client takes it, and
+otherwise with gzip.  Responses smaller than ``min_size`` bytes are sent as
+they are, since compressing them saves little.
+
+Compressed bodies are kept in an in-process LRU by encoding and ETag, so a
+response that is sent again unchanged (every JSON and page response has a
+content-hash ETag, see Controller.conditional) is not compressed again.  The
+ETag of a compressed response gets the encoding as a suffix, as Apache's
+mod_deflate does, so that caches don't mix up the variants.
+
+"""
+import re
+import threading
+import zlib
+from lib import web
+from framework.cache_holder import LruCache
+from framework.config import Config
+from framework.log import log
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content types worth compressing; images are compressed already.
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript',
+                      'application/x-javascript', 'application/xml')
+
+# Matches the encoding suffix of an ETag sent back by a client.
+ETAG_SUFFIX_RE = re.compile(r'-(gzip|br)"$')
+
+def strip_etag_suffix(etag):
+    """Return an ETag without the encoding suffix added by the compressor."""
+    return ETAG_SUFFIX_RE.sub('"', etag)
+
+def add_etag_suffix(etag, encoding):
+    """Return an ETag with ``encoding`` added as a suffix, as the compressor sends it."""
+    return etag[:-1] + '-' + encoding + '"' if etag.endswith('"') else etag
+
+def etag_encoding(etag):
+    """Return the encoding suffix of an ETag sent back by a client, or None."""
+    match = ETAG_SUFFIX_RE.search(etag)
+    return match.group(1) if match else None
+
+def parse_accept_encoding(header):
+    """
+    Return a dict of the content codings in an Accept-Encoding header, with
+    their quality values.
+    """
+    codings = {}
+
+    for item in (header or '').split(','):
+        parts = item.strip().split(';')
+        coding = parts[0].strip().lower()
+
+        if not coding:
+            continue
+
+        q = 1.0
+        for param in parts[1:]:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+
+        codings[coding] = q
+
+    return codings
+
+
+class Compressor (object):
+    """
+    Compresses responses, keeping recently compressed bodies of up to
+    ``max_cached_size`` bytes in ``cache``.
+
+    """
+
+    def __init__(self, min_size=1024, level=6, brotli_quality=5,
+                 max_cached_size=1024 * 1024, cache=None):
+        self.min_size = min_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self.max_cached_size = max_cached_size
+        self.cache = cache if cache is not None else LruCache(max_items=200, ttl=60 * 60)
+
+        # Encodings in order of preference, when the client likes them equally.
+        self.encodings = (('br',) if brotli is not None else ()) + ('gzip',)
+
+    def negotiate(self, accept_encoding):
+        """
+        Return the encoding to use for a client's Accept-Encoding header, or
+        None to send the response as it is.
+        """
+        codings = parse_accept_encoding(accept_encoding)
+        best, best_q = None, 0.0
+
+        for encoding in self.encodings:
+            q = codings.get(encoding, codings.get('*', 0.0))
+            if q > best_q:
+                best, best_q = encoding, q
+
+        return best
+
+    def compress(self, body, encoding, etag=None):
+        """
+        Return ``body`` compressed with ``encoding``, from the cache if the
+        response with this ``etag`` has been compressed before.
+        """
+        key = (encoding, etag)
+
+        if etag is not None:
+            compressed = self.cache.get(key)
+            if compressed is not None:
+                return compressed
+
+        if encoding == 'br':
+            compressed = brotli.compress(body, quality=self.brotli_quality)
+        else:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            compressed = compressor.compress(body) + compressor.flush()
+
+        if etag is not None and len(compressed) <= self.max_cached_size:
+            self.cache.set(key, compressed)
+
+        return compressed
+
+    def is_compressible(self, body, headers):
+        if not isinstance(body, str) or len(body) < self.min_size:
+            return False
+
+        if not web.ctx.status.startswith('200') or 'content-encoding' in headers:
+            return False
+
+        content_type = headers.get('content-type', '')
+        return any(content_type.startswith(prefix) for prefix in COMPRESSIBLE_TYPES)
+
+    def process(self, handler):
+        body = handler()
+        headers = dict((key.lower(), value) for key, value in web.ctx.headers)
+
+        if not self.is_compressible(body, headers):
+            return body
+
+        web.header('Vary', 'Accept-Encoding')
+
+        encoding = self.negotiate(web.ctx.env.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None:
+            return body
+
+        etag = headers.get('etag')
+        compressed = self.compress(body, encoding, etag)
+
+        web.ctx.headers = [(key, value) for key, value in web.ctx.headers
+                           if key.lower() not in ('etag', 'content-length')]
+        if etag is not None:
+            web.header('ETag', add_etag_suffix(etag, encoding))
+        web.header('Content-Encoding', encoding)
+
+        return compressed
+
+
+class CompressorHolder (object):
+    """
+    Singleton holding the process-wide ``Compressor``, configured by the
+    optional ``compression`` config section.
+
+    """
+
+    compressor = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_compressor(cls):
+        if cls.compressor is None:
+            with cls._lock:
+                if cls.compressor is None:
+                    try:
+                        settings = Config.get('compression') or {}
+                    except KeyError:
+                        settings = {}
+                    cls.compressor = cls.create_compressor(settings)
+        return cls.compressor
+
+    @classmethod
+    def create_compressor(cls, settings):
+        cache = LruCache(max_items=settings.get('cache_max_items', 200), ttl=60 * 60)
+        log.info("Created compressor (brotli %s)" % ('available' if brotli is not None else 'not installed'))
+        return Compressor(min_size=settings.get('min_size', 1024),
+                          level=settings.get('level', 6),
+                          brotli_quality=settings.get('brotli_quality', 5),
+                          max_cached_size=settings.get('cache_max_size', 1024 * 1024),
+                          cache=cache)
+
+    @classmethod
+    def set(cls, compressor):
+        """Replace the process-wide compressor (e.g. in tests)."""
+        cls.compressor = compressor
+        return cls.compressor
+
+
+def compress_processor(handler):
+    """
+    Processor that compresses responses for clients that accept it.
+
+    """
+    return CompressorHolder.get_compressor().process(handler)
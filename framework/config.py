@@ -20,18 +20,24 @@ class Config():
     data = None
     """ Data to hold config values """
 
+    path = None
+    """ Path of the config file, if it isn't one of the usual places """
+
     @classmethod
     def load(self):
         """
-        Load config.  Reads config file and loads into data property.  This
-        assumes that the config file (config.yaml) is either in the current 
-        directory or one directory above it.
+        Load config.  Reads config file and loads into data property.  Unless
+        ``path`` is set, this assumes that the config file (config.yaml) is
+        either in the current directory or one directory above it.
         
         """
-        try:
-            c = open(os.path.dirname(__file__) + "/../config.yaml")
-        except Exception:
-            c = open(os.path.dirname(__file__) + "/config.yaml")
+        if self.path is not None:
+            c = open(self.path)
+        else:
+            try:
+                c = open(os.path.dirname(__file__) + "/../config.yaml")
+            except Exception:
+                c = open(os.path.dirname(__file__) + "/config.yaml")
 
         self.data = yaml.load(c)           
     
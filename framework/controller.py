@@ -4,17 +4,20 @@
 """
 
 import os
-import yaml, memcache, json, gettext, locale
+import hashlib, time
+from datetime import datetime
+import yaml, json, locale
 from cgi import escape
-import helpers.custom_filters as custom_filters
-from lib.web.contrib.template import render_jinja
 from lib import web
 from framework.log import log
 #from framework.config import *
 from framework.config import Config
+from framework.cache_holder import CacheHolder
+from framework.compression import strip_etag_suffix, add_etag_suffix, etag_encoding
 from framework.orm_holder import OrmHolder
 #from framework.session_holder import *
 from framework.session_holder import SessionHolder
+from framework.template_holder import TemplateHolder
 #from framework.task_manager import *
 import framework.util as util
 import giveaminute.user as mUser
@@ -55,8 +58,8 @@ class Controller (object):
         # database
         self.db = Controller.get_db()
 
-        # memcache
-        self.cache = memcache.Client([Config.get('memcache')['address'] + ":" + str(Config.get('memcache')['port'])])
+        # memcache, shared by the process
+        self.cache = CacheHolder.get_cache()
 
         # session
         self.session = SessionHolder.get_session()
@@ -80,6 +83,8 @@ class Controller (object):
         self.template_data['features'] = Config.get('features')
 
         # user
+        self.user = None
+        self._sqla_user = None
         self.setUserObject()
 
         # beta redirect
@@ -117,14 +122,28 @@ class Controller (object):
            current user; eventually we should be able to replace the gam user
            with this one."""
         if self.user:
-            return self.orm.query(models.User).get(self.user.id)
+            if self._sqla_user is None or self._sqla_user.id != self.user.id:
+                self._sqla_user = self.orm.query(models.User).get(self.user.id)
+            return self._sqla_user
 
     def setUserObject(self):
+        """
+        Loads the logged-in user into ``self.user``.  This is called again
+        before rendering or redirecting in case the user logged in or out
+        during the request; the user is only reloaded if the session's user
+        has changed or ``expireUser`` was called.
+
+        """
+        userId = self.session.user_id if hasattr(self.session, 'user_id') else None
+
+        if self.user and userId is not None and self.user.id == userId:
+            return
+
         self.user = None
-        if hasattr(self.session, 'user_id') and self.session.user_id is not None:
+        if userId is not None:
             # todo would like to move gam-specific user attrs out of controller module
             try:
-                self.user = mUser.User(self.db, self.session['user_id'])
+                self.user = mUser.getCachedUser(self.db, self.cache, userId)
 
                 self.template_data['user'] = dict(data = self.user.getDictionary(),
                                                 json = json.dumps(self.user.getDictionary()),
@@ -137,6 +156,25 @@ class Controller (object):
                 log.error(e)
                 self.session.user_id = None
 
+    def expireUser(self, userId=None):
+        """
+        Drops the cached copies of a user after their profile or project
+        memberships change, so that the next load reads them fresh.  Defaults
+        to the logged-in user.
+
+        """
+        if userId is None and self.user:
+            userId = self.user.id
+
+        if userId is None:
+            return
+
+        mUser.expireCachedUser(self.cache, userId)
+
+        if self.user and str(self.user.id) == str(userId):
+            self.user = None
+            self.setUserObject()
+
     def require_login(self, url="/", admin=False):
         if not self.user:
             log.info("--> not logged in")
@@ -255,16 +293,7 @@ class Controller (object):
         for key in keys:
             template_values[key] = self.session[key]
 
-        # Set up template and Jinja
         template_values['template_name'] = template_name
-        renderer = render_jinja(os.path.dirname(__file__) + '/../templates/',
-            extensions=['jinja2.ext.i18n',
-                        'jinja2.ext.with_',])
-        renderer._lookup.filters.update(custom_filters.filters)
-
-        # Install the translation
-        translation = self.get_gettext_translation(self.get_language())
-        renderer._lookup.install_gettext_translations(translation)
 
         # Insert HTML for the language chooser
         curr_lang = self.get_language()
@@ -286,8 +315,97 @@ class Controller (object):
         # Set status
         web.ctx.status = status
 
-        # Return template and data.
-        return (renderer[template_name + "." + suffix](dict(d=template_values))).encode('utf-8')
+        # Return template and data.  The template environment for the
+        # language (with its translation installed) is shared by the process.
+        output = TemplateHolder.render(template_name + "." + suffix, dict(d=template_values), curr_lang).encode('utf-8')
+
+        if status.startswith('200'):
+            output = self.conditional(output)
+
+        return output
+
+    def make_etag(self, *parts):
+        """
+        Returns an ETag for a response, from its content or from whatever
+        identifies its version (e.g. an id and an updated_datetime).
+
+        """
+        return hashlib.md5('\0'.join([util.safestr(part) for part in parts])).hexdigest()
+
+    def not_modified(self, etag=None, last_modified=None):
+        """
+        Sets the ETag and Last-Modified validators of a GET response, and
+        checks them against the request's If-None-Match and If-Modified-Since
+        headers.  If the client's copy is current, sets a 304 status and
+        returns True, and the caller should return an empty body.
+
+        @type   etag: string
+        @param  etag: Opaque version of the response, e.g. from make_etag.
+        @type   last_modified: datetime
+        @param  last_modified: Local time the response last changed.
+
+        """
+        if web.ctx.method not in ('GET', 'HEAD'):
+            return False
+
+        self.has_validators = True
+
+        if last_modified:
+            # Dates from the database are local; HTTP dates are GMT.
+            last_modified = datetime.utcfromtimestamp(time.mktime(last_modified.timetuple()))
+            web.header('Last-Modified', web.httpdate(last_modified))
+        web.header('Cache-Control', 'private, max-age=0, must-revalidate')
+
+        if_none_match = web.ctx.env.get('HTTP_IF_NONE_MATCH')
+        if_modified_since = web.ctx.env.get('HTTP_IF_MODIFIED_SINCE')
+        response_etag = '"%s"' % etag if etag else None
+
+        # If-None-Match wins over If-Modified-Since when both are sent.
+        if if_none_match is not None:
+            is_current = False
+
+            for tag in if_none_match.split(','):
+                tag = tag.strip()
+
+                # Compressed responses' ETags come back with the encoding
+                # added, and the 304 repeats the tag the client has.
+                if etag and (tag == '*' or strip_etag_suffix(tag) in ('"%s"' % etag, 'W/"%s"' % etag)):
+                    is_current = True
+                    encoding = etag_encoding(tag)
+
+                    if encoding:
+                        web.header('Vary', 'Accept-Encoding')
+                        response_etag = add_etag_suffix(response_etag, encoding)
+                    break
+        elif if_modified_since is not None and last_modified is not None:
+            since = web.parsehttpdate(if_modified_since.split(';')[0].strip())
+            is_current = since is not None and last_modified.replace(microsecond=0) <= since
+        else:
+            is_current = False
+
+        if response_etag:
+            web.header('ETag', response_etag)
+
+        if is_current:
+            log.info("304: Not Modified")
+            web.ctx.status = '304 Not Modified'
+
+        return is_current
+
+    def conditional(self, body):
+        """
+        Returns ``body``, or an empty body and a 304 status if the client
+        already has it.  The ETag is a hash of the body, so this saves sending
+        the response but not building it; use not_modified directly where the
+        version is known before the work is done.  Does nothing if the
+        response's validators have already been set.
+
+        """
+        if getattr(self, 'has_validators', False):
+            return body
+        if self.not_modified(etag=self.make_etag(body)):
+            return ''
+        return body
 
     def get_language(self):
         """
@@ -311,6 +429,9 @@ class Controller (object):
         #       http://www.w3.org/International/questions/qa-accept-lang-locales
         #                                                      - MP 2011-07-27
 
+        if lang not in self.get_supported_languages():
+            lang = ""
+
         self.session.lang = lang
         return lang
 
@@ -342,19 +463,16 @@ class Controller (object):
         """
         Returns the translation object for the specified locale.
         """
-        # i18n directory.
-        locale_dir = self.get_i18n_dir()
-
-        # Look in the translaton for the locale_id in locale_dir. Fallback to the
-        # default text if not found.
-        return gettext.translation('messages', locale_dir, [locale_id], fallback=True)
+        # Translations are loaded once per process, falling back to the
+        # default text if there is no catalog for the locale_id.
+        return TemplateHolder.get_translation(locale_id)
 
     def json(self, data, encoder=None):
         output = json.dumps(data, cls=encoder)
         web.header("Content-Type", "text/plain")
         log.info("200: text/plain (JSON)")
 
-        return output
+        return self.conditional(output)
 
     def xml(self, data):
 
@@ -398,18 +516,50 @@ class Controller (object):
         log.info("200: text/csv")
         return string
 
-    def image(self, image):
-        web.header("Content-Type", "image/png")
+    def image(self, image, content_type="image/png"):
+        web.header("Content-Type", content_type)
         web.header("Expires","Thu, 15 Apr 2050 20:00:00 GMT")
-        log.info("200: image/png")
+        log.info("200: %s" % content_type)
 
         return image
 
-    def temp_image(self, image):
-        web.header("Content-Type", "image/png")
+    @classmethod
+    def get_sendfile_mode(cls):
+        """
+        Returns how the web server can send files for the application: 'x-sendfile'
+        (lighttpd, or Apache with mod_xsendfile), 'x-accel-redirect' (nginx),
+        or None if it can't, from the ``sendfile`` value in the ``media``
+        config section.
+        """
+        mode = (Config.get('media') or {}).get('sendfile')
+        return mode.lower() if mode else None
+
+    def send_file(self, path, content_type, uri=None):
+        """
+        Has the web server send the file at ``path``, so that only the headers
+        are made here.  nginx serves it from ``uri``, an internal location
+        aliased to the file's directory.  Returns the (empty) body, or None if
+        the web server can't send the file, in which case the caller must.
+        """
+        mode = self.get_sendfile_mode()
+
+        if mode == 'x-sendfile':
+            web.header("X-Sendfile", os.path.abspath(path))
+        elif mode == 'x-accel-redirect' and uri:
+            web.header("X-Accel-Redirect", uri)
+        else:
+            return None
+
+        web.header("Content-Type", content_type)
+        log.info("200: %s (%s)" % (content_type, mode))
+
+        return ''
+
+    def temp_image(self, image, content_type="image/png"):
+        web.header("Content-Type", content_type)
 
         web.header("Cache-Control", "no-cache")
-        log.info("200: image/png (temporary)")
+        log.info("200: %s (temporary)" % content_type)
 
         return image
 
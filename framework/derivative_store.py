@@ -0,0 +1,271 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+"""
+On-disk store for image derivatives (the resized copies that ImageServer.GET
+makes of uploaded images).
+
+Each derivative is a file named for its key, (id, mode, width, height,
+format), under a directory for its image, so that removing an image removes
+all of its derivatives.  The store holds at most ``max_size`` bytes; when a
+new derivative would take it over, the least recently used ones are deleted.
+Recency is kept in memory, and in the files' access times so that it survives
+a restart.
+
+Several processes can share a store.  Each keeps its own index of the files,
+re-read from disk every ``rescan_interval`` seconds, and treats a file that
+another process has evicted as a miss.
+
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+from framework.config import Config
+from framework.log import log
+from helpers.OrderedDict import OrderedDict
+
+class DerivativeStore (object):
+    """
+    A size-bounded, least-recently-used store of image derivatives under
+    ``root``.
+
+    """
+
+    def __init__(self, root, max_size=512 * 1024 * 1024, rescan_interval=10 * 60):
+        self.root = root
+        self.max_size = max_size
+        self.rescan_interval = rescan_interval
+
+        # Derivative paths, least recently used first, and their sizes.
+        self.files = OrderedDict()
+        self.size = 0
+        self.last_scanned = None
+
+        # While a scan is running, the changes to the index that it must
+        # replay, as (path, size) pairs with a size of None for removals.
+        self._changes = None
+
+        self.hits = self.misses = self.writes = self.evictions = 0
+        self._lock = threading.Lock()
+
+    def image_dir(self, id):
+        return os.path.join(self.root, str(id)[-1], str(id))
+
+    def path(self, id, mode, width, height, format):
+        return os.path.join(self.image_dir(id),
+                            "%s_%s_%s.%s" % (mode, width, height, format.lower()))
+
+    def scan(self):
+        """
+        Rebuild the index from the files on disk, ordered by access time.  The
+        walk runs outside the lock, so that lookups don't wait for it; changes
+        made while it runs are replayed onto the new index before it is
+        swapped in.  Returns False if another thread is already scanning.
+        """
+        with self._lock:
+            if self._changes is not None:
+                return False
+            self._changes = []
+
+        try:
+            entries = []
+
+            for directory, subdirectories, filenames in os.walk(self.root):
+                for filename in filenames:
+                    if filename.startswith('.'):
+                        continue
+                    path = os.path.join(directory, filename)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((st.st_atime, path, st.st_size))
+
+            entries.sort()
+            files = OrderedDict((path, size) for atime, path, size in entries)
+
+            with self._lock:
+                for path, size in self._changes:
+                    files.pop(path, None)
+                    if size is not None:
+                        files[path] = size
+
+                self.files = files
+                self.size = sum(files.itervalues())
+                self.last_scanned = time.time()
+        finally:
+            with self._lock:
+                self._changes = None
+
+        return True
+
+    def _check_scan(self):
+        if self.last_scanned is None or time.time() - self.last_scanned > self.rescan_interval:
+            self.scan()
+
+    def _forget(self, path):
+        """
+        Drop ``path`` from the index.  Call it under the lock.
+        """
+        size = self.files.pop(path, None)
+        if size is not None:
+            self.size -= size
+        if self._changes is not None:
+            self._changes.append((path, None))
+
+    def _touch(self, path, size):
+        """
+        Mark ``path`` as the most recently used file.  Call it under the lock.
+        """
+        self._forget(path)
+        self.files[path] = size
+        self.size += size
+        if self._changes is not None:
+            self._changes.append((path, size))
+
+    def locate(self, id, mode, width, height, format):
+        """
+        Return the path of the derivative's file, marked as just used, or None
+        if it isn't stored.
+        """
+        path = self.path(id, mode, width, height, format)
+
+        self._check_scan()
+
+        try:
+            os.utime(path, None)
+            size = os.path.getsize(path)
+        except OSError:
+            with self._lock:
+                self._forget(path)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self._touch(path, size)
+            self.hits += 1
+
+        return path
+
+    def get(self, id, mode, width, height, format):
+        """
+        Return the derivative's data, or None if it isn't stored.
+        """
+        path = self.locate(id, mode, width, height, format)
+
+        if path is None:
+            return None
+
+        try:
+            f = open(path, 'rb')
+            try:
+                return f.read()
+            finally:
+                f.close()
+        except IOError:
+            # Evicted by another process since it was located.
+            with self._lock:
+                self._forget(path)
+            return None
+
+    def put(self, id, mode, width, height, format, data):
+        """
+        Store a derivative, evicting the least recently used ones to keep
+        within ``max_size``.
+        """
+        if len(data) > self.max_size:
+            return False
+
+        path = self.path(id, mode, width, height, format)
+        directory = os.path.dirname(path)
+
+        self._check_scan()
+
+        try:
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+
+            # Write to a temporary file and rename it, so that readers never
+            # see part of a derivative.
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.')
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+            os.rename(temp_path, path)
+        except (IOError, OSError), e:
+            log.warning("*** couldn't store image derivative %s: %s" % (path, e))
+            return False
+
+        with self._lock:
+            self._touch(path, len(data))
+            self.writes += 1
+
+            while self.size > self.max_size and self.files:
+                evicted_path = next(iter(self.files))
+                self._forget(evicted_path)
+                self.evictions += 1
+                try:
+                    os.remove(evicted_path)
+                except OSError:
+                    pass
+
+        return True
+
+    def remove(self, id):
+        """
+        Delete every derivative of an image.
+        """
+        directory = self.image_dir(id)
+
+        with self._lock:
+            for path in [path for path in self.files if path.startswith(directory + os.sep)]:
+                self._forget(path)
+
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def get_stats(self):
+        return {'items': len(self.files),
+                'size': self.size,
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'evictions': self.evictions}
+
+
+class DerivativeStoreHolder (object):
+    """
+    Singleton holding the process-wide ``DerivativeStore``.  It is placed and
+    sized by the optional ``derivative_path`` and ``derivative_max_size``
+    values in the ``media`` config section.
+
+    """
+
+    store = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_store(cls):
+        if cls.store is None:
+            with cls._lock:
+                if cls.store is None:
+                    cls.store = cls.create_store(Config.get('media'))
+        return cls.store
+
+    @classmethod
+    def create_store(cls, settings):
+        root = settings.get('derivative_path') or os.path.join(settings['file_path'], 'derivatives')
+        store = DerivativeStore(root, max_size=settings.get('derivative_max_size', 512 * 1024 * 1024))
+        log.info("Created image derivative store at %s" % root)
+        return store
+
+    @classmethod
+    def set(cls, store):
+        """Replace the process-wide store (e.g. with a temporary one in tests)."""
+        cls.store = store
+        return cls.store
@@ -9,14 +9,13 @@ Emailing utility.  Emailing is ultimately handled through webpy.
 """
 import smtplib
 import os
-import helpers.custom_filters as custom_filters
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import Encoders
-from lib.web.contrib.template import render_jinja
 from lib.jinja2.exceptions import TemplateNotFound
 from framework.log import log
+from framework.template_holder import TemplateHolder
 #from framework.controller import *
 import lib.web.utils as webpyutils
 import lib.web.webapi as webapi
@@ -119,9 +118,7 @@ class Emailer():
     def render(cls, template_name, template_values=None, suffix="html"):
         if template_values is None: template_values = {}        
         template_values['template_name'] = template_name
-        renderer = render_jinja(os.path.dirname(__file__) + '/../templates/')      
-        renderer._lookup.filters.update(custom_filters.filters)
-        return (renderer[template_name + "." + suffix](template_values)).encode('utf-8')
+        return TemplateHolder.render(template_name + "." + suffix, template_values).encode('utf-8')
 
 # Local methods
 def listify(x):
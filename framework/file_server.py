@@ -6,6 +6,7 @@
 import cStringIO
 import traceback
 import framework.util as util
+import framework.image_pipeline as image_pipeline
 import os
 from framework.s3uploader import S3Uploader
 from framework.log import log
@@ -91,6 +92,21 @@ class FileServer(object):
         raise NotImplementedError(("You must override the implementaion of "
                                    "saveFile for your file server.  For "
                                    "example, check out the S3FileServer."))
+    
+    
+    def getThumbnailData(self, image, size):
+        """
+        Creates a thumbnail of the given size from the given decoded image,
+        in the image's format.  Return the image data in a string, or None if
+        it can't be written.
+        
+        """
+        try:
+            thumb = image_pipeline.thumbnail(image, size)
+            return image_pipeline.encode(thumb, image.format)
+        except (IOError, KeyError), e:
+            log.error('*** Error while saving thumbnail data: %s' % e)
+            return None
 
 
 class S3FileServer(FileServer):
@@ -205,6 +221,16 @@ class S3FileServer(FileServer):
         if not localsaved:
             return False
         
+        return self.mirrorFile(filename, mirror)
+    
+    
+    def mirrorFile(self, filename, mirror=True):
+        """
+        Upload the local copy of a file to the S3 server, if the media config
+        says to mirror files.  Return True unless the upload fails.
+        
+        """
+        localpath = self.getLocalPath(filename)
         isS3mirror = self.getConfigVar('media')['isS3mirror']
         s3path = self.getS3Path(filename)
         log.info("*** config = %s, mirror = %s" % (isS3mirror, mirror))
@@ -218,6 +244,84 @@ class S3FileServer(FileServer):
                 return False
         
         return True
+    
+    
+    def getPendingPath(self, fileid):
+        """
+        Get the path of the marker that says a file is waiting for a media
+        task to mirror it and make its thumbnails.
+        
+        """
+        return "%s.pending" % self.getLocalPath(fileid)
+    
+    
+    def markPending(self, fileid):
+        """
+        Mark a file as waiting for its media task, so that it is served from
+        the local copy until the task has finished.  Return True if the
+        marker was written.
+        
+        """
+        return self.saveTemporaryLocalFile(self.getPendingPath(fileid), '')
+    
+    
+    def isPending(self, fileid):
+        return os.path.exists(self.getPendingPath(fileid))
+    
+    
+    def clearPending(self, fileid):
+        try:
+            os.remove(self.getPendingPath(fileid))
+        except OSError:
+            pass
+    
+    
+    def process(self, filename, thumbnails=(), mirror=True):
+        """
+        Media task for a file added with ``mirror=False``: mirror it to the S3
+        server, then add its thumbnails.  Return True if all of that worked,
+        in which case the file is no longer pending.
+        
+        Attributes:
+        filename -- The name the file was added under
+        thumbnails -- A list of (thumbnail filename, (width, height)); the
+                      thumbnails are all made from one decode of the file
+        
+        """
+        log.info("S3FileServer.process %s" % filename)
+        if not self.mirrorFile(filename, mirror):
+            return False
+        
+        if not thumbnails:
+            return True
+        
+        try:
+            with open(self.getLocalPath(filename), "rb") as f:
+                data = f.read()
+            image = image_pipeline.decode(data, image_pipeline.largest_size(size for name, size in thumbnails))
+        except Exception, e:
+            log.error('*** Error while opening image data: %s' % e)
+            return False
+        
+        success = True
+        for thumb_filename, size in thumbnails:
+            thumb = self.getThumbnailData(image, size)
+            
+            with image_pipeline.timed('store'):
+                saved = thumb is not None and self.saveFile(thumb_filename, thumb, mirror=mirror)
+            
+            if saved:
+                log.info("Wrote thumbnail image to %s" % thumb_filename)
+            else:
+                log.error("Failed to write thumbnail image to %s" % thumb_filename)
+                success = False
+        
+        log.info("--> image ingest timings: %s" % image_pipeline.IngestStats.get_stats())
+        
+        if success:
+            self.clearPending(filename)
+        
+        return success
         
     #
 #    @classmethod
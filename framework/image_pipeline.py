@@ -0,0 +1,283 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+"""
+Image ingest: decode an uploaded image once, from memory, and make every size
+that's needed from that one decoded image.
+
+When the largest size needed is known up front, JPEGs are decoded in draft
+mode, which has the decoder produce an image reduced by 1/2, 1/4 or 1/8
+(whichever is still at least that size) instead of decoding at full size and
+shrinking afterwards.
+
+Each stage (decode, resize, encode, store) is timed, and the counts and times
+for the process are kept in ``IngestStats`` for /monitor.
+
+Images are sent in the format that suits their content: photos as JPEG, or as
+WebP to clients that accept it when Pillow can write it, and flat graphics
+(few colours, or transparency) as PNG.
+
+"""
+import threading
+import time
+from cStringIO import StringIO
+from PIL import Image
+from framework.log import log
+
+# Output formats by name (as used in derivative keys): the PIL format, the
+# content type, and the options they are saved with.
+FORMATS = {'png': ('PNG', 'image/png', {'optimize': True}),
+           'jpeg': ('JPEG', 'image/jpeg', {'quality': 85, 'optimize': True}),
+           'webp': ('WEBP', 'image/webp', {'quality': 80})}
+
+# Images with more colours than this are photos.
+PHOTO_MIN_COLORS = 256
+
+class IngestStats (object):
+    """
+    The number of times each stage of the pipeline has run in this process,
+    and the total and longest time it has taken.
+
+    """
+
+    stages = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def record(cls, stage, seconds):
+        with cls._lock:
+            count, total, longest = cls.stages.get(stage, (0, 0.0, 0.0))
+            cls.stages[stage] = (count + 1, total + seconds, max(longest, seconds))
+
+    @classmethod
+    def get_stats(cls):
+        with cls._lock:
+            return dict((stage, {'count': count,
+                                 'total_ms': round(total * 1000, 1),
+                                 'mean_ms': round(total * 1000 / count, 1),
+                                 'max_ms': round(longest * 1000, 1)})
+                        for stage, (count, total, longest) in cls.stages.iteritems())
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls.stages = {}
+
+
+class timed (object):
+    """
+    Context manager that records how long a stage of the pipeline takes::
+
+        with timed('resize'):
+            image = image.resize(size, Image.ANTIALIAS)
+
+    """
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, e_type=None, e_val=None, e_tb=None):
+        self.seconds = time.time() - self.start
+        IngestStats.record(self.stage, self.seconds)
+        log.debug("--> %s took %.1f ms" % (self.stage, self.seconds * 1000))
+
+
+def largest_size(sizes):
+    """
+    Return the smallest ``(width, height)`` that covers all of ``sizes``.
+    """
+    sizes = list(sizes)
+    return (max(size[0] for size in sizes), max(size[1] for size in sizes)) if sizes else None
+
+def identify(data):
+    """
+    Return the format of image data (e.g. 'JPEG') from its header, without
+    decoding it, or None if it isn't an image.
+    """
+    try:
+        return Image.open(StringIO(data)).format
+    except IOError:
+        return None
+
+def decode(data, draft_size=None):
+    """
+    Decode image data, no smaller than ``draft_size`` if that lets the
+    decoder skip work.  Raises IOError if the data isn't an image.
+    """
+    with timed('decode'):
+        image = Image.open(StringIO(data))
+
+        if draft_size and image.format == 'JPEG':
+            image.draft(image.mode, tuple(draft_size))
+
+        image.load()
+
+    return image
+
+def resize(image, mode, target_width, target_height):
+    """
+    Resize an image for ImageServer.GET: 'exact' scales it to cover the
+    target size and crops the overflow from the middle, and 'bounded' scales
+    it to fit within the target size.
+    """
+    source_width, source_height = image.size
+
+    if target_width == source_width and target_height == source_height:
+        return image
+
+    source_ratio = float(source_width) / float(source_height)
+    target_ratio = float(target_width) / float(target_height)
+
+    with timed('resize'):
+        if mode == 'exact':
+            if source_ratio < target_ratio:
+                res = int(target_width), int(target_width / source_ratio)
+                image = image.resize(res, Image.ANTIALIAS)
+                cropoff = (image.size[1] - target_height) / 2
+                crop = 0, cropoff, image.size[0], image.size[1] - cropoff
+                image = image.crop(crop)
+            else:
+                res = int(target_height * source_ratio), int(target_height)
+                image = image.resize(res, Image.ANTIALIAS)
+                cropoff = (image.size[0] - target_width) / 2
+                crop = cropoff, 0, image.size[0] - cropoff, image.size[1]
+                image = image.crop(crop)
+        else:
+            if source_ratio < target_ratio:
+                res = int(target_height * source_ratio), int(target_height)
+            else:
+                res = int(target_width), int(target_width / source_ratio)
+            image = image.resize(res, Image.ANTIALIAS)
+
+    return image
+
+def thumbnail(image, size):
+    """
+    Return a copy of an image shrunk, if need be, to fit within ``size``.
+    """
+    with timed('resize'):
+        thumb = image.copy()
+        thumb.thumbnail(size, Image.ANTIALIAS)
+
+    return thumb
+
+def encode(image, format):
+    """
+    Return an image's data in ``format`` (e.g. 'PNG'), with the options for
+    that format in FORMATS.
+    """
+    options = dict((pil_format, save_options) for pil_format, mime_type, save_options
+                   in FORMATS.values()).get(format, {})
+
+    with timed('encode'):
+        if format in ('JPEG', 'WEBP') and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        f = StringIO()
+        image.save(f, format, **options)
+        return f.getvalue()
+
+def can_encode(name):
+    """
+    Whether Pillow can write a format in FORMATS (WebP needs libwebp).
+    """
+    Image.init()
+    return FORMATS[name][0] in Image.SAVE
+
+def is_photo(image):
+    """
+    Whether an image is a photo, which is far smaller as a JPEG or WebP,
+    rather than a flat graphic, which is best kept as a PNG.
+    """
+    if image.mode in ('1', 'P', 'LA') or 'transparency' in image.info:
+        return False
+
+    if image.mode == 'RGBA':
+        if image.getextrema()[3][0] < 255:
+            return False
+        image = image.convert('RGB')
+
+    # Count the colours of a sample, without the new colours that filtering
+    # would make.
+    if image.size[0] * image.size[1] > 128 * 128:
+        image = image.resize((128, 128), Image.NEAREST)
+
+    return image.getcolors(PHOTO_MIN_COLORS) is None
+
+def parse_accept(header):
+    """
+    Return a dict of the media ranges (e.g. 'image/webp', 'image/*' or
+    '*/*') in an Accept header, with their quality values.
+    """
+    ranges = {}
+
+    for item in (header or '').split(','):
+        parts = item.strip().split(';')
+        media_range = parts[0].strip().lower()
+
+        if not media_range:
+            continue
+
+        q = 1.0
+        for param in parts[1:]:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+
+        ranges[media_range] = q
+
+    return ranges
+
+def accept_quality(ranges, content_type):
+    """
+    The quality that parsed Accept ``ranges`` give ``content_type``: that of
+    the most specific range that matches it, or 0 if none does.
+    """
+    for media_range in (content_type, content_type.split('/')[0] + '/*', '*/*'):
+        if media_range in ranges:
+            return ranges[media_range]
+
+    return 0.0
+
+def photo_format(accept=None):
+    """
+    The format to send photos in for a request's Accept header: WebP if the
+    client names it, or its wildcards rank it above JPEG, and Pillow can
+    write it; JPEG otherwise.
+    """
+    ranges = parse_accept(accept)
+    webp = accept_quality(ranges, 'image/webp')
+
+    if webp > 0 and can_encode('webp'):
+        if 'image/webp' in ranges or webp > accept_quality(ranges, 'image/jpeg'):
+            return 'webp'
+
+    return 'jpeg'
+
+def choose_format(image, accept=None):
+    """
+    The format in FORMATS to send an image in, from its content and the
+    request's Accept header.
+    """
+    return photo_format(accept) if is_photo(image) else 'png'
+
+def content_type(data):
+    """
+    The content type of encoded image data, from its signature.
+    """
+    if data[:4] == 'RIFF' and data[8:12] == 'WEBP':
+        return 'image/webp'
+    if data[:2] == '\xff\xd8':
+        return 'image/jpeg'
+    if data[:4] == 'GIF8':
+        return 'image/gif'
+    return 'image/png'
@@ -3,82 +3,228 @@
     :license: Affero GNU GPL v3, see LICENSE for more details.
 """
 
-import cStringIO
 import framework.util as util
+import framework.image_pipeline as image_pipeline
+import framework.media_tasks as media_tasks
 from framework.s3uploader import *
 from framework.log import log
 from framework.controller import *
+from framework.derivative_store import DerivativeStoreHolder
 from PIL import Image, ImageOps
 
 class ImageServer(Controller):
+
+    # Resized images are kept in memcache for this long; the derivative store
+    # on disk holds them for longer.
+    HOT_CACHE_TIMEOUT = 24 * 60 * 60
     
+    # Resized images that ImageServer.add makes as soon as an image is
+    # uploaded, as (mode, width, height), unless the ``eager_derivatives``
+    # media setting lists others: the sizes the templates show images at.
+    EAGER_DERIVATIVES = (('exact', 35, 35), ('exact', 50, 50), ('exact', 60, 60),
+                         ('bounded', 80, 80), ('bounded', 90, 90))
+
     # edit eholda 2011-01-28
     # added thumbnail option
     @classmethod
-    def add(cls, db, data, app, max_size=None, grayscale=False, mirror=True, thumb_max_size=None):
+    def add(cls, db, data, app, max_size=None, grayscale=False, mirror=True, thumb_max_size=None, defer=False):
+        """
+        Add an image and return its id, or None if the data isn't an image.
+        With ``defer``, only the PNG is written here, quickly, so that it can
+        be shown straight away, and the rest is left to a media task (see
+        ImageServer.process).
+        """
         log.info("ImageServer.add")
+
+        # Decode the upload once, from memory; when it's to be shrunk to
+        # max_size, a JPEG only needs decoding at about that size.
         try:
-            id = db.insert('images', app=app)
+            image = image_pipeline.decode(data, (max(max_size),) * 2 if max_size else None)
         except Exception, e:
+            log.info("*** couldn't decode image")
             log.error(e)
             return None
 
-        # Determine file and directory paths.
-        path = ImageServer.path(app, id)
-        directory = os.path.dirname(path)
-                   
         try:
-            # Attempt to create directory structure if
-            # not present.
-            if not os.path.exists(directory):
-                os.makedirs(directory)
-            
-            # Create file.
-            f = open(path, "wb")
-            f.write(data)        
-            f.close()
-            
-            # Get image object from new file.
-            image = Image.open(path)
+            id = db.insert('images', app=app)
         except Exception, e:
             log.error(e)
+            return None
+
+        if defer:
+            isSaved = ImageServer.saveQuick(app, id, image, max_size, grayscale)
+        else:
+            isSaved = ImageServer.save(app, id, image, max_size, grayscale, mirror, thumb_max_size)
+
+        if not isSaved:
             try:
                 db.query("DELETE FROM images WHERE id=$id", {'id': id})
-                os.remove(path)
             except Exception, e:
                 log.error(e)
             log.warning("--> removed id %s" % id)
             return None
+
+        if defer:
+            media_tasks.enqueue('image', dict(app=app, id=id, mirror=mirror, thumb_max_size=thumb_max_size))
+
+        return id
+
+    @classmethod
+    def process(cls, app, id, mirror=True, thumb_max_size=None):
+        """
+        Media task that finishes an image added with ``defer``: it rewrites
+        the PNG with full compression, makes the thumbnail and eager
+        derivatives, and mirrors it to S3.
+        """
+        log.info("ImageServer.process %s %s" % (app, id))
+        path = ImageServer.path(app, id)
+
+        try:
+            f = open(path, "rb")
+            data = f.read()
+            f.close()
+
+            image = image_pipeline.decode(data)
+        except Exception, e:
+            log.info("*** couldn't read image %s" % id)
+            log.error(e)
+            return False
+
+        if not ImageServer.writePng(app, id, image, thumb_max_size):
+            return False
+
+        ImageServer.finish(app, id, image, mirror)
+        return True
+
+    @classmethod
+    def save(cls, app, id, image, max_size=None, grayscale=False, mirror=True, thumb_max_size=None):
+        """
+        Save a decoded image as the PNG for ``id``, along with its thumbnail
+        and eager derivatives, and mirror it to S3.
+        """
+        image = ImageServer.fit(image, max_size, grayscale)
+
+        if not ImageServer.writePng(app, id, image, thumb_max_size):
+            path = ImageServer.path(app, id)
+            if os.path.exists(path):
+                os.remove(path)
+            return False
+
+        ImageServer.finish(app, id, image, mirror)
+        return True
+
+    @classmethod
+    def saveQuick(cls, app, id, image, max_size=None, grayscale=False):
+        """
+        Save the PNG for ``id`` with the fastest compression, so that the
+        pages that link to it directly can show it before it is processed.
+        """
+        return ImageServer.writePng(app, id, ImageServer.fit(image, max_size, grayscale), optimize=False)
+
+    @classmethod
+    def fit(cls, image, max_size=None, grayscale=False):
+        """
+        Crop and shrink an image to ``max_size``, and make it grayscale, as
+        its PNG is stored.
+        """
         if image.format != "PNG":
             log.info("--> converting %s to PNG" % image.format)
         if max_size and (image.size[0] > max_size[0] or image.size[1] > max_size[1]):
-            image = ImageServer.cropToBox(image)
-            image = image.resize(max_size)
-        
+            with image_pipeline.timed('resize'):
+                image = ImageServer.cropToBox(image)
+                image = image.resize(max_size)
+
         if grayscale:
-            image = ImageOps.grayscale(image)                
-        if thumb_max_size:    
+            image = ImageOps.grayscale(image)
+
+        return image
+
+    @classmethod
+    def writePng(cls, app, id, image, thumb_max_size=None, optimize=True):
+        """
+        Write the PNG for ``id``, and its thumbnail if ``thumb_max_size`` is
+        given.  Without ``optimize``, the PNG is written with the fastest
+        compression instead of the smallest.
+        """
+        # Determine file and directory paths.
+        path = ImageServer.path(app, id)
+        directory = os.path.dirname(path)
+
+        if optimize:
+            options = {'optimize': True}
+        else:
+            options = {'compress_level': 1}
+
+        if thumb_max_size:
             thumbImage = ImageServer.resizeToFit(image, thumb_max_size)
-            thumbPath = ''.join([path[:-4], "_thumb.png"]) 
+            thumbPath = ''.join([path[:-4], "_thumb.png"])
         try:
-            image.save(path, "PNG")  
-            if thumb_max_size:
-                thumbImage.save(thumbPath, "PNG")
+            # Attempt to create directory structure if
+            # not present.
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+
+            # Write the PNG under another name and rename it, so that GET
+            # never reads part of it.
+            with image_pipeline.timed('store'):
+                image.save(path + ".tmp", "PNG", **options)
+                os.rename(path + ".tmp", path)
+                if thumb_max_size:
+                    thumbImage.save(thumbPath, "PNG", optimize=True)
         except Exception, e:
             log.error(e)
-            return None
-        log.info("--> saved %s" % path)  
-        
+            if os.path.exists(path + ".tmp"):
+                os.remove(path + ".tmp")
+            return False
+        log.info("--> saved %s" % path)
+
+        return True
+
+    @classmethod
+    def finish(cls, app, id, image, mirror=True):
+        """
+        Make the eager derivatives of a saved image, and mirror its PNG to S3.
+        """
+        path = ImageServer.path(app, id)
+
+        ImageServer.addDerivatives(id, image)
+
         log.info("*** config = %s, mirror = %s" % (Config.get('media')['isS3mirror'] , mirror))
-        
+
         if (Config.get('media')['isS3mirror'] and mirror):
             try:
                 result = S3Uploader.upload(path, path)
                 log.info(result)
             except Exception, e:
-                log.error(e)  
-        
-        return id
+                log.error(e)
+
+    @classmethod
+    def addDerivatives(cls, id, image):
+        """
+        Store the eager derivatives of a newly added image, made from the
+        image as saved, so that they match what GET would make from the file:
+        in every photo format if it's a photo, and as a PNG otherwise.
+        """
+        store = DerivativeStoreHolder.get_store()
+        sizes = Config.get('media').get('eager_derivatives') or ImageServer.EAGER_DERIVATIVES
+
+        for mode, width, height in sizes:
+            try:
+                resized = image_pipeline.resize(image, mode, width, height)
+                if image_pipeline.is_photo(resized):
+                    formats = [format for format in ('jpeg', 'webp') if image_pipeline.can_encode(format)]
+                else:
+                    formats = ['png']
+
+                for format in formats:
+                    data = image_pipeline.encode(resized, image_pipeline.FORMATS[format][0])
+                    with image_pipeline.timed('store'):
+                        store.put(id, mode, width, height, format, data)
+            except Exception, e:
+                log.info("*** couldn't make %s %sx%s derivative of image %s" % (mode, width, height, id))
+                log.error(e)
+
+        log.info("--> image ingest timings: %s" % image_pipeline.IngestStats.get_stats())
         
     #
     @classmethod
@@ -133,11 +279,20 @@ class ImageServer(Controller):
         try:
             db.query("DELETE FROM images WHERE id=$id", {'id': id})
             os.remove(path)
+            DerivativeStoreHolder.get_store().remove(id)
         except Exception, e:
             log.error(e)
         else:
             log.info("--> removed id %s" % id)        
        
+    @classmethod
+    def sizes(cls):
+        """
+        The (mode, width, height) sizes that GET makes: the eager derivatives.
+        """
+        sizes = Config.get('media').get('eager_derivatives') or ImageServer.EAGER_DERIVATIVES
+        return set((mode, int(width), int(height)) for mode, width, height in sizes)
+
     @classmethod
     def path(cls, app, id):
         """
@@ -151,14 +306,43 @@ class ImageServer(Controller):
     
     def GET(self, app=None, mode=None, target_width=None, target_height=None, id=None):
         log.info("ImageServer.get app[%s] mode[%s] width[%s] height[%s] id[%s]" % (app, mode, target_width, target_height, id))       
-        key = "%s_%s_%s_%s_%s" % (app, mode, target_width, target_height, id)
-        image = self.cache.get(str(key))
-        if image is not None:
-            log.info("--> image [%s] is cached! yay!" % key)
-            return self.image(image)
+        # Only the sizes the templates show images at are made, so that a
+        # request can't have a huge image made, or fill the derivative store
+        # with sizes nobody shows.
+        if (mode, util.try_f(int, target_width), util.try_f(int, target_height)) not in ImageServer.sizes():
+            return self.error("Size not available")
+
+        # Photos are sent as WebP or JPEG depending on what the client
+        # accepts, so each of those has its own cache entry.
+        accept = web.ctx.env.get('HTTP_ACCEPT')
+        photo_format = image_pipeline.photo_format(accept)
+        key = "%s_%s_%s_%s_%s_%s" % (app, mode, target_width, target_height, id, photo_format)
+        web.header("Vary", "Accept")
+
+        # Where the web server sends stored images itself, finding them on
+        # disk is cheaper than fetching them from memcache.
+        sendfile = self.get_sendfile_mode()
+        if not sendfile:
+            image = self.cache.get(str(key))
+            if image is not None:
+                log.info("--> image [%s] is cached! yay!" % key)
+                return self.image(image, image_pipeline.content_type(image))
         image = None
         if mode != 'bounded' and mode != 'exact':
             return self.error("Mode not available")          
+
+        # Resized images are stored on disk by image id, mode, requested size
+        # (0 for the source size) and format: the photo format for this
+        # client if the image is a photo, and PNG otherwise.
+        store = DerivativeStoreHolder.get_store()
+        image_id = util.try_f(int, id)
+        derivative = (image_id, mode, max(util.try_f(int, target_width, 0), 0),
+                      max(util.try_f(int, target_height, 0), 0))
+        if image_id is not None:
+            for format in (photo_format, 'png'):
+                response = self._send_stored_image(store, derivative + (format,), key)
+                if response is not None:
+                    return response
         try:
             record = list(Controller.get_db().query("SELECT id FROM images WHERE id=$id", {'id': id}))[0]
         except Exception, e:
@@ -199,42 +383,64 @@ class ImageServer(Controller):
         elif target_width == source_width and target_height == source_height:
             log.info("--> target matches source dimensions")
         else:
-            if mode == 'exact':
-                if source_ratio < target_ratio:
-                    res = int(target_width), int(target_width / source_ratio)
-                    image = image.resize(res, Image.ANTIALIAS)
-                    cropoff = (image.size[1] - target_height) / 2
-                    crop = 0, cropoff, image.size[0], image.size[1] - cropoff
-                    image = image.crop(crop)
-                else:
-                    res = int(target_height * source_ratio), int(target_height)
-                    image = image.resize(res, Image.ANTIALIAS)
-                    cropoff = (image.size[0] - target_width) / 2
-                    crop = cropoff, 0, image.size[0] - cropoff, image.size[1]
-                    image = image.crop(crop)
-            else:
-                if source_ratio < target_ratio:
-                    res = int(target_height * source_ratio), int(target_height)
-                else:
-                    res = int(target_width), int(target_width / source_ratio)
-                image = image.resize(res, Image.ANTIALIAS)
+            image = image_pipeline.resize(image, mode, target_width, target_height)
         log.info("--> result %sx%s (%s)" % (image.size[0], image.size[1], mode))
-        image = self._image_string(image)
+        format = image_pipeline.choose_format(image, accept)
+        pil_format, content_type, options = image_pipeline.FORMATS[format]
+        image = image_pipeline.encode(image, pil_format)
         if cache_image:
-            try:
-                if self.cache.add(str(key), image): # cache forever
-                    log.info("--> image cached")
-                else:
-                    log.warning("--> memcache set failed [no error]: %s" % key)
-            except Exception, e:
-                log.warning("--> memcache set failed [%s]: %s" % (e, key))
-            return self.image(image)
+            if image_id is not None:
+                store.put(*(derivative + (format, image)))
+            if not sendfile:
+                self._cache_image(key, image)
+            return self.image(image, content_type)
         else:
             log.info("--> placeholder image, not caching")
-            return self.temp_image(image)
+            return self.temp_image(image, content_type)
             
-    def _image_string(self, image):
-        f = cStringIO.StringIO()
-        image.save(f, "PNG")
-        f.seek(0)                    
-        return f.read()
+    @classmethod
+    def derivative_uri(cls, store, path):
+        """
+        The internal URI that nginx serves a stored derivative from, under the
+        ``derivative_uri`` media setting.
+        """
+        prefix = Config.get('media').get('derivative_uri') or '/_derivatives/'
+        return "%s/%s" % (prefix.rstrip('/'), os.path.relpath(path, store.root).replace(os.sep, '/'))
+
+    def _send_stored_image(self, store, derivative, key):
+        """
+        Returns the response for a stored derivative, or None if it isn't
+        stored.  Where the web server can send files, only the headers are
+        made here.
+        """
+        sendfile = self.get_sendfile_mode()
+
+        if sendfile:
+            path = store.locate(*derivative)
+            if path is None:
+                return None
+
+            log.info("--> image [%s] is stored, sending %s" % (key, path))
+            web.header("Expires","Thu, 15 Apr 2050 20:00:00 GMT")
+            content_type = image_pipeline.FORMATS[derivative[-1]][1]
+            response = self.send_file(path, content_type, ImageServer.derivative_uri(store, path))
+            if response is not None:
+                return response
+
+        image = store.get(*derivative)
+        if image is None:
+            return None
+
+        log.info("--> image [%s] is stored" % key)
+        if not sendfile:
+            self._cache_image(key, image)
+        return self.image(image, image_pipeline.FORMATS[derivative[-1]][1])
+
+    def _cache_image(self, key, image):
+        try:
+            if self.cache.set(str(key), image, time=ImageServer.HOT_CACHE_TIMEOUT):
+                log.info("--> image cached")
+            else:
+                log.warning("--> memcache set failed [no error]: %s" % key)
+        except Exception, e:
+            log.warning("--> memcache set failed [%s]: %s" % (e, key))
@@ -0,0 +1,76 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+"""
+Jobs for processing uploads outside of the request that received them.
+
+An upload handler stores what it needs to show the upload straight away and
+calls ``enqueue``, which puts a job on the ``media`` beanstalk tube for
+scripts/media_worker.py to run.  If the task queue isn't running, the job is run straight away instead, so uploads
+still work (slowly) without it.
+
+Jobs are named, rather than pickled functions, so that a worker can run the
+jobs queued by any version of the application:
+
+    image -- ImageServer.process: recompress the PNG of an image added with
+             ImageServer.add(defer=True), make its thumbnail and derivatives,
+             and mirror it to S3.
+    file  -- S3FileServer.process: mirror an uploaded file to S3 and make its
+             thumbnails.
+
+"""
+import framework.task_manager
+from framework.log import log
+
+MEDIA_TUBE = 'media'
+
+def process_image(args):
+    from framework.image_server import ImageServer
+    return ImageServer.process(**args)
+
+def process_file(args):
+    from framework.file_server import S3FileServer
+    return S3FileServer(None).process(**args)
+
+JOBS = {'image': process_image,
+        'file': process_file}
+
+def run(job, args):
+    """
+    Run a job now.  Return True if it succeeded.
+    """
+    if job not in JOBS:
+        log.error("*** unknown media job %s" % job)
+        return False
+
+    try:
+        return bool(JOBS[job](args))
+    except Exception, e:
+        log.info("*** couldn't run media job %s %s" % (job, args))
+        log.error(e)
+        return False
+
+def enqueue(job, args, timeout=300):
+    """
+    Queue a job for the media worker, or run it now if the task queue isn't
+    running.
+    """
+    tasks = framework.task_manager.Tasks()
+
+    if tasks.queue is not None:
+        try:
+            tasks.add(tube=MEDIA_TUBE, func=job, data=args, timeout=timeout)
+            return True
+        except Exception, e:
+            log.error(e)
+
+    log.warning("--> media task queue not available, running %s job now" % job)
+    return run(job, args)
+
+def handle(task):
+    """
+    Task handler for the media worker (see Tasks.process).
+    """
+    return run(task.func, task.args)
@@ -6,6 +6,9 @@
 import util as util
 from framework.log import log
 from framework.controller import *
+from framework.derivative_store import DerivativeStoreHolder
+from framework.image_pipeline import IngestStats
+from framework.template_holder import TemplateHolder
 
 class Monitor(Controller):
 
@@ -13,6 +16,9 @@ class Monitor(Controller):
         log.info("Monitor")
         tasks = Tasks()
         info = {    'tasks': tasks.queue.stats() if tasks.queue is not None else [],
-                    'cache': self.cache.get_stats()
+                    'cache': self.cache.get_stats(),
+                    'templates': TemplateHolder.get_render_stats(),
+                    'image_derivatives': DerivativeStoreHolder.get_store().get_stats(),
+                    'image_ingest': IngestStats.get_stats()
                     }
         return self.json(info)
\ No newline at end of file
@@ -68,9 +68,12 @@ class Tasks():
             print error
             return
 
-        # Watch specific queue is provided.
+        # Watch specific queue is provided, and only that one.
         if tube is not None:
             self.queue.watch(tube)
+            for watched in self.queue.watching():
+                if watched != tube:
+                    self.queue.ignore(watched)
             
         log.info("Starting Tasks.process [%s] ..." % self.queue.watching())
         
@@ -0,0 +1,248 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+"""
+Process-wide Jinja template environments.
+
+Building a Jinja environment, registering the custom filters and loading the
+gettext catalog used to happen on every response and every email.  The
+``TemplateHolder`` builds one environment per language the first time it is
+asked for, and keeps it for the life of the process.  Compiled templates are
+also written to a bytecode cache on disk so that a restarted process doesn't
+have to parse every template again, if a cache directory is configured.
+
+"""
+import os
+import gettext
+import threading
+import time
+import jinja2
+import helpers.custom_filters as custom_filters
+from framework.config import Config
+from framework.log import log
+
+class TemplateHolder (object):
+    """
+    Singleton holding the template environments.  All methods are class
+    methods.
+
+    """
+
+    template_dir = os.path.join(os.path.dirname(__file__), '..', 'templates')
+    """ Directory that all templates are loaded from. """
+
+    template_extensions = ['html', 'txt', 'rss']
+    """ Extensions of the files under ``template_dir`` that are templates. """
+
+    environments = {}
+    """ Jinja environments, keyed by language. ``None`` has no translations. """
+
+    translations = {}
+    """ Gettext translation objects, keyed by language. """
+
+    render_stats = {}
+    """ Number of renders and total render seconds, keyed by template name. """
+
+    _bytecode_cache = None
+    _bytecode_cache_checked = False
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_bytecode_cache(cls):
+        """
+        Get the on-disk cache of compiled templates, or ``None`` if there isn't
+        one.  The directory is set by the optional ``template_cache_path``
+        config value, and is created readable by this user only; with no
+        directory configured templates aren't cached on disk, rather than
+        being written to the shared temporary directory.
+
+        """
+        if not cls._bytecode_cache_checked:
+            try:
+                path = Config.get('template_cache_path')
+            except KeyError:
+                path = None
+
+            if path:
+                if not os.path.exists(path):
+                    os.makedirs(path, 0700)
+
+                cls._bytecode_cache = jinja2.FileSystemBytecodeCache(path, '__cbu_jinja2_%s.cache')
+
+            cls._bytecode_cache_checked = True
+
+        return cls._bytecode_cache
+
+    @classmethod
+    def get_languages(cls):
+        """
+        Get the languages enabled by the ``lang`` config value.
+
+        """
+        try:
+            return (Config.get('lang') or {}).keys()
+        except KeyError:
+            return []
+
+    @classmethod
+    def supported_language(cls, language):
+        """
+        Map ``language`` onto one of the enabled languages, or onto the default
+        ('') if it isn't one.  The holders are keyed only by these values, so
+        arbitrary ``?lang=`` values don't each get an environment.
+
+        """
+        if language is None or language in cls.get_languages():
+            return language
+
+        return ''
+
+    @classmethod
+    def get_translation(cls, language):
+        """
+        Get the gettext translation object for ``language``, falling back to
+        the untranslated text if there is no catalog for it.
+
+        """
+        language = cls.supported_language(language)
+
+        if language not in cls.translations:
+            locale_dir = os.path.join(os.path.dirname(__file__), '..', 'i18n')
+            cls.translations[language] = gettext.translation('messages', locale_dir, [language], fallback=True)
+
+        return cls.translations[language]
+
+    @classmethod
+    def get_environment(cls, language=None):
+        """
+        Get the Jinja environment for ``language``, creating it if this is the
+        first time it has been asked for.  The gettext callables are installed
+        as environment globals, so each language gets its own environment; a
+        language of ``None`` installs no translations.
+
+        """
+        language = cls.supported_language(language)
+        environment = cls.environments.get(language)
+
+        if environment is None:
+            with cls._lock:
+                environment = cls.environments.get(language)
+
+                if environment is None:
+                    environment = cls.create_environment(language)
+                    cls.environments[language] = environment
+
+        return environment
+
+    @classmethod
+    def create_environment(cls, language):
+        try:
+            auto_reload = bool(Config.get('dev'))
+        except KeyError:
+            auto_reload = False
+
+        environment = jinja2.Environment(loader=jinja2.FileSystemLoader(cls.template_dir),
+                                         extensions=['jinja2.ext.i18n',
+                                                     'jinja2.ext.with_',],
+                                         bytecode_cache=cls.get_bytecode_cache(),
+                                         auto_reload=auto_reload,
+                                         cache_size=-1)
+        environment.filters.update(custom_filters.filters)
+
+        if language is None:
+            environment.install_null_translations()
+        else:
+            environment.install_gettext_translations(cls.get_translation(language))
+
+        log.info("Created template environment for language '%s'" % language)
+        return environment
+
+    @classmethod
+    def update_filters(cls):
+        """
+        Copy the filters in ``helpers.custom_filters`` into the environments
+        that have already been created, for filters registered late.
+
+        """
+        for environment in cls.environments.values():
+            environment.filters.update(custom_filters.filters)
+
+    @classmethod
+    def get_template(cls, template_name, language=None):
+        """
+        Get the compiled template named ``template_name``.  Like web.py's
+        ``render_jinja``, a missing template falls back to the 404 page.
+
+        """
+        environment = cls.get_environment(language)
+
+        try:
+            return environment.get_template(template_name)
+        except jinja2.TemplateNotFound:
+            log.warning("Template not found: %s" % template_name)
+            return environment.get_template('404.html')
+
+    @classmethod
+    def render(cls, template_name, template_values, language=None):
+        """
+        Render the template named ``template_name`` and record how long it
+        took in ``render_stats``.
+
+        @rtype: unicode
+        @returns: The rendered template.
+
+        """
+        template = cls.get_template(template_name, language)
+
+        start = time.time()
+        output = template.render(template_values)
+        elapsed = time.time() - start
+
+        with cls._lock:
+            stats = cls.render_stats.setdefault(template_name, {'count': 0, 'seconds': 0.0})
+            stats['count'] += 1
+            stats['seconds'] += elapsed
+
+        return output
+
+    @classmethod
+    def warm_up(cls, languages=None):
+        """
+        Compile every template under ``template_dir`` for each of the given
+        languages (and for the untranslated environment), so that the first
+        requests after a restart don't pay for it.  Compiling also fills the
+        bytecode cache for other processes.
+
+        @rtype: int
+        @returns: The number of templates compiled.
+
+        """
+        if languages is None:
+            languages = cls.get_languages()
+
+        num_compiled = 0
+
+        for language in [None, ''] + list(languages):
+            environment = cls.get_environment(language)
+
+            for template_name in environment.list_templates(extensions=cls.template_extensions):
+                try:
+                    environment.get_template(template_name)
+                    num_compiled += 1
+                except Exception, e:
+                    log.error("*** couldn't compile template %s" % template_name)
+                    log.error(e)
+
+        log.info("Compiled %s templates" % num_compiled)
+        return num_compiled
+
+    @classmethod
+    def get_render_stats(cls):
+        """
+        Get a copy of the per-template render counts and times.
+
+        """
+        with cls._lock:
+            return dict((name, dict(stats)) for name, stats in cls.render_stats.iteritems())
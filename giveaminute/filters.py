@@ -4,6 +4,7 @@
 """
 
 from helpers.custom_filters import filters as custom_filters
+from framework.template_holder import TemplateHolder
 
 # Put model-specific filters here.
 
@@ -11,3 +12,4 @@ def register_filters():
     custom_filters.update({
         # ... and add the name->filter mapping here.
     })
+    TemplateHolder.update_filters()
@@ -0,0 +1,223 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+"""
+The data shown on the homepage, assembled in the background and served from
+the shared cache.
+
+The homepage data (locations, recent ideas, leaderboard, featured projects and
+community leaders) and the blog news feed are each cached as a bundle with the
+time it was built.  A request always gets whatever bundle is in the cache; if
+the bundle is older than its refresh interval, or has been expired by a write
+that changes the homepage, a background thread rebuilds it for the requests
+that follow (stale-while-revalidate).  Only when there is no homepage bundle
+at all is it built during the request, and the news feed is never fetched
+during a request.
+
+"""
+
+import json
+import threading
+import time
+import urllib2
+import Queue
+import giveaminute.idea as mIdea
+import giveaminute.location as mLocation
+import giveaminute.project as mProject
+from framework.cache_holder import CacheHolder
+from framework.config import Config
+from framework.log import log
+
+HOMEPAGE_CACHE_NAMESPACE = 'homepage'
+HOMEPAGE_REFRESH_INTERVAL = 60
+NEWS_REFRESH_INTERVAL = 5 * 60
+
+# Only one process at a time refreshes a bundle; if it dies, another can take
+# over after this long.
+REFRESH_LOCK_TIMEOUT = 60
+
+def getRefreshInterval(name, default):
+    return Config.get('homepage').get(name) or default
+
+def getCommunityLeaders(db):
+    data = []
+
+    try:
+        sql = "select display_name, title, image_path from community_leader order by `order`"
+        data = list(db.query(sql))
+    except Exception, e:
+        log.info("*** couldn't get community leaders")
+        log.error(e)
+
+    return data
+
+def buildHomepageData(db):
+    homepage = Config.get('homepage')
+    features = Config.get('features')
+
+    data = dict(locations = mLocation.getSimpleLocationDictionary(db),
+                all_ideas = mIdea.getMostRecentIdeas(db, homepage['num_recent_ideas']),
+                leaderboard = None,
+                featured_projects = None,
+                community_leaders = None)
+
+    if (bool(features.get('is_display_leaderboard'))):
+        data['leaderboard'] = mProject.getLeaderboardProjects(db, 6)
+
+    if (bool(features.get('is_display_featured_projects'))):
+        data['featured_projects'] = mProject.getFeaturedProjects(db, 6)
+
+    if (bool(features.get('is_community_leaders_displayed'))):
+        data['community_leaders'] = getCommunityLeaders(db)
+
+    return data
+
+def getNewsItems():
+    data = []
+    feedUrl = Config.get('blog_host_feed')
+
+    if (feedUrl):
+        try:
+            # BUGFIX: couldn't parse json from production blog, hence the string conversion
+            # eholda 2011-06-19
+            raw = urllib2.urlopen(feedUrl, timeout = 10)
+            data = json.loads(raw.read())
+            raw.close()
+        except Exception, e:
+            log.info("*** couldn't get feed for news items at %s" % feedUrl)
+            log.error(e)
+            return None
+
+    return data
+
+def refreshHomepageData(db):
+    """
+    Rebuilds the homepage bundle and stores it in the cache.  Returns the
+    bundle.
+
+    """
+    cache = CacheHolder.get_cache()
+    version = cache.namespace_version(HOMEPAGE_CACHE_NAMESPACE)
+
+    bundle = dict(version = version, built = time.time(), data = buildHomepageData(db))
+    cache.set('homepage_data', bundle)
+
+    return bundle
+
+def refreshNews(db):
+    """
+    Fetches the news feed and stores it in the cache.  If the fetch fails,
+    the last good feed is kept and retried at the next refresh.
+
+    """
+    cache = CacheHolder.get_cache()
+    items = getNewsItems()
+
+    if (items is None):
+        bundle = cache.get('homepage_news') or dict(items = [])
+        items = bundle['items']
+
+    bundle = dict(built = time.time(), items = items)
+    cache.set('homepage_news', bundle)
+
+    return bundle
+
+_refreshers = dict(homepage_data = refreshHomepageData, homepage_news = refreshNews)
+_refreshQueue = Queue.Queue()
+_refreshThread = None
+_refreshThreadLock = threading.Lock()
+
+def runRefresher():
+    while True:
+        key, db = _refreshQueue.get()
+
+        try:
+            _refreshers[key](db)
+        except Exception, e:
+            log.info("*** couldn't refresh %s" % key)
+            log.error(e)
+        finally:
+            CacheHolder.get_cache().delete('lock_refresh_%s' % key)
+
+def requestRefresh(db, key):
+    """
+    Queues a background refresh of the ``key`` bundle, unless another request
+    (in any process) already has.
+
+    """
+    global _refreshThread
+
+    if (not CacheHolder.get_cache().add('lock_refresh_%s' % key, 1, time = REFRESH_LOCK_TIMEOUT)):
+        return False
+
+    with _refreshThreadLock:
+        if (_refreshThread is None or not _refreshThread.isAlive()):
+            _refreshThread = threading.Thread(target = runRefresher, name = 'homepage-refresher')
+            _refreshThread.setDaemon(True)
+            _refreshThread.start()
+
+    _refreshQueue.put((key, db))
+    return True
+
+def getHomepageData(db):
+    """
+    Returns the homepage data, with the news items under ``news``, from the
+    cache.  Stale bundles are returned as they are, and refreshed in the
+    background.
+
+    """
+    cache = CacheHolder.get_cache()
+    now = time.time()
+
+    bundle = cache.get('homepage_data')
+
+    if (bundle is None):
+        bundle = refreshHomepageData(db)
+    elif (bundle['version'] != cache.namespace_version(HOMEPAGE_CACHE_NAMESPACE) or
+          now - bundle['built'] > getRefreshInterval('refresh_interval', HOMEPAGE_REFRESH_INTERVAL)):
+        requestRefresh(db, 'homepage_data')
+
+    news = cache.get('homepage_news')
+
+    if (news is None or now - news['built'] > getRefreshInterval('news_refresh_interval', NEWS_REFRESH_INTERVAL)):
+        requestRefresh(db, 'homepage_news')
+
+    data = dict(bundle['data'])
+    data['news'] = news['items'] if news else []
+
+    return data
+
+def expireHomepageData():
+    """
+    Marks the homepage bundle as stale, so the next homepage request has it
+    rebuilt.  Call this after a change that shows on the homepage.
+
+    """
+    CacheHolder.get_cache().bump_namespace(HOMEPAGE_CACHE_NAMESPACE)
+
+def getHomepageQuestion(db):
+    """
+    Returns the featured homepage question from the CMS, if it's enabled,
+    otherwise the one in the config.  Read through the cache.
+
+    """
+    q = None
+
+    if (Config.get('homepage').get('is_question_from_cms')):
+        def loadQuestion():
+            sql = "select question from homepage_question where is_active = 1 and is_featured = 1"
+            data = list(db.query(sql))
+
+            # cache the lack of a question as an empty string
+            return data[0].question if len(data) == 1 else ''
+
+        q = CacheHolder.get_cache().get_or_set('question', loadQuestion,
+                                               time = getRefreshInterval('refresh_interval', HOMEPAGE_REFRESH_INTERVAL),
+                                               namespace = HOMEPAGE_CACHE_NAMESPACE)
+
+    if (not q):
+        q = Config.get('homepage').get('question')
+
+    return q
@@ -5,6 +5,7 @@
 
 import framework.util as util
 import helpers.censor as censor
+import giveaminute.stats as mStats
 from framework.log import log
 
 class Idea:
@@ -49,19 +50,25 @@ def createIdea(db, description, locationId, submissionType, userId=None, email=N
                                     email = email,
                                     phone = phone,
                                     is_active = isActive,
-                                    num_flags = numFlags)
+                                    num_flags = numFlags,
+                                    created_datetime = None)
     except Exception, e:
         log.info("*** problem creating idea")
         log.error(e)    
         return None
         
+    if (isActive):
+        mStats.updateItemLocationStats(db, 'idea', ideaId, None)
+
     return ideaId
 
 
 def deleteIdea(db, ideaId):
     try:
+        locationId = mStats.getCountedLocationId(db, 'idea', ideaId)
         sql = """delete from idea where idea.idea_id = $id"""
         db.query(sql, {'id':ideaId})
+        mStats.updateItemLocationStats(db, 'idea', ideaId, locationId)
         return True;
     except Exception, e:
         log.info("*** problem deleting id with id %s" % str(ideaId))
@@ -208,8 +215,12 @@ def flagIdea(db, ideaId):
         
 def setIdeaIsActive(db, ideaId, b):
     try:
+        locationId = mStats.getCountedLocationId(db, 'idea', ideaId)
+        wasCounted = mStats.isItemCounted(db, 'idea', ideaId)
         sql = "update idea set is_active = $b where idea_id = $ideaId"
         db.query(sql, {'ideaId':ideaId, 'b':b})
+        mStats.updateItemLocationStats(db, 'idea', ideaId, locationId)
+        mStats.updateItemProjectStats(db, 'idea', ideaId, wasCounted)
         return True
     except Exception, e:
         log.info("*** problem setting idea is_active = %s for idea_id = %s" % (b, ideaId))
@@ -220,6 +231,9 @@ def setIdeaIsActive(db, ideaId, b):
 def addIdeaToProject(db, ideaId, projectId):
     try:
         db.insert('project__idea', idea_id = ideaId, project_id = projectId)
+
+        if (mStats.isItemCounted(db, 'idea', ideaId)):
+            mStats.adjustProjectStats(db, projectId, 'num_ideas', 1)
                     
         return True
     except Exception, e:
@@ -229,12 +243,17 @@ def addIdeaToProject(db, ideaId, projectId):
         
 def addInvitedIdeaToProject(db, projectId, userId):
     try:
-        sql = """insert into project__idea (project_id, idea_id)
-                  select $projectId, inv.invitee_idea_id from project_invite inv
+        sql = """select inv.invitee_idea_id as idea_id from project_invite inv
                     inner join idea i on i.idea_id = inv.invitee_idea_id and i.user_id = $userId
                     where project_id = $projectId
                     limit 1"""    
-        db.query(sql, {'projectId':projectId, 'userId':userId})
+        data = list(db.query(sql, {'projectId':projectId, 'userId':userId}))
+
+        if (len(data) > 0):
+            db.insert('project__idea', idea_id = data[0].idea_id, project_id = projectId)
+
+            if (mStats.isItemCounted(db, 'idea', data[0].idea_id)):
+                mStats.adjustProjectStats(db, projectId, 'num_ideas', 1)
         
         return True
     except Exception, e:
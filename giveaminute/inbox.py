@@ -0,0 +1,204 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+"""
+Each user's message inbox: the project messages and invites shown on their
+account page.
+
+Messages are fanned out when they are written.  A new message gets a
+user_inbox row for every member of its project, and a new invite gets one for
+the owner of the invited idea; joining a project copies its existing messages
+into the new member's inbox, and leaving it removes them.  Reading a page of
+the inbox, or counting the unread items, is then a range scan over the user's
+own rows, and the unread count is kept in the cache and incremented as items
+arrive.
+
+"""
+
+from framework.cache_holder import CacheHolder
+from framework.log import log
+
+# Unread counts are recounted at least this often, to pick up messages that
+# have since been removed.
+UNREAD_COUNT_TTL = 60 * 60
+
+# Copies active project messages into their members' inboxes.
+MESSAGE_FANOUT_SQL = """insert ignore into user_inbox (user_id, project_id, project_message_id, created_datetime)
+                select pu.user_id, m.project_id, m.project_message_id, m.created_datetime
+                from project_message m
+                inner join project__user pu on pu.project_id = m.project_id
+                where m.is_active = 1
+                    and ($messageId is null or m.project_message_id = $messageId)
+                    and ($projectId is null or m.project_id = $projectId)
+                    and ($userId is null or pu.user_id = $userId)"""
+
+# Copies idea invites into the inboxes of the ideas' owners.
+INVITE_FANOUT_SQL = """insert ignore into user_inbox (user_id, project_id, project_invite_id, created_datetime)
+                select i.user_id, inv.project_id, inv.project_invite_id, inv.created_datetime
+                from project_invite inv
+                inner join idea i on i.idea_id = inv.invitee_idea_id
+                where i.user_id is not null
+                    and ($inviteId is null or inv.project_invite_id = $inviteId)
+                    and ($userId is null or i.user_id = $userId)"""
+
+def unreadCountKey(userId):
+    return 'user_unread_%s' % userId
+
+def incrUnreadCounts(userIds):
+    """
+    Counts a new item for each of the users whose unread count is cached.  The
+    others are counted when their count is next read.
+
+    """
+    cache = CacheHolder.get_cache()
+
+    for userId in userIds:
+        cache.incr(unreadCountKey(userId))
+
+def expireUnreadCount(userId):
+    CacheHolder.get_cache().delete(unreadCountKey(userId))
+
+def addMessage(db, projectId, messageId):
+    """
+    Delivers a new project message to the inbox of every project member.
+
+    """
+    try:
+        db.query(MESSAGE_FANOUT_SQL, {'messageId':messageId, 'projectId':projectId, 'userId':None})
+
+        sql = "select user_id from project__user where project_id = $projectId"
+        incrUnreadCounts([row.user_id for row in db.query(sql, {'projectId':projectId})])
+
+        return True
+    except Exception, e:
+        log.info("*** couldn't deliver message %s to inboxes" % messageId)
+        log.error(e)
+        return False
+
+def addInvite(db, inviteId):
+    """
+    Delivers a new invite to the inbox of the owner of the invited idea, if it
+    has one.
+
+    """
+    try:
+        db.query(INVITE_FANOUT_SQL, {'inviteId':inviteId, 'userId':None})
+
+        sql = """select i.user_id from project_invite inv
+                inner join idea i on i.idea_id = inv.invitee_idea_id
+                where inv.project_invite_id = $inviteId and i.user_id is not null"""
+        incrUnreadCounts([row.user_id for row in db.query(sql, {'inviteId':inviteId})])
+
+        return True
+    except Exception, e:
+        log.info("*** couldn't deliver invite %s to inbox" % inviteId)
+        log.error(e)
+        return False
+
+def addProject(db, projectId, userId):
+    """
+    Copies a project's messages into the inbox of a user who has just joined
+    it.
+
+    """
+    try:
+        db.query(MESSAGE_FANOUT_SQL, {'messageId':None, 'projectId':projectId, 'userId':userId})
+        expireUnreadCount(userId)
+
+        return True
+    except Exception, e:
+        log.info("*** couldn't add messages for project %s to inbox of user %s" % (projectId, userId))
+        log.error(e)
+        return False
+
+def removeProject(db, userId, projectId = None):
+    """
+    Removes the messages of a project, or, if ``projectId`` is None, of every
+    project, from the inbox of a user who has left it.  Invites are kept.
+
+    """
+    try:
+        db.query("""delete from user_inbox
+                    where user_id = $userId and project_message_id is not null
+                    and ($projectId is null or project_id = $projectId)""",
+                 {'userId':userId, 'projectId':projectId})
+        expireUnreadCount(userId)
+
+        return True
+    except Exception, e:
+        log.info("*** couldn't remove messages for project %s from inbox of user %s" % (projectId, userId))
+        log.error(e)
+        return False
+
+# Removes inbox items whose message is gone or inactive, or whose user has
+# since left the message's project.
+STALE_MESSAGES_SQL = """delete ui from user_inbox ui
+                left join project_message m on m.project_message_id = ui.project_message_id and m.is_active = 1
+                left join project__user pu on pu.project_id = m.project_id and pu.user_id = ui.user_id
+                where ui.project_message_id is not null
+                    and pu.user_id is null
+                    and ($userId is null or ui.user_id = $userId)"""
+
+# Removes inbox items whose invite is gone, or whose idea is no longer owned by
+# the user.
+STALE_INVITES_SQL = """delete ui from user_inbox ui
+                left join project_invite inv on inv.project_invite_id = ui.project_invite_id
+                left join idea i on i.idea_id = inv.invitee_idea_id and i.user_id = ui.user_id
+                where ui.project_invite_id is not null
+                    and i.idea_id is null
+                    and ($userId is null or ui.user_id = $userId)"""
+
+def reconcileInbox(db, userId = None):
+    """
+    Brings the inbox of one user, or, if ``userId`` is None, of every user,
+    back in line with the messages and invites: missing items are added and
+    stale ones removed.  Items that are already right keep their rows, so the
+    table is never empty and the ``(created_datetime, user_inbox_id)`` cursors
+    of the message feeds stay valid.
+
+    """
+    try:
+        db.query(MESSAGE_FANOUT_SQL, {'messageId':None, 'projectId':None, 'userId':userId})
+        db.query(INVITE_FANOUT_SQL, {'inviteId':None, 'userId':userId})
+        db.query(STALE_MESSAGES_SQL, {'userId':userId})
+        db.query(STALE_INVITES_SQL, {'userId':userId})
+
+        if (userId is not None):
+            expireUnreadCount(userId)
+
+        return True
+    except Exception, e:
+        log.info("*** couldn't reconcile inbox for user %s" % userId)
+        log.error(e)
+        return False
+
+def getUnreadCount(db, userId, since):
+    """
+    Returns the number of inbox items created after ``since``, the last time
+    the user looked at their account page.
+
+    """
+    cache = CacheHolder.get_cache()
+    key = unreadCountKey(userId)
+
+    num = cache.get(key)
+
+    if (num is None):
+        sql = """select count(*) as total from user_inbox ui
+                left join project_message m on m.project_message_id = ui.project_message_id
+                where ui.user_id = $userId and ui.created_datetime > $since
+                    and (m.is_active = 1 or ui.project_invite_id is not null)"""
+        num = int(list(db.query(sql, {'userId':userId, 'since':since}))[0].total)
+
+        cache.set(key, num, time = UNREAD_COUNT_TTL)
+
+    return num
+
+def markRead(userId):
+    """
+    Resets a user's unread count, after they have seen their account page.
+
+    """
+    CacheHolder.get_cache().set(unreadCountKey(userId), 0, time = UNREAD_COUNT_TTL)
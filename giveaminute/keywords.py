@@ -3,15 +3,292 @@
     :license: Affero GNU GPL v3, see LICENSE for more details.
 """
 
+import threading
+from framework.cache_holder import CacheHolder
+from framework.log import log
+
+KEYWORD_CACHE_NAMESPACE = 'keywords'
+KEYWORD_CACHE_TIMEOUT = 60 * 60
+
+class KeywordIndex():
+    """
+    An Aho-Corasick automaton over a set of keywords, which finds every keyword
+    that occurs anywhere in a string in a single pass over it.
+
+    Keywords can be added and removed one at a time; each change only touches
+    the keyword's own path through the trie, and the failure links are rebuilt
+    the next time the index is searched.
+
+    """
+    def __init__(self, keywords = None):
+        # Node 0 is the root.  Each node has a map of next characters to
+        # child nodes, a failure link, and the keywords that end at it.
+        self.children = [{}]
+        self.fail = [0]
+        self.ends = [set()]
+        self.outputs = [()]
+        self.keywords = set()
+        self.isDirty = False
+
+        for keyword in (keywords or []):
+            self.add(keyword)
+
+    def add(self, keyword):
+        if (not keyword or keyword in self.keywords):
+            return
+
+        node = 0
+
+        for c in keyword:
+            child = self.children[node].get(c)
+
+            if (child is None):
+                child = len(self.children)
+                self.children.append({})
+                self.fail.append(0)
+                self.ends.append(set())
+                self.outputs.append(())
+                self.children[node][c] = child
+
+            node = child
+
+        self.ends[node].add(keyword)
+        self.keywords.add(keyword)
+        self.isDirty = True
+
+    def remove(self, keyword):
+        if (keyword not in self.keywords):
+            return
+
+        node = 0
+
+        for c in keyword:
+            node = self.children[node][c]
+
+        self.ends[node].discard(keyword)
+        self.keywords.discard(keyword)
+        self.isDirty = True
+
+    def build(self):
+        """
+        Computes the failure links breadth-first, and the full set of keywords
+        that end at each node (its own plus those of its failure link).
+
+        """
+        self.outputs[0] = tuple(self.ends[0])
+        queue = []
+
+        for child in self.children[0].itervalues():
+            self.fail[child] = 0
+            self.outputs[child] = tuple(self.ends[child])
+            queue.append(child)
+
+        i = 0
+        while i < len(queue):
+            node = queue[i]
+            i += 1
+
+            for c, child in self.children[node].iteritems():
+                fail = self.fail[node]
+
+                while (fail and c not in self.children[fail]):
+                    fail = self.fail[fail]
+
+                self.fail[child] = self.children[fail].get(c, 0)
+                self.outputs[child] = tuple(self.ends[child]) + self.outputs[self.fail[child]]
+                queue.append(child)
+
+        self.isDirty = False
+
+    def find(self, s):
+        """
+        Returns the keywords that occur in ``s``, in the order in which they
+        first appear.
+
+        """
+        if (self.isDirty):
+            self.build()
+
+        found = []
+        seen = set()
+        node = 0
+
+        for c in s:
+            while (node and c not in self.children[node]):
+                node = self.fail[node]
+
+            node = self.children[node].get(c, 0)
+
+            for keyword in self.outputs[node]:
+                if (keyword not in seen):
+                    seen.add(keyword)
+                    found.append(keyword)
+
+        return found
+
+    def update(self, keywords):
+        """
+        Brings the index in line with ``keywords``, adding and removing only
+        the keywords that have changed.
+
+        """
+        keywords = set(keywords)
+
+        for keyword in self.keywords - keywords:
+            self.remove(keyword)
+
+        for keyword in keywords - self.keywords:
+            self.add(keyword)
+
+_index = KeywordIndex()
+_indexLock = threading.Lock()
+
+def getKeywordList(db):
+    """
+    Returns the list of keywords in the ``keyword`` table, read through the
+    shared cache.
+
+    """
+    def loadKeywords():
+        sql = "select keyword from keyword"
+        return [d.keyword for d in db.query(sql)]
+
+    return CacheHolder.get_cache().get_or_set('list', loadKeywords,
+                                              time = KEYWORD_CACHE_TIMEOUT,
+                                              namespace = KEYWORD_CACHE_NAMESPACE)
+
+def getKeywordIndex(db):
+    """
+    Returns the process-wide ``KeywordIndex``, updated with any changes to the
+    ``keyword`` table.
+
+    """
+    keywords = getKeywordList(db)
+
+    with _indexLock:
+        if (len(keywords) != len(_index.keywords) or not _index.keywords.issuperset(keywords)):
+            _index.update(keywords)
+
+        if (_index.isDirty):
+            _index.build()
+
+    return _index
+
+def expireKeywords():
+    """
+    Expires the cached keyword list, so the index picks up changes to the
+    ``keyword`` table.
+
+    """
+    CacheHolder.get_cache().bump_namespace(KEYWORD_CACHE_NAMESPACE)
+
 # find keywords in a string
 def getKeywords(db, s):
-    sql = "select keyword from keyword"
-    data = list(db.query(sql))
-    
+    try:
+        index = getKeywordIndex(db)
+
+        with _indexLock:
+            return index.find(s or '')
+    except Exception, e:
+        log.info("*** couldn't find keywords")
+        log.error(e)
+        return []
+
+# Each project's and resource's keywords are kept twice: as a space-separated
+# string in its ``keywords`` column, for display and the fulltext indexes, and
+# as one row per keyword in project_keyword or resource_keyword, for lookups
+# and counts.  The functions below write the rows, and rebuild the string from
+# them where they change it.
+ITEM_KEYWORD_TABLES = dict(project = ('project_keyword', 'project_id'),
+                           project_resource = ('resource_keyword', 'project_resource_id'))
+
+# The length of the keyword columns.  Longer words are left out.
+KEYWORD_MAX_LENGTH = 100
+
+def splitKeywords(keywords):
+    """
+    Returns the distinct words in a keyword string, or in a list of them, in
+    the order they first appear.
+
+    """
+    if (not keywords):
+        return []
+
+    if (not isinstance(keywords, basestring)):
+        keywords = ' '.join([word for word in keywords if word])
+
     words = []
-    
-    for d in data:
-        if (d.keyword in s):
-            words.append(d.keyword)
-            
+
+    for word in keywords.split():
+        if (len(word) <= KEYWORD_MAX_LENGTH and word not in words):
+            words.append(word)
+
     return words
+
+def getItemKeywords(db, table, itemId):
+    keywordTable, idColumn = ITEM_KEYWORD_TABLES[table]
+
+    sql = """select keyword from %(keywordTable)s where %(idColumn)s = $id
+            order by %(keywordTable)s_id""" % {'keywordTable':keywordTable, 'idColumn':idColumn}
+    return [row.keyword for row in db.query(sql, {'id':itemId})]
+
+def insertItemKeywords(db, table, itemId, keywords):
+    """
+    Adds keyword rows for an item, ignoring those it already has.  Doesn't
+    change the item's keyword string.
+
+    """
+    keywordTable, idColumn = ITEM_KEYWORD_TABLES[table]
+    keywords = splitKeywords(keywords)
+
+    if (not keywords):
+        return
+
+    vars = dict(('keyword%s' % i, keyword) for i, keyword in enumerate(keywords))
+    vars['id'] = itemId
+
+    sql = "insert ignore into %(keywordTable)s (%(idColumn)s, keyword) values %(values)s" % \
+            {'keywordTable':keywordTable,
+             'idColumn':idColumn,
+             'values':', '.join(['($id, $keyword%s)' % i for i in range(len(keywords))])}
+    db.query(sql, vars)
+
+def setItemKeywords(db, table, itemId, keywords):
+    """
+    Replaces an item's keyword rows with the words in ``keywords``, after its
+    keyword string has been written.
+
+    """
+    try:
+        keywordTable, idColumn = ITEM_KEYWORD_TABLES[table]
+
+        db.query("delete from %s where %s = $id" % (keywordTable, idColumn), {'id':itemId})
+        insertItemKeywords(db, table, itemId, keywords)
+        return True
+    except Exception, e:
+        log.info("*** couldn't set keywords for %s %s" % (table, itemId))
+        log.error(e)
+        return False
+
+def removeItemKeywords(db, table, itemId, keywords):
+    """
+    Removes keyword rows from an item, and returns the number removed.
+    Doesn't change the item's keyword string.
+
+    """
+    keywordTable, idColumn = ITEM_KEYWORD_TABLES[table]
+
+    if (not keywords):
+        return 0
+
+    sql = "delete from %s where %s = $id and keyword in $keywords" % (keywordTable, idColumn)
+    return db.query(sql, {'id':itemId, 'keywords':list(keywords)})
+
+def updateKeywordString(db, table, itemId):
+    """
+    Rewrites an item's keyword string from its keyword rows.
+
+    """
+    keywords = ' '.join(getItemKeywords(db, table, itemId))
+    db.query("update %(table)s set keywords = $keywords where %(table)s_id = $id" % {'table':table},
+             {'id':itemId, 'keywords':keywords})
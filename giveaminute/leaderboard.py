@@ -0,0 +1,177 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+"""
+The project leaderboard: active projects with active owners, ranked by their
+number of members.
+
+The project_leaderboard table holds each project's member count and whether it
+is ranked, and is updated one project at a time as memberships change.  Each
+process keeps the ranked projects in a sorted list, and brings it up to date
+by reading only the rows that have changed since it last looked, whenever the
+'leaderboard' cache namespace is bumped.  Ranks and pages are then looked up
+by position in the list.
+
+"""
+
+import bisect
+import threading
+import time
+from datetime import datetime
+from framework.cache_holder import CacheHolder
+from framework.log import log
+
+LEADERBOARD_CACHE_NAMESPACE = 'leaderboard'
+
+# Even without a change being signalled, check for changed rows this often.
+LEADERBOARD_SYNC_INTERVAL = 5 * 60
+
+EPOCH = datetime(1970, 1, 1)
+
+class Leaderboard():
+    """
+    Projects sorted by number of members, most first, then by project id.
+
+    """
+    def __init__(self):
+        self.keys = []
+        self.numMembers = {}
+        self.version = None
+        self.lastUpdated = EPOCH
+        self.lastSynced = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def put(self, projectId, numMembers):
+        self.remove(projectId)
+
+        bisect.insort(self.keys, (-numMembers, projectId))
+        self.numMembers[projectId] = numMembers
+
+    def remove(self, projectId):
+        numMembers = self.numMembers.pop(projectId, None)
+
+        if (numMembers is not None):
+            i = bisect.bisect_left(self.keys, (-numMembers, projectId))
+            del self.keys[i]
+
+    def rank(self, projectId):
+        """
+        Returns the 1-based rank of a project, or None if it isn't ranked.
+
+        """
+        numMembers = self.numMembers.get(projectId)
+
+        if (numMembers is None):
+            return None
+
+        return bisect.bisect_left(self.keys, (-numMembers, projectId)) + 1
+
+    def page(self, limit, offset = 0):
+        """
+        Returns a list of ``(projectId, numMembers)`` for a page of the
+        leaderboard.
+
+        """
+        return [(projectId, -negNumMembers) for negNumMembers, projectId in self.keys[offset:offset + limit]]
+
+    def update(self, db):
+        """
+        Reads the project_leaderboard rows changed since the last update.
+
+        """
+        sql = """select project_id, num_members, is_ranked, updated_datetime
+                from project_leaderboard
+                where updated_datetime >= $since"""
+
+        for row in db.query(sql, {'since':self.lastUpdated}):
+            if (row.is_ranked):
+                self.put(row.project_id, row.num_members)
+            else:
+                self.remove(row.project_id)
+
+            if (row.updated_datetime > self.lastUpdated):
+                self.lastUpdated = row.updated_datetime
+
+        self.lastSynced = time.time()
+
+# Recomputes the project_leaderboard rows for one project, or all of them.
+UPDATE_SQL = """insert into project_leaderboard (project_id, num_members, is_ranked)
+                select p.project_id,
+                    coalesce(ps.num_members, 0),
+                    (p.is_active = 1 and u.is_active = 1)
+                from project p
+                inner join project__user o on o.project_id = p.project_id and o.is_project_creator = 1
+                inner join user u on u.user_id = o.user_id
+                left join project_stats ps on ps.project_id = p.project_id
+                where ($projectId is null or p.project_id = $projectId)
+                on duplicate key update num_members = values(num_members),
+                    is_ranked = values(is_ranked)"""
+
+def updateProjectRank(db, projectId = None):
+    """
+    Updates the leaderboard for a change to one project's member count or
+    status, or, if ``projectId`` is None, for every project.
+
+    """
+    try:
+        db.query(UPDATE_SQL, {'projectId':projectId})
+    except Exception, e:
+        log.info("*** couldn't update leaderboard for project %s" % projectId)
+        log.error(e)
+        return False
+
+    CacheHolder.get_cache().bump_namespace(LEADERBOARD_CACHE_NAMESPACE)
+    return True
+
+def rebuildLeaderboard(db):
+    return updateProjectRank(db, None)
+
+_leaderboard = Leaderboard()
+_leaderboardLock = threading.Lock()
+
+def getLeaderboard(db):
+    """
+    Returns the process-wide ``Leaderboard``, brought up to date if the
+    leaderboard has changed.  Use it under ``_leaderboardLock``.
+
+    """
+    version = CacheHolder.get_cache().namespace_version(LEADERBOARD_CACHE_NAMESPACE)
+
+    if (version != _leaderboard.version or
+        time.time() - _leaderboard.lastSynced > LEADERBOARD_SYNC_INTERVAL):
+        _leaderboard.update(db)
+        _leaderboard.version = version
+
+    return _leaderboard
+
+def getLeaderboardPage(db, limit = 10, offset = 0):
+    """
+    Returns a list of ``(projectId, numMembers)`` for a page of the
+    leaderboard, or an empty list if it can't be read.
+
+    """
+    try:
+        with _leaderboardLock:
+            return getLeaderboard(db).page(limit, offset)
+    except Exception, e:
+        log.info("*** couldn't get leaderboard")
+        log.error(e)
+        return []
+
+def getProjectRank(db, projectId):
+    """
+    Returns the 1-based leaderboard rank of a project, or None if it isn't
+    ranked.
+
+    """
+    try:
+        with _leaderboardLock:
+            return getLeaderboard(db).rank(int(projectId))
+    except Exception, e:
+        log.info("*** couldn't get leaderboard rank for project %s" % projectId)
+        log.error(e)
+        return None
@@ -3,31 +3,30 @@
     :license: Affero GNU GPL v3, see LICENSE for more details.
 """
 
+from framework.cache_holder import CacheHolder
 from framework.log import log
-  
+
+LOCATION_CACHE_NAMESPACE = 'locations'
+LOCATION_CACHE_TIMEOUT = 60 * 60
+
 def getLocationsWithScoring(db):
     data = []
     
     log.info("*** hit locations")
 
     try:
-        # TODO
-        # this is temporary until actual scoring is determined
+        # the counts are kept in location_stats by giveaminute.stats
         sql = """
 select l.location_id,
     l.name,
     l.lat,
     l.lon,
-    count(distinct p.project_id) as num_projects,
-    count(distinct i.idea_id) as num_ideas,
-    count(distinct r.project_resource_id) as num_project_resources
-from location l 
-	left join project p on p.location_id = l.location_id and p.is_active=1
-    left join project__user pu on p.project_id=pu.project_id and pu.is_project_admin = 1 and p.is_active=1
-	left join idea i on l.location_id = i.location_id and i.is_active=1
-	left join project_resource r on l.location_id = r.location_id and r.is_active=1 and r.is_hidden=0
+    coalesce(ls.num_projects, 0) as num_projects,
+    coalesce(ls.num_ideas, 0) as num_ideas,
+    coalesce(ls.num_project_resources, 0) as num_project_resources
+from location l
+    left join location_stats ls on ls.location_id = l.location_id
 where l.location_id > 0
-group by l.location_id+l.lat+l.lon
 order by l.location_id""";
 
         data = list(db.query(sql))
@@ -36,7 +35,41 @@ order by l.location_id""";
         log.error(e)
 
     return data 
-        
+
+# TODO
+# this is temporary until actual scoring is determined
+def calcScore(numProjects, numIdeas, numResources):
+    return numProjects + numIdeas + numResources
+
+def getScoredLocationsUncached(db):
+    locations = []
+
+    for item in getLocationsWithScoring(db):
+        locations.append(dict(name = item.name,
+                              location_id = item.location_id,
+                              lat = str(item.lat),
+                              lon = str(item.lon),
+                              n_projects = item.num_projects,
+                              n_ideas = item.num_ideas,
+                              n_resources = item.num_project_resources,
+                              score = calcScore(item.num_projects, item.num_ideas, item.num_project_resources)))
+
+    return sorted(locations, key = lambda k:k['score'], reverse = True)
+
+def getScoredLocations(db):
+    """
+    Returns the locations with their counts and scores, highest score first,
+    through the shared cache.  The cache is expired whenever the counts in
+    location_stats change.
+
+    """
+    return CacheHolder.get_cache().get_or_set('scored', lambda: getScoredLocationsUncached(db) or None,
+                                              time = LOCATION_CACHE_TIMEOUT,
+                                              namespace = LOCATION_CACHE_NAMESPACE) or []
+
+def expireScoredLocations():
+    CacheHolder.get_cache().bump_namespace(LOCATION_CACHE_NAMESPACE)
+
 def getLocations(db):
     data = []
 
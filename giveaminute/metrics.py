@@ -37,20 +37,13 @@ def getProjectCounts(db):
     
     try:
         sql = """select p.title,
-                  (select count(pu.user_id) from project__user pu 
-                      inner join user u on u.user_id = pu.user_id and u.is_active = 1
-                      where pu.project_id = p.project_id) as num_users,
-                  (select count(pi.idea_id) from project__idea pi  
-                      inner join idea i on i.idea_id = pi.idea_id and i.is_active = 1
-                      where pi.project_id = p.project_id) as num_ideas,
-                  (select count(pr.project_resource_id) from project__project_resource pr 
-                      inner join project_resource r on r.project_resource_id = pr.project_resource_id and r.is_active = 1
-                      where pr.project_id = p.project_id) as num_resources,
-                  (select count(pe.user_id) from project_endorsement pe 
-                      inner join user u on u.user_id = pe.user_id and u.is_active = 1
-                      where pe.project_id = p.project_id) as num_endorsements,
+                  coalesce(ps.num_members, 0) as num_users,
+                  coalesce(ps.num_ideas, 0) as num_ideas,
+                  coalesce(ps.num_project_resources, 0) as num_resources,
+                  coalesce(ps.num_endorsements, 0) as num_endorsements,
                   coalesce(p.keywords, '') as keywords
                 from project p
+                left join project_stats ps on ps.project_id = p.project_id
                 where p.is_active = 1
                 order by p.title"""
         data = list(db.query(sql))
@@ -124,13 +117,15 @@ def getKeywordUsage(db, limit = 10, offset = 0):
     data = []
     
     try:
-        sql = """select k.keyword as word, 
-                      (select count(p.project_id) from project p where p.keywords like concat('%%%%', k.keyword, '%%%%')) as num_projects,
-                      (select count(r.project_resource_id) from project_resource r where r.keywords like concat('%%%%', k.keyword, '%%%%')) as num_resources
+        sql = """select k.keyword as word,
+                      coalesce(pk.num_projects, 0) as num_projects,
+                      coalesce(rk.num_resources, 0) as num_resources
                 from keyword k
-                order by 
-                    ((select count(p.project_id) from project p where keywords like concat('%%%%', k.keyword, '%%%%'))
-                    + (select count(r.project_resource_id) from project_resource r where r.keywords like concat('%%%%', k.keyword, '%%%%'))) desc
+                left join (select keyword, count(*) as num_projects from project_keyword
+                            group by keyword) pk on pk.keyword = k.keyword
+                left join (select keyword, count(*) as num_resources from resource_keyword
+                            group by keyword) rk on rk.keyword = k.keyword
+                order by coalesce(pk.num_projects, 0) + coalesce(rk.num_resources, 0) desc, k.keyword
                 limit $limit offset $offset"""
         data = list(db.query(sql, {'limit':limit, 'offset':offset}))
     except Exception, e:
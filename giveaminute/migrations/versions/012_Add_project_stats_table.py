@@ -0,0 +1,53 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+from sqlalchemy import *
+from sqlalchemy.dialects.mysql import INTEGER
+from migrate import *
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind migrate_engine
+    # to your metadata
+
+    meta = MetaData(migrate_engine)
+
+    projectstats = Table('project_stats', meta,
+        Column('project_id', Integer, primary_key=True, autoincrement=False),
+        Column('num_members', INTEGER(unsigned=True), nullable=False, default=0, index=True),
+        Column('num_ideas', INTEGER(unsigned=True), nullable=False, default=0),
+        Column('num_project_resources', INTEGER(unsigned=True), nullable=False, default=0),
+        Column('num_endorsements', INTEGER(unsigned=True), nullable=False, default=0),
+        Column('updated_datetime', TIMESTAMP, nullable=False,
+               server_default=text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP')),
+    )
+    projectstats.create()
+
+    # Backfill the counts for the existing projects.
+    migrate_engine.execute("""
+        INSERT INTO project_stats (project_id, num_members, num_ideas, num_project_resources, num_endorsements)
+        SELECT p.project_id,
+            (SELECT count(npu.user_id) FROM project__user npu
+                INNER JOIN user nu ON nu.user_id = npu.user_id AND nu.is_active = 1
+                WHERE npu.project_id = p.project_id),
+            (SELECT count(npi.idea_id) FROM project__idea npi
+                INNER JOIN idea ni ON ni.idea_id = npi.idea_id AND ni.is_active = 1
+                WHERE npi.project_id = p.project_id),
+            (SELECT count(npr.project_resource_id) FROM project__project_resource npr
+                INNER JOIN project_resource nr ON nr.project_resource_id = npr.project_resource_id
+                    AND nr.is_active = 1 AND nr.is_hidden = 0
+                WHERE npr.project_id = p.project_id),
+            (SELECT count(e.user_id) FROM project_endorsement e
+                WHERE e.project_id = p.project_id)
+        FROM project p
+    """)
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+
+    meta = MetaData(migrate_engine)
+
+    projectstats = Table('project_stats', meta, autoload=True)
+    projectstats.drop()
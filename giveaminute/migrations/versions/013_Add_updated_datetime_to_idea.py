@@ -0,0 +1,34 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+from sqlalchemy import *
+from migrate import *
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind migrate_engine
+    # to your metadata
+
+    # MySQL only allows one auto-set timestamp per table, so move it from
+    # created_datetime (which is now set on insert, as for the other tables)
+    # to a new updated_datetime.
+    migrate_engine.execute("""
+        ALTER TABLE idea
+            MODIFY created_datetime timestamp NOT NULL DEFAULT '0000-00-00 00:00:00',
+            ADD COLUMN updated_datetime timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    """)
+
+    migrate_engine.execute("""
+        UPDATE idea SET updated_datetime = created_datetime
+    """)
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+
+    migrate_engine.execute("""
+        ALTER TABLE idea
+            DROP COLUMN updated_datetime,
+            MODIFY created_datetime timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
+    """)
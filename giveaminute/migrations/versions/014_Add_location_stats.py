@@ -0,0 +1,47 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+from sqlalchemy import *
+from sqlalchemy.dialects.mysql import INTEGER
+from migrate import *
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind migrate_engine
+    # to your metadata
+
+    meta = MetaData(migrate_engine)
+
+    locationstats = Table('location_stats', meta,
+        Column('location_id', Integer, primary_key=True, autoincrement=False),
+        Column('num_projects', INTEGER(unsigned=True), nullable=False, default=0),
+        Column('num_ideas', INTEGER(unsigned=True), nullable=False, default=0),
+        Column('num_project_resources', INTEGER(unsigned=True), nullable=False, default=0),
+        Column('updated_datetime', TIMESTAMP, nullable=False,
+               server_default=text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP')),
+    )
+    locationstats.create()
+
+    # Backfill the counts for the existing locations.
+    migrate_engine.execute("""
+        INSERT INTO location_stats (location_id, num_projects, num_ideas, num_project_resources)
+        SELECT l.location_id,
+            (SELECT count(p.project_id) FROM project p
+                WHERE p.location_id = l.location_id AND p.is_active = 1),
+            (SELECT count(i.idea_id) FROM idea i
+                WHERE i.location_id = l.location_id AND i.is_active = 1),
+            (SELECT count(r.project_resource_id) FROM project_resource r
+                WHERE r.location_id = l.location_id AND r.is_active = 1 AND r.is_hidden = 0)
+        FROM location l
+        WHERE l.location_id > 0
+    """)
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+
+    meta = MetaData(migrate_engine)
+
+    locationstats = Table('location_stats', meta, autoload=True)
+    locationstats.drop()
@@ -0,0 +1,45 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+from sqlalchemy import *
+from migrate import *
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind migrate_engine
+    # to your metadata
+
+    meta = MetaData(migrate_engine)
+
+    leaderboard = Table('project_leaderboard', meta,
+        Column('project_id', Integer, primary_key=True, autoincrement=False),
+        Column('num_members', Integer, nullable=False, default=0),
+        Column('is_ranked', Boolean, nullable=False, default=False),
+        Column('updated_datetime', TIMESTAMP, nullable=False, index=True,
+               server_default=text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP')),
+    )
+    leaderboard.create()
+
+    # Backfill the leaderboard for the existing projects.
+    migrate_engine.execute("""
+        INSERT INTO project_leaderboard (project_id, num_members, is_ranked)
+        SELECT p.project_id,
+            coalesce(ps.num_members, 0),
+            (p.is_active = 1 AND u.is_active = 1)
+        FROM project p
+        INNER JOIN project__user o ON o.project_id = p.project_id AND o.is_project_creator = 1
+        INNER JOIN user u ON u.user_id = o.user_id
+        LEFT JOIN project_stats ps ON ps.project_id = p.project_id
+        ON DUPLICATE KEY UPDATE num_members = VALUES(num_members),
+            is_ranked = VALUES(is_ranked)
+    """)
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+
+    meta = MetaData(migrate_engine)
+
+    leaderboard = Table('project_leaderboard', meta, autoload=True)
+    leaderboard.drop()
@@ -0,0 +1,31 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+from sqlalchemy import *
+from migrate import *
+
+# Indexes that let the project and user message feeds be read in
+# (created_datetime, id) order, starting from a cursor.
+FEED_INDEXES = [
+    ('project_message', 'project_feed', 'project_id, is_active, created_datetime, project_message_id'),
+    ('project_message', 'project_type_feed', 'project_id, message_type, created_datetime, project_message_id'),
+    ('project__user', 'user_id', 'user_id'),
+    ('idea', 'user_id', 'user_id'),
+    ('project_invite', 'invitee_idea_feed', 'invitee_idea_id, created_datetime, project_invite_id'),
+]
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind migrate_engine
+    # to your metadata
+
+    for table, name, columns in FEED_INDEXES:
+        migrate_engine.execute("ALTER TABLE %s ADD KEY %s (%s)" % (table, name, columns))
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+
+    for table, name, columns in FEED_INDEXES:
+        migrate_engine.execute("ALTER TABLE %s DROP KEY %s" % (table, name))
@@ -0,0 +1,55 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+from sqlalchemy import *
+from migrate import *
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind migrate_engine
+    # to your metadata
+
+    meta = MetaData(migrate_engine)
+
+    inbox = Table('user_inbox', meta,
+        Column('user_inbox_id', Integer, primary_key=True),
+        Column('user_id', Integer, nullable=False),
+        Column('project_id', Integer, nullable=False),
+        Column('project_message_id', Integer, nullable=True),
+        Column('project_invite_id', Integer, nullable=True),
+        # Copied from the message or invite, so not set automatically.
+        Column('created_datetime', TIMESTAMP, nullable=False,
+               server_default=text("'0000-00-00 00:00:00'")),
+        UniqueConstraint('user_id', 'project_message_id', name='user_message'),
+        UniqueConstraint('user_id', 'project_invite_id', name='user_invite'),
+    )
+    Index('user_feed', inbox.c.user_id, inbox.c.created_datetime, inbox.c.user_inbox_id)
+    Index('project_user', inbox.c.project_id, inbox.c.user_id)
+    inbox.create()
+
+    # Backfill the inboxes from the existing messages and invites.
+    migrate_engine.execute("""
+        INSERT IGNORE INTO user_inbox (user_id, project_id, project_message_id, created_datetime)
+        SELECT pu.user_id, m.project_id, m.project_message_id, m.created_datetime
+        FROM project_message m
+        INNER JOIN project__user pu ON pu.project_id = m.project_id
+        WHERE m.is_active = 1
+    """)
+
+    migrate_engine.execute("""
+        INSERT IGNORE INTO user_inbox (user_id, project_id, project_invite_id, created_datetime)
+        SELECT i.user_id, inv.project_id, inv.project_invite_id, inv.created_datetime
+        FROM project_invite inv
+        INNER JOIN idea i ON i.idea_id = inv.invitee_idea_id
+        WHERE i.user_id IS NOT NULL
+    """)
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+
+    meta = MetaData(migrate_engine)
+
+    inbox = Table('user_inbox', meta, autoload=True)
+    inbox.drop()
@@ -0,0 +1,39 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+from collections import defaultdict
+
+from sqlalchemy import *
+from migrate import *
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind migrate_engine
+    # to your metadata
+
+    # Keywords are compared case-sensitively, as they are on the projects.
+    migrate_engine.execute("""
+        CREATE TABLE keyword_stats (
+            keyword varchar(100) CHARACTER SET utf8 COLLATE utf8_bin NOT NULL,
+            num_projects int(11) NOT NULL DEFAULT '0',
+            PRIMARY KEY (keyword),
+            KEY num_projects (num_projects)
+        ) ENGINE=MyISAM DEFAULT CHARSET=utf8
+    """)
+
+    # Backfill the counts from the active projects' keywords.
+    counts = defaultdict(int)
+    for row in migrate_engine.execute("SELECT keywords FROM project WHERE is_active = 1 AND keywords IS NOT NULL"):
+        for keyword in row[0].split():
+            counts[keyword] += 1
+
+    for keyword, count in counts.iteritems():
+        migrate_engine.execute("INSERT INTO keyword_stats (keyword, num_projects) VALUES (%s, %s)",
+                               keyword, count)
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+
+    migrate_engine.execute("DROP TABLE keyword_stats")
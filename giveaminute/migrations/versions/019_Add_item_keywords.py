@@ -0,0 +1,48 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+from sqlalchemy import *
+from migrate import *
+
+# The keyword rows for each kind of item, and the item table they are read
+# from.
+KEYWORD_TABLES = (('project_keyword', 'project', 'project_id'),
+                  ('resource_keyword', 'project_resource', 'project_resource_id'))
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine; bind migrate_engine
+    # to your metadata
+
+    for keywordTable, itemTable, idColumn in KEYWORD_TABLES:
+        # Keywords are compared case-sensitively, as in keyword_stats.
+        migrate_engine.execute("""
+            CREATE TABLE %(keywordTable)s (
+                %(keywordTable)s_id int(11) NOT NULL AUTO_INCREMENT,
+                %(idColumn)s int(11) NOT NULL,
+                keyword varchar(100) CHARACTER SET utf8 COLLATE utf8_bin NOT NULL,
+                PRIMARY KEY (%(keywordTable)s_id),
+                UNIQUE KEY %(idColumn)s_keyword (%(idColumn)s, keyword),
+                KEY keyword (keyword, %(idColumn)s)
+            ) ENGINE=MyISAM DEFAULT CHARSET=utf8
+        """ % {'keywordTable':keywordTable, 'idColumn':idColumn})
+
+        # Backfill the rows from the keyword strings, keeping their order.
+        rows = []
+        for itemId, keywords in migrate_engine.execute(
+                "SELECT %s, keywords FROM %s WHERE keywords IS NOT NULL ORDER BY %s" % (idColumn, itemTable, idColumn)):
+            for keyword in keywords.split():
+                if len(keyword) <= 100:
+                    rows.append((itemId, keyword))
+
+        if rows:
+            migrate_engine.execute("INSERT IGNORE INTO %s (%s, keyword) VALUES (%%s, %%s)" % (keywordTable, idColumn),
+                                   rows)
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+
+    for keywordTable, itemTable, idColumn in KEYWORD_TABLES:
+        migrate_engine.execute("DROP TABLE %s" % keywordTable)
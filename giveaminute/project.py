@@ -4,7 +4,8 @@
 """
 
 import os
-from datetime import timedelta
+import urllib
+from datetime import datetime, timedelta
 
 from framework import util
 from framework.log import log
@@ -13,7 +14,11 @@ from framework.config import Config
 #from framework.emailer import *
 from framework.util import local_utcoffset
 import giveaminute.idea
+import giveaminute.inbox
+import giveaminute.keywords
+import giveaminute.leaderboard
 import giveaminute.messaging
+import giveaminute.stats
 import helpers.censor
 import jinja2 
 
@@ -21,6 +26,7 @@ class Project():
     def __init__(self, db, projectId):
         self.id = projectId
         self.db = db
+        self.numQueries = 0
         self.data = self.populateProjectData()
 
     def populateProjectData(self):
@@ -35,9 +41,7 @@ select p.project_id
     ,p.updated_datetime
     ,p.is_official
     ,if(fp.ordinal, 1, 0) as is_featured
-    ,(select count(npu.user_id) from project__user npu
-        inner join user nu on nu.user_id = npu.user_id and nu.is_active = 1
-        where npu.project_id = p.project_id)  as num_members
+    ,coalesce(ps.num_members, 0) as num_members
     ,l.location_id
     ,l.name as location_name
     ,l.lat as location_lat
@@ -54,10 +58,12 @@ inner join location l on l.location_id = p.location_id
 inner join project__user pu on pu.project_id = p.project_id and pu.is_project_creator
 inner join user u on u.user_id = pu.user_id
 left join featured_project fp on fp.project_id = p.project_id
+left join project_stats ps on ps.project_id = p.project_id
 where p.project_id = $id and p.is_active = 1
 limit 1"""
 
         try:
+            self.numQueries += 1
             data = list(self.db.query(sql, {'id':self.id}))
 
             if len(data) > 0:
@@ -70,15 +76,25 @@ limit 1"""
             return None
 
     def getFullDictionary(self):
+        """
+        Return everything the project page needs as a single dictionary.  The
+        members, endorsements, links, resources, latest messages and related
+        ideas are all fetched in one round trip by ``getPageData``.
+
+        """
         if self.data is None:
             return None
 
-        members = self.getMembers()
-        endorsements = self.getEndorsements()
-        links = self.getLinks()
-        projectResources = self.getResources()
-        messages = self.getMessages()
-        relatedIdeas = self.getRelatedIdeas()
+        pageData = self.getPageData()
+
+        members = pageData['members']
+        endorsements = pageData['endorsements']
+        links = pageData['links']
+        projectResources = pageData['resources']
+        messages = pageData['messages']
+        relatedIdeas = pageData['related_ideas']
+
+        log.info("*** project %s page loaded in %s queries" % (self.id, self.numQueries))
 
         data = dict(project_id = self.id,
                     editable = True,
@@ -177,6 +193,206 @@ limit 1"""
     def getMessages(self):
         return getMessages(self.db, self.id, 10, 0)
 
+    def getConversationDictionary(self):
+        """
+        Return the subset of the full dictionary used by the conversation RSS
+        feed: the title, mission and latest messages.  Costs a single query on
+        top of loading the project.
+
+        """
+        if self.data is None:
+            return None
+
+        self.numQueries += 1
+        messages = self.getMessages()
+
+        return dict(project_id = self.id,
+                    info = dict(title = self.data.title,
+                                mission = self.data.description,
+                                messages = dict(n_returned = len(messages),
+                                                offset = 0,
+                                                total = len(messages),
+                                                items = messages)))
+
+    def getPageData(self):
+        """
+        Fetch the members, endorsements, links, resources, latest messages and
+        related ideas for the project in one ``union all`` round trip, and
+        format each section the same way the individual getters do.
+
+        """
+        pageData = dict(members = [],
+                        endorsements = [],
+                        links = [],
+                        resources = [],
+                        messages = [],
+                        related_ideas = [])
+
+        keywords = self.data.keywords.split() if self.data.keywords else []
+        match = ' '.join([(item + "*") for item in keywords])
+
+        try:
+            self.numQueries += 1
+            sql = PAGE_DATA_SQL if keywords else PAGE_DATA_NO_IDEAS_SQL
+            data = list(self.db.query(sql, {'id':self.id,
+                                            'locationId':self.data.location_id,
+                                            'match':match,
+                                            'limit':10}))
+        except Exception, e:
+            log.info("*** couldn't get project page data")
+            log.error(e)
+            return pageData
+
+        for item in data:
+            if (item.section in ('member', 'endorsement')):
+                user = smallUserDisplay(item.user_id,
+                                        userNameDisplay(item.first_name,
+                                                        item.last_name,
+                                                        item.affiliation,
+                                                        isFullLastName(item.group_membership_bitmask)),
+                                        item.image_id)
+                pageData['%ss' % item.section].append(user)
+            elif (item.section == 'link'):
+                pageData['links'].append(link(item.item_id, item.title, item.url, item.image_id))
+            elif (item.section == 'resource'):
+                pageData['resources'].append(dict(organization = item.item_id,
+                                                  title = item.title,
+                                                  url = item.url,
+                                                  image_id = item.image_id,
+                                                  is_official = item.is_official))
+            elif (item.section == 'message'):
+                pageData['messages'].append(message(id = item.item_id,
+                                                    type = item.message_type,
+                                                    message = item.body,
+                                                    attachmentId = item.file_id,
+                                                    createdDatetime = item.created_datetime,
+                                                    userId = item.user_id,
+                                                    name = userNameDisplay(item.first_name, item.last_name, item.affiliation, isFullLastName(item.group_membership_bitmask)),
+                                                    imageId = item.image_id,
+                                                    ideaId = item.idea_id,
+                                                    idea = item.idea_description,
+                                                    ideaSubType = item.idea_submission_type,
+                                                    ideaCreatedDatetime = item.idea_created_datetime,
+                                                    attachmentMediaType = item.attachment_type,
+                                                    attachmentMediaId = item.attachment_id,
+                                                    attachmentTitle = item.attachment_title))
+            elif (item.section == 'idea'):
+                owner = None
+
+                if (item.user_id):
+                    owner = dict(u_id = item.user_id,
+                                 image_id = item.image_id,
+                                 name = giveaminute.idea.ideaName(item.first_name, item.last_name, item.affiliation))
+
+                pageData['related_ideas'].append(dict(idea_id = item.item_id,
+                                                      message = item.idea_description,
+                                                      created = str(item.created_datetime),
+                                                      submission_type = item.idea_submission_type,
+                                                      owner = owner))
+
+        return pageData
+
+## PAGE DATA QUERY
+# Every section of the project page query selects the same list of columns so
+# that they can be combined with ``union all``; columns that a section doesn't
+# use are selected as null.
+PAGE_DATA_COLUMNS = ['section', 'item_id', 'user_id', 'first_name', 'last_name',
+                     'affiliation', 'group_membership_bitmask', 'image_id',
+                     'title', 'url', 'is_official', 'message_type', 'body',
+                     'file_id', 'created_datetime', 'attachment_type',
+                     'attachment_id', 'attachment_title', 'idea_id',
+                     'idea_description', 'idea_submission_type',
+                     'idea_created_datetime']
+
+def pageDataSelect(columns, tail):
+    select = ',\n            '.join(["%s as %s" % (columns.get(name, 'null'), name) for name in PAGE_DATA_COLUMNS])
+    return "(select %s\n        %s)" % (select, tail)
+
+_userColumns = dict(user_id = 'u.user_id',
+                    first_name = 'u.first_name',
+                    last_name = 'u.last_name',
+                    affiliation = 'u.affiliation',
+                    group_membership_bitmask = 'u.group_membership_bitmask',
+                    image_id = 'u.image_id')
+
+_pageDataSelects = [
+    pageDataSelect(dict(_userColumns, section = "'member'", item_id = 'u.user_id'),
+                   """from user u
+        inner join project__user pu on pu.user_id = u.user_id and pu.project_id = $id"""),
+
+    pageDataSelect(dict(_userColumns, section = "'endorsement'", item_id = 'u.user_id'),
+                   """from project_endorsement pe
+        inner join user u on pe.user_id = u.user_id
+        where pe.project_id = $id"""),
+
+    pageDataSelect(dict(section = "'link'",
+                        item_id = 'pl.project_link_id',
+                        title = 'pl.title',
+                        url = 'pl.url',
+                        image_id = 'pl.image_id'),
+                   """from project_link pl
+        where pl.project_id = $id and pl.is_active = 1"""),
+
+    pageDataSelect(dict(section = "'resource'",
+                        item_id = 'pr.project_resource_id',
+                        title = 'pr.title',
+                        url = 'pr.url',
+                        image_id = 'pr.image_id',
+                        is_official = 'pr.is_official'),
+                   """from project_resource pr
+        inner join project__project_resource ppr on ppr.project_resource_id = pr.project_resource_id and ppr.project_id = $id
+        where pr.is_active = 1 and pr.is_hidden = 0"""),
+
+    pageDataSelect(dict(_userColumns,
+                        section = "'message'",
+                        item_id = 'm.project_message_id',
+                        message_type = 'm.message_type',
+                        body = 'm.message',
+                        file_id = 'm.file_id',
+                        created_datetime = 'm.created_datetime',
+                        attachment_type = 'a.type',
+                        attachment_id = 'a.media_id',
+                        attachment_title = 'a.title',
+                        idea_id = 'i.idea_id',
+                        idea_description = 'i.description',
+                        idea_submission_type = 'i.submission_type',
+                        idea_created_datetime = 'i.created_datetime'),
+                   """from project_message m
+        inner join user u on u.user_id = m.user_id
+        left join idea i on i.idea_id = m.idea_id
+        left join attachments a on a.id = m.file_id
+        where m.project_id = $id and m.is_active = 1
+        order by m.created_datetime desc, m.project_message_id desc
+        limit $limit"""),
+    ]
+
+# Ideas are related to a project by its keywords, so this is left out of the
+# query for a project that has none.
+_relatedIdeasSelect = pageDataSelect(dict(section = "'idea'",
+                                          item_id = 'i.idea_id',
+                                          user_id = 'u.user_id',
+                                          first_name = 'u.first_name',
+                                          last_name = 'u.last_name',
+                                          affiliation = 'u.affiliation',
+                                          image_id = 'u.image_id',
+                                          created_datetime = 'i.created_datetime',
+                                          idea_description = 'i.description',
+                                          idea_submission_type = 'i.submission_type'),
+                                     """from idea i
+        left join user u on u.user_id = i.user_id
+        where i.is_active = 1
+        and ($locationId is null or i.location_id = $locationId)
+        and match(i.description) against ($match in boolean mode)
+        and i.user_id not in (select xpu.user_id from project__user xpu where xpu.project_id = $id)
+        order by i.created_datetime desc
+        limit 1000""")
+
+PAGE_DATA_SQL = "\n    union all\n    ".join(_pageDataSelects + [_relatedIdeasSelect]) + \
+                "\n    order by created_datetime desc, item_id desc"
+
+PAGE_DATA_NO_IDEAS_SQL = "\n    union all\n    ".join(_pageDataSelects) + \
+                         "\n    order by created_datetime desc, item_id desc"
+
 ## FORMATTING FUNCTIONS
 # TODO: move these into their own module
 def isFullLastName(bitmask):
@@ -207,7 +423,8 @@ def message(id,
             attachmentMediaId = None,
             attachmentTitle = None,
             projectId = None,
-            projectTitle = None):
+            projectTitle = None,
+            cursor = None):
     """
     Construct and return a dictionary consisting of the data related to a
     message, given by the parameters.  This data is usually pulled off of
@@ -231,6 +448,8 @@ def message(id,
     - ``idea`` -- The idea instance attached to the message, if any
     - ``project_id`` -- The primary key of the project that the message is for
     - ``project_title`` -- The title of the project
+    - ``cursor`` -- Pass this as ``before`` to get the messages after this
+      one in the feed
 
     """
     if (ideaId):
@@ -252,8 +471,32 @@ def message(id,
                 attachment = attachmentObj,
                 project_id = projectId,
                 project_title = projectTitle,
+                cursor = cursor or messageCursor(createdDatetime, id),
                 )
 
+def messageCursor(createdDatetime, id):
+    """
+    Returns the position of a message in a feed ordered by creation time and
+    id, as a string for the client to hand back.
+
+    """
+    if (createdDatetime is None or id is None):
+        return None
+
+    return '%s_%s' % (createdDatetime.strftime('%Y%m%d%H%M%S'), id)
+
+def parseMessageCursor(cursor):
+    """
+    Returns the ``(createdDatetime, id)`` in a cursor from messageCursor, or
+    None if it isn't valid.
+
+    """
+    try:
+        createdDatetime, id = cursor.split('_', 1)
+        return (datetime.strptime(createdDatetime, '%Y%m%d%H%M%S'), int(id))
+    except Exception:
+        return None
+
 
 def smallAttachment(media_type, media_id, title):
     """Returns a dictionary representing basic attachment information"""
@@ -286,6 +529,13 @@ def getAttachmentThumbFileName(media_type, media_id, size):
         return '%s_thumb_%s' % (media_id, size)
 
 
+def isAttachmentPending(media_id):
+    """Whether an attachment is still waiting for its media task."""
+    from framework.file_server import S3FileServer
+
+    return S3FileServer(None).isPending(media_id)
+
+
 def getAttachmentThumbUrl(media_type, media_id, size):
     """
     Get the URL to an image representation of the media. For images, this may be
@@ -300,6 +550,11 @@ def getAttachmentThumbUrl(media_type, media_id, size):
         return os.path.join(static_root, 'images', stub_thumb_name)
 
     elif media_type == 'image':
+        # Until the media task has made the thumbnails and mirrored them,
+        # they're made from the local copy of the image.
+        if isAttachmentPending(media_id):
+            return '/create/attachment?%s' % urllib.urlencode([('media_id', media_id), ('size', size)])
+
         media_root = Config.get('media').get('root')
         image_thumb_name = getAttachmentThumbFileName(media_type, media_id, size)
 
@@ -393,7 +648,10 @@ def createProject(db, ownerUserId, title, description, keywords, locationId, ima
                                     organization = organization)
 
         if (projectId):
+            giveaminute.keywords.setItemKeywords(db, 'project', projectId, keywords)
             join(db, projectId, userId=ownerUserId, isAdmin=True, isProjectCreator=True)
+            giveaminute.stats.updateItemLocationStats(db, 'project', projectId, None)
+            giveaminute.stats.adjustProjectKeywordStats(db, projectId, 1)
         else:
             log.error("*** no project id returned, probably no project created")
     except Exception, e:
@@ -421,7 +679,6 @@ def getNumMembers(db, projectId):
 
     return count
 
-
 def approveItem(db, table, id):
     try:
         whereClause = "%s_id = %s" % (table, id)
@@ -434,8 +691,32 @@ def approveItem(db, table, id):
 
 def deleteItem(db, table, id):
     try:
+        isCounted = table in giveaminute.stats.LOCATION_STATS_TABLES
+        isProjectCounted = table in giveaminute.stats.PROJECT_STATS_ITEMS
+
+        if (isCounted):
+            locationId = giveaminute.stats.getCountedLocationId(db, table, id)
+
+        if (isProjectCounted):
+            wasCounted = giveaminute.stats.isItemCounted(db, table, id)
+
+        if (table == 'project'):
+            giveaminute.stats.adjustProjectKeywordStats(db, id, -1)
+
         whereClause = "%s_id = %s" % (table, id)
         db.update(table, where = whereClause, is_active = 0)
+
+        if (isCounted):
+            giveaminute.stats.updateItemLocationStats(db, table, id, locationId)
+
+        if (isProjectCounted):
+            giveaminute.stats.updateItemProjectStats(db, table, id, wasCounted)
+
+        if (table == 'project'):
+            giveaminute.leaderboard.updateProjectRank(db, id)
+        elif (table == 'user'):
+            giveaminute.leaderboard.rebuildLeaderboard(db)
+
         return True
     except:
         log.info("*** couldn't delete item for table = %s, id = %s" % (table, id))
@@ -444,7 +725,21 @@ def deleteItem(db, table, id):
 
 def deleteItemsByUser(db, table, userId):
     try:
+        countedIds = []
+
+        if (table in giveaminute.stats.PROJECT_STATS_ITEMS):
+            linkTable, column, counter, condition = giveaminute.stats.PROJECT_STATS_ITEMS[table]
+            sql = "select %s as id from %s where user_id = $userId and %s" % (column, table, condition)
+            countedIds = [row.id for row in db.query(sql, {'userId':userId})]
+
         db.update(table, where = "user_id = $userId", is_active = 0, vars = { 'userId': userId })
+
+        for id in countedIds:
+            giveaminute.stats.updateItemProjectStats(db, table, id, True)
+
+        if (table in giveaminute.stats.LOCATION_STATS_TABLES):
+            giveaminute.stats.reconcileLocationStats(db)
+
         return True
     except:
         log.info("*** couldn't delete item for table =  %s, user_id = %s" % (table, userId))
@@ -456,6 +751,9 @@ def deleteProjectsByUser(db, userId):
         sql = """update project p, project__user pu set p.is_active = 1
                     where p.project_id = pu.project_id and pu.is_project_creator = 1 and pu.user_id = $userId"""
         db.query(sql, { 'userId':userId })
+        giveaminute.stats.reconcileLocationStats(db)
+        giveaminute.stats.reconcileKeywordStats(db)
+        giveaminute.leaderboard.rebuildLeaderboard(db)
     except:
         log.info("*** couldn't delete projects for user_id = %s" % userId)
         log.error(e)
@@ -495,6 +793,11 @@ def join(db, projectId, userId, isAdmin = False, isProjectCreator=False):
                     is_project_creator = (1 if isProjectCreator else 0)
                  )
 
+        if (giveaminute.stats.isItemCounted(db, 'user', userId)):
+            giveaminute.stats.adjustProjectStats(db, projectId, 'num_members', 1)
+
+        giveaminute.inbox.addProject(db, projectId, userId)
+
         return True
     else:
         log.info("*** user already in project")
@@ -503,6 +806,7 @@ def join(db, projectId, userId, isAdmin = False, isProjectCreator=False):
 def endorse(db, projectId, userId):
     if (not hasUserEndorsedProject(db, projectId, userId)):
         db.insert('project_endorsement', project_id = projectId, user_id = userId)
+        giveaminute.stats.adjustProjectStats(db, projectId, 'num_endorsements', 1)
 
         return True
     else:
@@ -511,7 +815,10 @@ def endorse(db, projectId, userId):
 
 def removeEndorsement(db, projectId, userId):
     try:
-        db.delete('project_endorsement', where = "project_id = $projectId and user_id = $userId", vars = { 'userId':userId, 'projectId':projectId })
+        numRemoved = db.delete('project_endorsement', where = "project_id = $projectId and user_id = $userId", vars = { 'userId':userId, 'projectId':projectId })
+
+        if (numRemoved):
+            giveaminute.stats.adjustProjectStats(db, projectId, 'num_endorsements', -numRemoved)
 
         return True
     except Exception, e:
@@ -586,9 +893,13 @@ def removeUserFromProject(db, projectId, userId):
         user = orm.query(models.User).get(userId)
         project = orm.query(models.Project).get(projectId)
 
+        wasCounted = giveaminute.stats.isItemCounted(db, 'user', userId)
         result = user.leave(project)
         if result:
             orm.commit()
+            if wasCounted:
+                giveaminute.stats.adjustProjectStats(db, projectId, 'num_members', -1)
+            giveaminute.inbox.removeProject(db, userId, projectId)
         return result
     except Exception, e:
         log.info("*** couldn't remove user from project")
@@ -597,7 +908,15 @@ def removeUserFromProject(db, projectId, userId):
 
 def removeUserFromAllProjects(db, userId):
     try:
+        sql = """update project_stats ps
+                    inner join project__user pu on pu.project_id = ps.project_id and pu.user_id = $userId
+                    inner join user u on u.user_id = pu.user_id and u.is_active = 1
+                    set ps.num_members = greatest(cast(ps.num_members as signed) - 1, 0)"""
+        db.query(sql, {'userId':userId})
+
         db.delete('project__user', where = "user_id = $userId", vars = {'userId':userId})
+        giveaminute.leaderboard.rebuildLeaderboard(db)
+        giveaminute.inbox.removeProject(db, userId)
         return True
     except Exception, e:
         log.info("*** couldn't remove user from project")
@@ -612,23 +931,25 @@ def addKeywords(db, projectId, newKeywords):
         if (numFlags == 2):
             return False
 
-        sqlGet = "select keywords from project where project_id = $projectId"
+        sqlGet = """select p.is_active, k.keyword from project p
+                    left join project_keyword k on k.project_id = p.project_id
+                    where p.project_id = $projectId"""
         data = list(db.query(sqlGet, {'projectId':projectId}))
 
         if (len(data) > 0):
-            keywords = data[0].keywords.split()
-            newKeywords = [word.strip() for word in newKeywords]
-            addKeywords = []
-
-            for newWord in newKeywords:
-                if (newWord not in keywords):
-                    addKeywords.append(newWord)
+            keywords = [row.keyword for row in data if row.keyword]
+            addKeywords = [word for word in giveaminute.keywords.splitKeywords(newKeywords) if word not in keywords]
 
             if (len(addKeywords) > 0):
-                keywords = ' '.join(keywords + addKeywords)
-        
-                sql = "update project set keywords = $keywords, num_flags = num_flags + $flags where project_id = $projectId"
-                db.query(sql, {'projectId':projectId, 'keywords':keywords, 'flags':numFlags})
+                giveaminute.keywords.insertItemKeywords(db, 'project', projectId, addKeywords)
+                giveaminute.keywords.updateKeywordString(db, 'project', projectId)
+
+                if (numFlags > 0):
+                    sql = "update project set num_flags = num_flags + $flags where project_id = $projectId"
+                    db.query(sql, {'projectId':projectId, 'flags':numFlags})
+
+                if (data[0].is_active):
+                    giveaminute.stats.adjustKeywordStats(db, addKeywords, 1)
                     
             # return true whether keyword exists or not
             return True
@@ -642,20 +963,15 @@ def addKeywords(db, projectId, newKeywords):
 
 def removeKeyword(db, projectId, keyword):
     try:
-        sqlGet = "select keywords from project where project_id = $projectId"
+        sqlGet = "select is_active from project where project_id = $projectId"
         data = list(db.query(sqlGet, {'projectId':projectId}))
 
         if (len(data) > 0):
-            keywords = data[0].keywords.split()
-
-            if (keyword in keywords):
-                i = keywords.index(keyword) # save the index to return for proper client side removal
-                keywords.remove(keyword)
-                
-                newKeywords = ' '.join(keywords)
+            if (giveaminute.keywords.removeItemKeywords(db, 'project', projectId, [keyword]) > 0):
+                giveaminute.keywords.updateKeywordString(db, 'project', projectId)
 
-                sql = "update project set keywords = $keywords where project_id = $projectId"
-                db.query(sql, {'projectId':projectId, 'keywords':newKeywords})
+                if (data[0].is_active):
+                    giveaminute.stats.adjustKeywordStats(db, [keyword], -1)
                 
             # return true whether keyword exists or not
             return True
@@ -673,6 +989,9 @@ def addResourceToProject(db, projectId, resourceId):
             db.insert('project__project_resource', project_id = projectId,
                                         project_resource_id = resourceId)
 
+            if (giveaminute.stats.isItemCounted(db, 'project_resource', resourceId)):
+                giveaminute.stats.adjustProjectStats(db, projectId, 'num_project_resources', 1)
+
             return True
         else:
             log.error("*** resource already in project")
@@ -684,8 +1003,12 @@ def addResourceToProject(db, projectId, resourceId):
 
 def removeResourceFromProject(db, projectId, projectResourceId):
     try:
+        wasCounted = giveaminute.stats.isItemCounted(db, 'project_resource', projectResourceId)
         sql = "delete from project__project_resource where project_id = $projectId and project_resource_id = $projectResourceId"
-        db.query(sql, {'projectId':projectId, 'projectResourceId':projectResourceId})
+        numRemoved = db.query(sql, {'projectId':projectId, 'projectResourceId':projectResourceId})
+
+        if (numRemoved and wasCounted):
+            giveaminute.stats.adjustProjectStats(db, projectId, 'num_project_resources', -numRemoved)
 
         return True
     except Exception, e:
@@ -790,13 +1113,12 @@ def getFeaturedProjects(db, limit = 6):
                     o.affiliation as owner_affiliation,
                     o.group_membership_bitmask as owner_group_membership_bitmask,
                     o.image_id as owner_image_id,
-                    (select count(npu.user_id) from project__user npu
-                        inner join user nu on nu.user_id = npu.user_id and nu.is_active = 1
-                        where npu.project_id = p.project_id)  as num_members
+                    coalesce(ps.num_members, 0) as num_members
                 from project p
                 inner join featured_project fp on fp.project_id = p.project_id
                 inner join project__user opu on opu.project_id = p.project_id and opu.is_project_creator = 1
                 inner join user o on o.user_id = opu.user_id
+                left join project_stats ps on ps.project_id = p.project_id
                 where p.is_active = 1
                 order by fp.ordinal
                 limit $limit"""
@@ -838,21 +1160,15 @@ def getFeaturedProjectsDictionary(db):
                     o.group_membership_bitmask as owner_group_membership_bitmask,
                     o.image_id as owner_image_id,
                     fp.updated_datetime as featured_datetime,
-                    (select count(npu.user_id) from project__user npu
-                        inner join user nu on nu.user_id = npu.user_id and nu.is_active = 1
-                        where npu.project_id = p.project_id)  as num_members,
-                    (select count(npi.idea_id) from project__idea npi
-                        inner join idea ni on ni.idea_id = npi.idea_id and ni.is_active = 1
-                        where npi.project_id = p.project_id)  as num_ideas,
-                    (select count(npr.project_resource_id) from project__project_resource npr
-                        inner join project_resource nr on nr.project_resource_id = npr.project_resource_id and nr.is_active = 1
-                        where npr.project_id = p.project_id)  as num_project_resources,
-                    (select count(e.user_id) from project_endorsement e
-                        where e.project_id = p.project_id) as num_endorsements
+                    coalesce(ps.num_members, 0) as num_members,
+                    coalesce(ps.num_ideas, 0) as num_ideas,
+                    coalesce(ps.num_project_resources, 0) as num_project_resources,
+                    coalesce(ps.num_endorsements, 0) as num_endorsements
                 from project p
                 inner join featured_project fp on fp.project_id = p.project_id
                 inner join project__user opu on opu.project_id = p.project_id and opu.is_project_creator = 1
                 inner join user o on o.user_id = opu.user_id
+                left join project_stats ps on ps.project_id = p.project_id
                 where p.is_active = 1
                 order by fp.ordinal"""
         data = list(db.query(sql))
@@ -895,10 +1211,12 @@ def getProjectsByLocation(db, locationId, limit = 100):
                         o.first_name as owner_first_name,
                         o.last_name as owner_last_name,
                         o.image_id as owner_image_id,
-                    (select count(*) from project__user pu where pu.project_id = p.project_id) as num_members
+                    coalesce(ps.num_members, 0) as num_members
                     from project p
                     inner join project__user opu on opu.project_id = p.project_id and opu.is_project_creator = 1
-                    inner join user o on o.user_id = opu.user_id where p.is_active = 1 and p.location_id = $locationId
+                    inner join user o on o.user_id = opu.user_id
+                    left join project_stats ps on ps.project_id = p.project_id
+                    where p.is_active = 1 and p.location_id = $locationId
                     limit $limit"""
         data = list(db.query(sql, {'locationId':locationId, 'limit':limit}))
     except Exception, e:
@@ -923,11 +1241,12 @@ def getProjectsByUser(db, userId, limit = 100):
                         o.affiliation as owner_affiliation,
                         o.group_membership_bitmask as owner_group_membership_bitmask,
                         o.image_id as owner_image_id,
-                    (select count(cpu.user_id) from project__user cpu where cpu.project_id = p.project_id) as num_members
+                    coalesce(ps.num_members, 0) as num_members
                 from project p
                 inner join project__user opu on opu.project_id = p.project_id and opu.is_project_creator = 1
                 inner join user o on o.user_id = opu.user_id
                 inner join project__user pu on pu.user_id = $userId and pu.project_id = p.project_id
+                left join project_stats ps on ps.project_id = p.project_id
                  where p.is_active = 1
                  limit $limit"""
         data = list(db.query(sql, {'userId':userId, 'limit':limit}))
@@ -993,10 +1312,11 @@ def searchProjects(db, terms, locationId, limit=1000, offset=0):
                         o.affiliation as owner_affiliation,
                         o.group_membership_bitmask as owner_group_membership_bitmask,
                         o.image_id as owner_image_id,
-                    (select count(*) from project__user pu where pu.project_id = p.project_id) as num_members
+                    coalesce(ps.num_members, 0) as num_members
                     from project p
                     inner join project__user opu on opu.project_id = p.project_id and opu.is_project_creator = 1
                     inner join user o on o.user_id = opu.user_id
+                    left join project_stats ps on ps.project_id = p.project_id
                     where
                     p.is_active = 1
                     and ($locationId is null or p.location_id = $locationId)
@@ -1032,26 +1352,32 @@ def getLeaderboardProjects(db, limit = 10, offset = 0):
     data = []
 
     try:
-        sql = """select @rownum := @rownum + 1 as ordinal,
-                      p.title,
-                      p.project_id,
-                      p.image_id,
-                      u.first_name as owner_first_name,
-                      u.last_name as owner_last_name,
-                      u.user_id as owner_user_id,
-                      u.affiliation as owner_affiliation,
-                      u.group_membership_bitmask as owner_group_membership_bitmask,
-                      (select count(*) from project__user pu where pu.project_id = p.project_id)
-                        as user_count
-                from project p
-                inner join (select @rownum := 0) r
-                inner join project__user o on o.project_id = p.project_id and o.is_project_creator = 1
-                inner join user u on u.user_id = o.user_id and u.is_active = 1
-                where p.is_active = 1
-                order by (user_count * 5) desc
-                limit $limit offset $offset"""
-
-        data = list(db.query(sql, {'limit':limit, 'offset':offset}))
+        # the ranking comes from the materialized leaderboard, so only the
+        # projects on this page are read
+        page = giveaminute.leaderboard.getLeaderboardPage(db, limit, offset)
+
+        if (len(page) > 0):
+            sql = """select p.title,
+                          p.project_id,
+                          p.image_id,
+                          u.first_name as owner_first_name,
+                          u.last_name as owner_last_name,
+                          u.user_id as owner_user_id,
+                          u.affiliation as owner_affiliation,
+                          u.group_membership_bitmask as owner_group_membership_bitmask
+                    from project p
+                    inner join project__user o on o.project_id = p.project_id and o.is_project_creator = 1
+                    inner join user u on u.user_id = o.user_id
+                    where p.project_id in (%s)""" % ','.join([str(int(projectId)) for projectId, numMembers in page])
+
+            projects = dict((item.project_id, item) for item in db.query(sql))
+
+            for i, (projectId, numMembers) in enumerate(page):
+                if (projectId in projects):
+                    item = projects[projectId]
+                    item.ordinal = offset + i + 1
+                    item.user_count = numMembers
+                    data.append(item)
     except Exception, e:
         log.info("*** couldn't get project leaderboard data")
         log.error(e)
@@ -1069,7 +1395,7 @@ def addMessage(db, projectId, message, message_type, userId = None, ideaId = Non
         numFlags = helpers.censor.badwords(db, message)
         isActive = 0 if numFlags == 2 else 1
 
-        db.insert('project_message', project_id = projectId,
+        messageId = db.insert('project_message', project_id = projectId,
                                     message = message,
                                     user_id = userId,
                                     idea_id = ideaId,
@@ -1078,6 +1404,9 @@ def addMessage(db, projectId, message, message_type, userId = None, ideaId = Non
                                     num_flags = numFlags,
                                     is_active = isActive)
 
+        if (isActive):
+            giveaminute.inbox.addMessage(db, projectId, messageId)
+
         return True;
     except Exception, e:
         log.info("*** problem adding message to project")
@@ -1094,18 +1423,34 @@ def removeMessage(db, messageId):
         log.error(e)
         return False
 
-def getMessages(db, projectId, limit = 10, offset = 0, filterBy = None):
+# Selects the rows after the cursor in a feed ordered by (created, id) desc.
+# Spelled out rather than as a row comparison, which MySQL can't use an index
+# for.
+KEYSET_WHERE = """and (%(created)s < $beforeDatetime
+                    or (%(created)s = $beforeDatetime and %(id)s < $beforeId))"""
+
+def getMessages(db, projectId, limit = 10, offset = 0, filterBy = None, before = None):
     """
     Return a list of dictionaries with data representing project messages
     associated with the given projectId.  This data come from the tables
     project_message, user, and idea.
 
+    If ``before`` is the cursor of a message, the messages after it in the
+    feed are returned instead of those after ``offset``, which costs the same
+    however far back the cursor is.
+
     """
     messages = []
 
     if (filterBy not in ['member_comment','admin_comment','join','endorsement']):
         filterBy = None
 
+    cursor = parseMessageCursor(before) if before else None
+    beforeDatetime, beforeId = cursor or (None, None)
+
+    if (cursor):
+        offset = 0
+
     try:
         sql = """select
                     m.project_message_id,
@@ -1131,10 +1476,13 @@ def getMessages(db, projectId, limit = 10, offset = 0, filterBy = None):
                 left join idea i on i.idea_id = m.idea_id
                 left join attachments a on a.id = m.file_id
                 where m.project_id = $id and m.is_active = 1
-                and ($filterBy is null or m.message_type = $filterBy)
-                order by m.created_datetime desc
-                limit $limit offset $offset"""
-        data = list(db.query(sql, {'id':projectId, 'limit':limit, 'offset':offset, 'filterBy':filterBy}))
+                %s
+                %s
+                order by m.created_datetime desc, m.project_message_id desc
+                limit $limit offset $offset""" % ('and m.message_type = $filterBy' if filterBy else '',
+                                                  KEYSET_WHERE % {'created':'m.created_datetime', 'id':'m.project_message_id'} if cursor else '')
+        data = list(db.query(sql, {'id':projectId, 'limit':limit, 'offset':offset, 'filterBy':filterBy,
+                                   'beforeDatetime':beforeDatetime, 'beforeId':beforeId}))
 
         for item in data:
             messages.append(message(id = item.project_message_id,
@@ -1292,12 +1640,15 @@ def inviteByEmail(db, projectId, emails, message, inviterUser):
 
 def createInviteRecord(db, projectId, message, inviterUserId, ideaId, email = None):
     try:
-        db.insert('project_invite', project_id = projectId,
+        inviteId = db.insert('project_invite', project_id = projectId,
                                     message = message,
                                     inviter_user_id = inviterUserId,
                                     invitee_idea_id = ideaId,
                                     invitee_email = email)
 
+        if (ideaId):
+            giveaminute.inbox.addInvite(db, inviteId)
+
         return True;
     except Exception, e:
         log.info("*** problem adding invite to project")
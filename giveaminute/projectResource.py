@@ -4,6 +4,8 @@
 """
 
 from framework.log import log
+import giveaminute.keywords as mKeywords
+import giveaminute.stats as mStats
 import helpers.censor as censor
 
 class ProjectResource():
@@ -106,7 +108,9 @@ def updateProjectResourceImage(db, projectResourceId, imageId):
 
 def updateProjectResourceLocation(db, projectResourceId, locationId):
     try:
+        oldLocationId = mStats.getCountedLocationId(db, 'project_resource', projectResourceId)
         db.update('project_resource', where = "project_resource_id = $id", location_id = locationId, vars = {'id':projectResourceId})
+        mStats.updateItemLocationStats(db, 'project_resource', projectResourceId, oldLocationId)
         return True
     except Exception, e:
         log.info("*** couldn't update project location")
@@ -118,8 +122,16 @@ def updateProjectResourceTextData(db, projectResourceId, field, text):
     isHidden = (censor.badwords(db, text) > 0)
     
     try:
+        locationId = mStats.getCountedLocationId(db, 'project_resource', projectResourceId)
+        wasCounted = mStats.isItemCounted(db, 'project_resource', projectResourceId)
         sql = "update project_resource set %s = $text, is_hidden = $isHidden where project_resource_id = $id" % field
         db.query(sql, {'id':projectResourceId, 'text':text, 'isHidden':isHidden})
+
+        if (field == 'keywords'):
+            mKeywords.setItemKeywords(db, 'project_resource', projectResourceId, text)
+
+        mStats.updateItemLocationStats(db, 'project_resource', projectResourceId, locationId)
+        mStats.updateItemProjectStats(db, 'project_resource', projectResourceId, wasCounted)
         return True
     except Exception, e:
         log.info("*** couldn't update project %s" % field)
@@ -156,7 +168,11 @@ def getUnreviewedProjectResources(db, limit = 10, offset = 0):
     
 def approveProjectResource(db, projectResourceId, isOfficial = False):
     try:
+        locationId = mStats.getCountedLocationId(db, 'project_resource', projectResourceId)
+        wasCounted = mStats.isItemCounted(db, 'project_resource', projectResourceId)
         db.update('project_resource', where = "project_resource_id = $projectResourceId", is_hidden = 0, is_official = isOfficial, vars = {'projectResourceId':projectResourceId})
+        mStats.updateItemLocationStats(db, 'project_resource', projectResourceId, locationId)
+        mStats.updateItemProjectStats(db, 'project_resource', projectResourceId, wasCounted)
         return True
     except Exception, e:
         log.info("*** couldn't approve project resource %s" % projectResourceId)
@@ -0,0 +1,256 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+"""
+Search across projects, resources and ideas at once.
+
+The search page used to run a FULLTEXT query and a count query for each kind
+of result.  Here the page of results and the total for every kind are selected
+in a single union query, and the formatted results are cached for a short
+while, keyed on the normalized search.
+
+With ``search.backend: memory`` in the config, searches are answered from the
+in-process index in ``giveaminute.searchindex`` instead, falling back to MySQL
+if that fails.
+
+"""
+
+import hashlib
+import giveaminute.project as mProject
+import giveaminute.idea as mIdea
+import giveaminute.searchindex as mSearchIndex
+from framework.cache_holder import CacheHolder
+from framework.log import log
+
+SEARCH_ENTITIES = ('projects', 'resources', 'ideas')
+
+SEARCH_CACHE_NAMESPACE = 'search'
+SEARCH_CACHE_TIMEOUT = 60
+
+SEARCH_COLUMNS = ['section', 'item_id', 'title', 'description', 'url',
+                  'image_id', 'location_id', 'is_official', 'submission_type',
+                  'created_datetime', 'user_id', 'first_name', 'last_name',
+                  'affiliation', 'group_membership_bitmask', 'user_image_id',
+                  'num_members', 'total']
+
+def searchSelect(columns, tail):
+    select = ',\n            '.join(["%s as %s" % (columns.get(name, 'null'), name) for name in SEARCH_COLUMNS])
+    return "(select %s\n        %s)" % (select, tail)
+
+_projectWhere = """where p.is_active = 1
+        and ($locationId is null or p.location_id = $locationId)
+        and ($match = '' or match(p.title, p.keywords, p.description) against ($match in boolean mode))"""
+
+_resourceWhere = """where r.is_active = 1 and r.is_hidden = 0
+        and ($locationId is null or r.location_id = $locationId)
+        and ($match = '' or match(r.title, r.keywords, r.description) against ($match in boolean mode))"""
+
+_ideaWhere = """where i.is_active = 1
+        and ($locationId is null or i.location_id = $locationId)
+        and ($match = '' or match(i.description) against ($match in boolean mode))"""
+
+SEARCH_SELECTS = dict(
+    projects = [
+        searchSelect(dict(section = "'projects'",
+                          item_id = 'p.project_id',
+                          title = 'p.title',
+                          description = 'p.description',
+                          image_id = 'p.image_id',
+                          location_id = 'p.location_id',
+                          user_id = 'o.user_id',
+                          first_name = 'o.first_name',
+                          last_name = 'o.last_name',
+                          affiliation = 'o.affiliation',
+                          group_membership_bitmask = 'o.group_membership_bitmask',
+                          user_image_id = 'o.image_id',
+                          num_members = 'coalesce(ps.num_members, 0)'),
+                     """from project p
+        inner join project__user opu on opu.project_id = p.project_id and opu.is_project_creator = 1
+        inner join user o on o.user_id = opu.user_id
+        left join project_stats ps on ps.project_id = p.project_id
+        %s
+        order by num_members desc
+        limit $limit offset $offset""" % _projectWhere),
+
+        searchSelect(dict(section = "'projects_total'", total = 'count(*)'),
+                     """from project p
+        %s""" % _projectWhere)],
+
+    resources = [
+        searchSelect(dict(section = "'resources'",
+                          item_id = 'r.project_resource_id',
+                          title = 'r.title',
+                          url = 'r.url',
+                          image_id = 'r.image_id',
+                          is_official = 'r.is_official',
+                          created_datetime = 'r.created_datetime'),
+                     """from project_resource r
+        %s
+        order by created_datetime desc
+        limit $limit offset $offset""" % _resourceWhere),
+
+        searchSelect(dict(section = "'resources_total'", total = 'count(*)'),
+                     """from project_resource r
+        %s""" % _resourceWhere)],
+
+    ideas = [
+        searchSelect(dict(section = "'ideas'",
+                          item_id = 'i.idea_id',
+                          description = 'i.description',
+                          submission_type = 'i.submission_type',
+                          created_datetime = 'i.created_datetime',
+                          user_id = 'u.user_id',
+                          first_name = 'u.first_name',
+                          last_name = 'u.last_name',
+                          affiliation = 'u.affiliation',
+                          user_image_id = 'u.image_id'),
+                     """from idea i
+        left join user u on u.user_id = i.user_id
+        %s
+        order by created_datetime desc
+        limit $limit offset $offset""" % _ideaWhere),
+
+        searchSelect(dict(section = "'ideas_total'", total = 'count(*)'),
+                     """from idea i
+        %s""" % _ideaWhere)])
+
+def normalizeTerms(terms):
+    """
+    Returns the search terms lowercased, deduplicated and sorted.  FULLTEXT
+    matching ignores case and term order, so this doesn't change the results,
+    but it lets equivalent searches share a cache entry.
+
+    """
+    return sorted(set([term.strip().lower() for term in terms if term and term.strip()]))
+
+def searchKey(terms, locationId, limit, offset, entities, withCounts = True):
+    key = '%s|%s|%s|%s|%s|%s' % (','.join(terms), locationId, limit, offset, ','.join(entities), int(withCounts))
+    return hashlib.md5(key.encode('utf-8')).hexdigest()
+
+def formatProject(item):
+    return dict(project_id = item.item_id,
+                title = item.title,
+                description = item.description,
+                image_id = item.image_id,
+                location_id = item.location_id,
+                owner = mProject.smallUserDisplay(item.user_id,
+                                                  mProject.userNameDisplay(item.first_name,
+                                                                           item.last_name,
+                                                                           item.affiliation,
+                                                                           mProject.isFullLastName(item.group_membership_bitmask)),
+                                                  item.user_image_id),
+                num_members = item.num_members)
+
+def formatResource(item):
+    return dict(link_id = item.item_id,
+                title = item.title,
+                url = item.url,
+                image_id = item.image_id,
+                is_official = item.is_official)
+
+def formatIdea(item):
+    owner = None
+
+    if (item.user_id):
+        owner = dict(u_id = item.user_id,
+                     image_id = item.user_image_id,
+                     name = mIdea.ideaName(item.first_name, item.last_name, item.affiliation))
+
+    return dict(idea_id = item.item_id,
+                message = item.description,
+                created = str(item.created_datetime),
+                submission_type = item.submission_type,
+                owner = owner)
+
+_formatters = dict(projects = formatProject, resources = formatResource, ideas = formatIdea)
+
+# MySQL doesn't promise to keep the order of each select within a union, so
+# each section is re-sorted the way its select was.
+_sortKeys = dict(projects = lambda item: item.num_members,
+                 resources = lambda item: item.created_datetime,
+                 ideas = lambda item: item.created_datetime)
+
+def searchAll(db, terms, locationId, limit = 6, offset = 0, entities = SEARCH_ENTITIES, withCounts = True):
+    """
+    Searches each kind of item in ``entities`` in a single query, and returns
+    a dictionary of ``results`` (the page of formatted items for each kind)
+    and ``total_count`` (the total number of matches for each kind), or None
+    if the search fails.  With ``withCounts`` False the matches aren't
+    counted, and ``total_count`` is None.
+
+    """
+    if (mSearchIndex.isEnabled()):
+        data = searchIndex(db, terms, locationId, limit, offset, entities, withCounts)
+
+        if (data is not None):
+            return data
+
+    results = dict((entity, []) for entity in entities)
+    totalCount = dict((entity, 0) for entity in entities)
+    match = ' '.join([(item + "*") for item in terms])
+
+    try:
+        numSelects = 2 if withCounts else 1
+        sql = "\n    union all\n    ".join([select for entity in entities for select in SEARCH_SELECTS[entity][:numSelects]])
+        data = list(db.query(sql, {'match':match, 'locationId':locationId, 'limit':limit, 'offset':offset}))
+
+        rows = dict((entity, []) for entity in entities)
+
+        for item in data:
+            if (item.section.endswith('_total')):
+                totalCount[item.section[:-len('_total')]] = int(item.total)
+            else:
+                rows[item.section].append(item)
+
+        for entity in entities:
+            rows[entity].sort(key = _sortKeys[entity], reverse = True)
+            results[entity] = [_formatters[entity](item) for item in rows[entity]]
+    except Exception, e:
+        log.info("*** couldn't get search data")
+        log.error(e)
+        return None
+
+    return dict(results = results, total_count = totalCount if withCounts else None)
+
+def searchIndex(db, terms, locationId, limit = 6, offset = 0, entities = SEARCH_ENTITIES, withCounts = True):
+    """
+    Returns the same as ``searchAll``, from the in-memory index rather than
+    MySQL, or None if the search fails.
+
+    """
+    results = dict((entity, []) for entity in entities)
+    totalCount = dict((entity, 0) for entity in entities)
+
+    try:
+        for entity in entities:
+            rows, totalCount[entity] = mSearchIndex.search(db, entity, terms, locationId, limit, offset)
+            results[entity] = [_formatters[entity](item) for item in rows]
+    except Exception, e:
+        log.info("*** couldn't get search data from the search index")
+        log.error(e)
+        return None
+
+    return dict(results = results, total_count = totalCount if withCounts else None)
+
+def search(db, terms, locationId, limit = 6, offset = 0, entities = SEARCH_ENTITIES, withCounts = True):
+    """
+    Returns the same as ``searchAll``, through the shared cache.  A failed
+    search isn't cached, and returns no results.
+
+    """
+    terms = normalizeTerms(terms)
+    locationId = None if locationId is None else str(locationId)
+    key = searchKey(terms, locationId, limit, offset, entities, withCounts)
+
+    data = CacheHolder.get_cache().get_or_set(key,
+                                              lambda: searchAll(db, terms, locationId, limit, offset, entities, withCounts),
+                                              time = SEARCH_CACHE_TIMEOUT,
+                                              namespace = SEARCH_CACHE_NAMESPACE)
+
+    if (data is None):
+        data = dict(results = dict((entity, []) for entity in entities),
+                    total_count = dict((entity, 0) for entity in entities) if withCounts else None)
+
+    return data
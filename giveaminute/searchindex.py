@@ -0,0 +1,338 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+"""
+An in-process inverted index over projects, resources and ideas, used by
+``giveaminute.search`` when the ``search.backend`` config value is ``memory``.
+
+The index is built from the database once, then kept current by re-reading
+only the rows whose ``updated_datetime`` has moved on since the last refresh,
+which picks up creates, edits and deactivations from every process.  It is
+written to disk (if ``search.snapshot_path`` is set) so that a restarted
+process only has to catch up on the changes since the snapshot.
+
+"""
+
+import bisect
+import math
+import os
+import re
+import threading
+import time
+import cPickle as pickle
+from datetime import datetime
+from framework.config import Config
+from framework.log import log
+
+SEARCH_ENTITIES = ('projects', 'resources', 'ideas')
+
+# A match in a title counts for more than one in the keywords, which counts for
+# more than one in the description.
+FIELD_WEIGHTS = dict(title = 3.0, keywords = 2.0, description = 1.0)
+
+# How much the number of members adds to a project's relevance; the log keeps
+# a big project from burying a better match.
+MEMBER_WEIGHT = 1.0
+
+EPOCH = datetime(1970, 1, 1)
+
+TOKEN = re.compile(r'\w+', re.UNICODE)
+
+def tokenize(text):
+    return TOKEN.findall(text.lower()) if text else []
+
+# Each select returns every row changed since $since, active or not, with the
+# columns that giveaminute.search formats results from.
+INDEX_SQL = dict(
+    projects = """select p.project_id as item_id,
+                    p.title,
+                    p.description,
+                    p.keywords,
+                    p.image_id,
+                    p.location_id,
+                    p.is_active as is_searchable,
+                    o.user_id,
+                    o.first_name,
+                    o.last_name,
+                    o.affiliation,
+                    o.group_membership_bitmask,
+                    o.image_id as user_image_id,
+                    coalesce(ps.num_members, 0) as num_members,
+                    greatest(p.updated_datetime, o.updated_datetime, coalesce(ps.updated_datetime, 0)) as updated_datetime
+                from project p
+                inner join project__user opu on opu.project_id = p.project_id and opu.is_project_creator = 1
+                inner join user o on o.user_id = opu.user_id
+                left join project_stats ps on ps.project_id = p.project_id
+                where p.updated_datetime >= $since or o.updated_datetime >= $since or ps.updated_datetime >= $since""",
+
+    resources = """select r.project_resource_id as item_id,
+                    r.title,
+                    r.description,
+                    r.keywords,
+                    r.url,
+                    r.image_id,
+                    r.location_id,
+                    r.is_official,
+                    r.created_datetime,
+                    (r.is_active = 1 and r.is_hidden = 0) as is_searchable,
+                    r.updated_datetime
+                from project_resource r
+                where r.updated_datetime >= $since""",
+
+    ideas = """select i.idea_id as item_id,
+                    i.description,
+                    i.submission_type,
+                    i.created_datetime,
+                    i.location_id,
+                    i.is_active as is_searchable,
+                    u.user_id,
+                    u.first_name,
+                    u.last_name,
+                    u.affiliation,
+                    u.image_id as user_image_id,
+                    greatest(i.updated_datetime, coalesce(u.updated_datetime, 0)) as updated_datetime
+                from idea i
+                left join user u on u.user_id = i.user_id
+                where i.updated_datetime >= $since or u.updated_datetime >= $since""")
+
+class SearchIndex():
+    """
+    Postings from each token to the items that contain it, and the rows needed
+    to display each item, for each kind of item.
+
+    """
+    def __init__(self):
+        self.items = dict((entity, {}) for entity in SEARCH_ENTITIES)
+        self.postings = dict((entity, {}) for entity in SEARCH_ENTITIES)
+        self.tokens = dict((entity, []) for entity in SEARCH_ENTITIES)
+        self.isSorted = dict((entity, True) for entity in SEARCH_ENTITIES)
+        self.lastUpdated = EPOCH
+        self.lastRefreshed = 0
+
+    def put(self, entity, row):
+        """
+        Adds or replaces an item.  ``row`` must have an ``item_id``; its
+        title, keywords and description are indexed.
+
+        """
+        self.remove(entity, row.item_id)
+
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.iteritems():
+            for token in tokenize(row.get(field)):
+                weights[token] = max(weights.get(token, 0), weight)
+
+        postings = self.postings[entity]
+        for token, weight in weights.iteritems():
+            if (token not in postings):
+                postings[token] = {}
+                self.isSorted[entity] = False
+            postings[token][row.item_id] = weight
+
+        row.tokens = tuple(weights)
+        self.items[entity][row.item_id] = row
+
+    def remove(self, entity, itemId):
+        row = self.items[entity].pop(itemId, None)
+
+        if (row is not None):
+            postings = self.postings[entity]
+            for token in row.tokens:
+                postings[token].pop(itemId, None)
+
+                if (not postings[token]):
+                    del postings[token]
+                    self.isSorted[entity] = False
+
+    def expand(self, entity, token, isPrefix):
+        """
+        Returns the indexed tokens that ``token`` matches: itself, or every
+        token that starts with it.
+
+        """
+        if (not isPrefix):
+            return [token] if token in self.postings[entity] else []
+
+        if (not self.isSorted[entity]):
+            self.tokens[entity] = sorted(self.postings[entity])
+            self.isSorted[entity] = True
+
+        tokens = self.tokens[entity]
+        matches = []
+        i = bisect.bisect_left(tokens, token)
+
+        while (i < len(tokens) and tokens[i].startswith(token)):
+            matches.append(tokens[i])
+            i += 1
+
+        return matches
+
+    def search(self, entity, terms, locationId, limit, offset):
+        """
+        Returns the rows for one page of the items that match any of the
+        terms, as in a boolean-mode FULLTEXT search on ``term*``, and the
+        total number of matches.
+
+        """
+        items = self.items[entity]
+        scores = {}
+
+        for term in terms:
+            words = tokenize(term)
+
+            for i, word in enumerate(words):
+                # only the end of each term is a prefix, as with "term*"
+                best = {}
+
+                for token in self.expand(entity, word, i == len(words) - 1):
+                    for itemId, weight in self.postings[entity][token].iteritems():
+                        best[itemId] = max(best.get(itemId, 0), weight)
+
+                for itemId, weight in best.iteritems():
+                    scores[itemId] = scores.get(itemId, 0) + weight
+
+        if (terms):
+            matches = [items[itemId] for itemId in scores]
+        else:
+            matches = items.values()
+
+        if (locationId is not None):
+            locationId = int(locationId)
+            matches = [row for row in matches if row.location_id == locationId]
+
+        if (entity == 'projects'):
+            rank = lambda row: scores.get(row.item_id, 0) + MEMBER_WEIGHT * math.log(1 + row.num_members)
+        else:
+            rank = lambda row: (scores.get(row.item_id, 0), row.created_datetime)
+
+        matches.sort(key = rank, reverse = True)
+
+        return matches[offset:offset + limit], len(matches)
+
+    def update(self, db):
+        """
+        Re-reads every row changed since the last update.  Returns the number
+        of rows read.
+
+        """
+        since = self.lastUpdated
+        numRows = 0
+
+        for entity in SEARCH_ENTITIES:
+            for row in db.query(INDEX_SQL[entity], {'since':since}):
+                if (row.is_searchable):
+                    self.put(entity, row)
+                else:
+                    self.remove(entity, row.item_id)
+
+                if (row.updated_datetime and row.updated_datetime > self.lastUpdated):
+                    self.lastUpdated = row.updated_datetime
+
+                numRows += 1
+
+        self.lastRefreshed = time.time()
+        return numRows
+
+    def save(self, path):
+        """
+        Writes the index to ``path``.  The file is replaced atomically, since
+        other processes may be reading it, and only its owner can read or
+        write it, since loading it runs ``pickle``.
+
+        """
+        tmpPath = '%s.%s.tmp' % (path, os.getpid())
+        if (os.path.exists(tmpPath)):
+            os.remove(tmpPath)
+        f = os.fdopen(os.open(tmpPath, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0600), 'wb')
+        try:
+            pickle.dump((self.items, self.lastUpdated), f, pickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+        os.rename(tmpPath, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads an index written by ``save``.  Refuses a file that someone else
+        owns or could have written, rather than unpickling it.
+
+        """
+        index = cls()
+
+        f = open(path, 'rb')
+        try:
+            st = os.fstat(f.fileno())
+            if (st.st_uid != os.getuid() or st.st_mode & 022):
+                raise IOError("Search index snapshot %s isn't private to this user" % path)
+
+            items, index.lastUpdated = pickle.load(f)
+        finally:
+            f.close()
+
+        for entity in SEARCH_ENTITIES:
+            for row in items.get(entity, {}).itervalues():
+                index.put(entity, row)
+
+        return index
+
+def getSearchConfig():
+    try:
+        return Config.get('search') or {}
+    except KeyError:
+        return {}
+
+def isEnabled():
+    return getSearchConfig().get('backend') == 'memory'
+
+_index = None
+_indexLock = threading.RLock()
+_lastSaved = 0
+
+def getSearchIndex(db):
+    """
+    Returns the process-wide ``SearchIndex``, loading it from the snapshot or
+    the database the first time, and catching up with changed rows at most
+    every ``search.refresh_interval`` seconds.
+
+    """
+    global _index, _lastSaved
+
+    config = getSearchConfig()
+    snapshotPath = config.get('snapshot_path')
+
+    with _indexLock:
+        if (_index is None):
+            if (snapshotPath and os.path.exists(snapshotPath)):
+                try:
+                    _index = SearchIndex.load(snapshotPath)
+                    log.info("Loaded search index snapshot as of %s" % _index.lastUpdated)
+                except Exception, e:
+                    log.info("*** couldn't load search index snapshot")
+                    log.error(e)
+
+            if (_index is None):
+                _index = SearchIndex()
+
+        if (time.time() - _index.lastRefreshed >= config.get('refresh_interval', 10)):
+            numRows = _index.update(db)
+
+            if (numRows and snapshotPath and time.time() - _lastSaved >= config.get('snapshot_interval', 300)):
+                try:
+                    _index.save(snapshotPath)
+                    _lastSaved = time.time()
+                except Exception, e:
+                    log.info("*** couldn't save search index snapshot")
+                    log.error(e)
+
+        return _index
+
+def search(db, entity, terms, locationId, limit, offset):
+    """
+    Searches one kind of item in the index.  Returns the rows for the page of
+    results and the total number of matches.
+
+    """
+    with _indexLock:
+        return getSearchIndex(db).search(entity, terms, locationId, limit, offset)
@@ -0,0 +1,332 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+import giveaminute.leaderboard
+import giveaminute.location
+from framework.cache_holder import CacheHolder
+from framework.log import log
+
+# The project_stats table holds a denormalized copy of each project's member,
+# idea, resource and endorsement counts so that list queries can join to it
+# instead of running a count subquery per row.  The write paths in
+# giveaminute.project and giveaminute.idea keep it current through
+# adjustProjectStats; reconcileProjectStats rebuilds it from the source tables.
+PROJECT_STATS_COLUMNS = ('num_members', 'num_ideas', 'num_project_resources', 'num_endorsements')
+
+# The link table, id column and counter for each kind of item counted in
+# project_stats, and the condition for an item to count.
+PROJECT_STATS_ITEMS = dict(user = ('project__user', 'user_id', 'num_members', 'is_active = 1'),
+                           idea = ('project__idea', 'idea_id', 'num_ideas', 'is_active = 1'),
+                           project_resource = ('project__project_resource', 'project_resource_id', 'num_project_resources',
+                                               'is_active = 1 and is_hidden = 0'))
+
+def adjustProjectStats(db, projectId, column, delta):
+    """
+    Add ``delta`` to one of the counters in the project_stats row for
+    ``projectId``, creating the row if it doesn't exist yet.
+
+    """
+    if (column not in PROJECT_STATS_COLUMNS):
+        log.error("*** unknown project stats column %s" % column)
+        return False
+
+    try:
+        sql = """insert into project_stats (project_id, %(column)s) values ($projectId, greatest($delta, 0))
+                    on duplicate key update %(column)s = greatest(cast(%(column)s as signed) + $delta, 0)""" % {'column':column}
+        db.query(sql, {'projectId':projectId, 'delta':delta})
+    except Exception, e:
+        log.info("*** couldn't adjust %s by %s for project %s" % (column, delta, projectId))
+        log.error(e)
+        return False
+
+    if (column == 'num_members'):
+        giveaminute.leaderboard.updateProjectRank(db, projectId)
+
+    return True
+
+def isItemCounted(db, table, itemId):
+    """
+    Whether a user, idea or resource counts towards the project_stats of the
+    projects it belongs to.  Call it before changing the item's is_active or
+    is_hidden and pass the result to updateItemProjectStats.
+
+    """
+    linkTable, column, counter, condition = PROJECT_STATS_ITEMS[table]
+
+    try:
+        sql = "select %(column)s from %(table)s where %(column)s = $itemId and %(condition)s" % {'column':column, 'table':table, 'condition':condition}
+        return len(list(db.query(sql, {'itemId':itemId}))) > 0
+    except Exception, e:
+        log.info("*** couldn't determine whether %s %s is counted" % (table, itemId))
+        log.error(e)
+        return False
+
+def updateItemProjectStats(db, table, itemId, wasCounted):
+    """
+    After a user, idea or resource has been deactivated, reactivated, hidden
+    or shown, adjust the counters of the projects it belongs to if whether
+    it counts has changed.
+
+    """
+    isCounted = isItemCounted(db, table, itemId)
+
+    if (isCounted == wasCounted):
+        return True
+
+    linkTable, column, counter, condition = PROJECT_STATS_ITEMS[table]
+
+    try:
+        sql = "select project_id from %(linkTable)s where %(column)s = $itemId" % {'linkTable':linkTable, 'column':column}
+        projectIds = [row.project_id for row in db.query(sql, {'itemId':itemId})]
+    except Exception, e:
+        log.info("*** couldn't get projects for %s %s" % (table, itemId))
+        log.error(e)
+        return False
+
+    for projectId in projectIds:
+        adjustProjectStats(db, projectId, counter, 1 if isCounted else -1)
+
+    return True
+
+def reconcileProjectStats(db, projectId = None):
+    """
+    Recount the project_stats rows from the source tables, for a single
+    project or, if ``projectId`` is None, for every project.  Used as a
+    periodic job to correct any drift in the incrementally maintained counts.
+
+    """
+    try:
+        sql = """insert into project_stats (project_id, num_members, num_ideas, num_project_resources, num_endorsements)
+                select p.project_id,
+                    (select count(npu.user_id) from project__user npu
+                        inner join user nu on nu.user_id = npu.user_id and nu.is_active = 1
+                        where npu.project_id = p.project_id),
+                    (select count(npi.idea_id) from project__idea npi
+                        inner join idea ni on ni.idea_id = npi.idea_id and ni.is_active = 1
+                        where npi.project_id = p.project_id),
+                    (select count(npr.project_resource_id) from project__project_resource npr
+                        inner join project_resource nr on nr.project_resource_id = npr.project_resource_id
+                            and nr.is_active = 1 and nr.is_hidden = 0
+                        where npr.project_id = p.project_id),
+                    (select count(e.user_id) from project_endorsement e
+                        where e.project_id = p.project_id)
+                from project p
+                where ($projectId is null or p.project_id = $projectId)
+                on duplicate key update num_members = values(num_members),
+                    num_ideas = values(num_ideas),
+                    num_project_resources = values(num_project_resources),
+                    num_endorsements = values(num_endorsements)"""
+        db.query(sql, {'projectId':projectId})
+        giveaminute.leaderboard.updateProjectRank(db, projectId)
+        return True
+    except Exception, e:
+        log.info("*** couldn't reconcile project stats")
+        log.error(e)
+        return False
+
+# The location_stats table holds the number of active projects, ideas and
+# visible resources in each location, for the map and search pages.  As with
+# project_stats, the write paths keep it current, through
+# updateItemLocationStats, and reconcileLocationStats rebuilds it.
+LOCATION_STATS_COLUMNS = ('num_projects', 'num_ideas', 'num_project_resources')
+
+# The counter for each kind of item, and the condition for an item to count.
+LOCATION_STATS_TABLES = dict(project = ('num_projects', 'is_active = 1'),
+                             idea = ('num_ideas', 'is_active = 1'),
+                             project_resource = ('num_project_resources', 'is_active = 1 and is_hidden = 0'))
+
+def adjustLocationStats(db, locationId, column, delta):
+    """
+    Add ``delta`` to one of the counters in the location_stats row for
+    ``locationId``, creating the row if it doesn't exist yet, and expire the
+    cached location scores.
+
+    """
+    if (column not in LOCATION_STATS_COLUMNS):
+        log.error("*** unknown location stats column %s" % column)
+        return False
+
+    try:
+        sql = """insert into location_stats (location_id, %(column)s) values ($locationId, greatest($delta, 0))
+                    on duplicate key update %(column)s = greatest(cast(%(column)s as signed) + $delta, 0)""" % {'column':column}
+        db.query(sql, {'locationId':locationId, 'delta':delta})
+    except Exception, e:
+        log.info("*** couldn't adjust %s by %s for location %s" % (column, delta, locationId))
+        log.error(e)
+        return False
+
+    giveaminute.location.expireScoredLocations()
+    return True
+
+def getCountedLocationId(db, table, itemId):
+    """
+    Returns the location of an item if it is counted in location_stats, or
+    None if it isn't (e.g. because it is inactive or hidden).
+
+    """
+    column, condition = LOCATION_STATS_TABLES[table]
+
+    try:
+        sql = "select location_id from %(table)s where %(table)s_id = $id and %(condition)s" % {'table':table, 'condition':condition}
+        data = list(db.query(sql, {'id':itemId}))
+
+        if (len(data) > 0 and data[0].location_id > 0):
+            return data[0].location_id
+    except Exception, e:
+        log.info("*** couldn't get location of %s %s" % (table, itemId))
+        log.error(e)
+
+    return None
+
+def updateItemLocationStats(db, table, itemId, oldLocationId):
+    """
+    Moves an item's count from ``oldLocationId`` (its counted location before
+    a change, from getCountedLocationId, or None for a new item) to wherever
+    it counts now.  This covers creating, deactivating, hiding, approving and
+    moving an item.
+
+    """
+    column, condition = LOCATION_STATS_TABLES[table]
+    newLocationId = getCountedLocationId(db, table, itemId)
+
+    if (oldLocationId == newLocationId):
+        return True
+
+    isAdjusted = True
+
+    if (oldLocationId is not None):
+        isAdjusted = adjustLocationStats(db, oldLocationId, column, -1) and isAdjusted
+
+    if (newLocationId is not None):
+        isAdjusted = adjustLocationStats(db, newLocationId, column, 1) and isAdjusted
+
+    return isAdjusted
+
+def reconcileLocationStats(db):
+    """
+    Recount every location_stats row from the source tables.  Used as a
+    periodic job, and after changes to many items at once.
+
+    """
+    try:
+        sql = """insert into location_stats (location_id, num_projects, num_ideas, num_project_resources)
+                select l.location_id,
+                    (select count(p.project_id) from project p
+                        where p.location_id = l.location_id and p.is_active = 1),
+                    (select count(i.idea_id) from idea i
+                        where i.location_id = l.location_id and i.is_active = 1),
+                    (select count(r.project_resource_id) from project_resource r
+                        where r.location_id = l.location_id and r.is_active = 1 and r.is_hidden = 0)
+                from location l
+                where l.location_id > 0
+                on duplicate key update num_projects = values(num_projects),
+                    num_ideas = values(num_ideas),
+                    num_project_resources = values(num_project_resources)"""
+        db.query(sql)
+    except Exception, e:
+        log.info("*** couldn't reconcile location stats")
+        log.error(e)
+        return False
+
+    giveaminute.location.expireScoredLocations()
+    return True
+
+# The keyword_stats table holds the number of active projects tagged with
+# each keyword, for the popular keywords list.  It is kept current by
+# adjustKeywordStats as keywords are added and removed and projects are
+# created and deactivated, and reconcileKeywordStats rebuilds it.
+KEYWORD_STATS_CACHE_NAMESPACE = 'keyword_stats'
+KEYWORD_STATS_CACHE_TIMEOUT = 60 * 60
+
+def adjustKeywordStats(db, keywords, delta):
+    """
+    Add ``delta`` to the project count of each of ``keywords``, creating the
+    rows that don't exist yet.
+
+    """
+    keywords = [keyword for keyword in keywords if keyword]
+
+    if (not keywords):
+        return True
+
+    try:
+        vars = dict(('keyword%s' % i, keyword) for i, keyword in enumerate(keywords))
+        vars['delta'] = delta
+
+        sql = """insert into keyword_stats (keyword, num_projects) values %s
+                    on duplicate key update num_projects = greatest(cast(num_projects as signed) + $delta, 0)""" % \
+                    ', '.join(['($keyword%s, greatest($delta, 0))' % i for i in range(len(keywords))])
+        db.query(sql, vars)
+    except Exception, e:
+        log.info("*** couldn't adjust keyword stats by %s for %s" % (delta, keywords))
+        log.error(e)
+        return False
+
+    CacheHolder.get_cache().bump_namespace(KEYWORD_STATS_CACHE_NAMESPACE)
+    return True
+
+def adjustProjectKeywordStats(db, projectId, delta):
+    """
+    Add ``delta`` to the counts of every keyword on a project, if the project
+    is active.  Call it after a project is created, and before it's
+    deactivated.
+
+    """
+    try:
+        sql = """select k.keyword from project_keyword k
+                inner join project p on p.project_id = k.project_id and p.is_active = 1
+                where k.project_id = $projectId"""
+        keywords = [row.keyword for row in db.query(sql, {'projectId':projectId})]
+    except Exception, e:
+        log.info("*** couldn't get keywords for project %s" % projectId)
+        log.error(e)
+        return False
+
+    return adjustKeywordStats(db, keywords, delta)
+
+def reconcileKeywordStats(db):
+    """
+    Recount every keyword_stats row from the project_keyword rows.  Used as a
+    periodic job, and after changes to many projects at once.
+
+    """
+    try:
+        db.query("delete from keyword_stats")
+
+        sql = """insert into keyword_stats (keyword, num_projects)
+                select k.keyword, count(*) from project_keyword k
+                inner join project p on p.project_id = k.project_id and p.is_active = 1
+                group by k.keyword"""
+        db.query(sql)
+    except Exception, e:
+        log.info("*** couldn't reconcile keyword stats")
+        log.error(e)
+        return False
+
+    CacheHolder.get_cache().bump_namespace(KEYWORD_STATS_CACHE_NAMESPACE)
+    return True
+
+def getPopularKeywords(db, limit = 10):
+    """
+    Returns a list of dicts with the ``name`` and ``count`` (number of active
+    projects) of the ``limit`` most used keywords, read through the cache.
+
+    """
+    def loadKeywords():
+        sql = """select keyword, num_projects from keyword_stats
+                where num_projects > 0
+                order by num_projects desc, keyword
+                limit $limit"""
+        return [dict(name = row.keyword, count = row.num_projects)
+                for row in db.query(sql, {'limit':limit})]
+
+    try:
+        return CacheHolder.get_cache().get_or_set('popular_%s' % limit, loadKeywords,
+                                                  time = KEYWORD_STATS_CACHE_TIMEOUT,
+                                                  namespace = KEYWORD_STATS_CACHE_NAMESPACE)
+    except Exception, e:
+        log.info("*** couldn't get popular keywords")
+        log.error(e)
+        return []
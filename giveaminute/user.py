@@ -3,13 +3,19 @@
     :license: Affero GNU GPL v3, see LICENSE for more details.
 """
 
+import copy
 import hashlib
 import giveaminute.project as mProject
+import giveaminute.inbox as mInbox
 import giveaminute.idea as mIdea
 import giveaminute.messaging as mMessaging
 import framework.util as util
 from framework.log import log
 
+# Snapshots also hold the new message count, which changes without any write
+# to the user, so they are only trusted for a few minutes.
+USER_SNAPSHOT_TTL = 300
+
 class User():
     """
     An instance of a user.  A layer over the ``user`` table and related tables.
@@ -82,7 +88,7 @@ class User():
         account page
 
     """
-    def __init__(self, db, userId):
+    def __init__(self, db, userId, snapshot = None):
         """
         Initializes a ser instance.
 
@@ -92,14 +98,20 @@ class User():
               specifically a ``web.db.MySQLDB`` instance. It is created with the
               ``web.db.database`` factory in ``framework.controller``.
         userId -- The ID of the user instance to pull from the database.
+        snapshot -- (Optional) A ``dict`` returned by ``getSnapshot``.  If
+                    given, the user is rebuilt from it instead of the database.
 
         """
         self.db = db
         self.id = userId
-        self.data = self.populateUserData()
+
+        if (snapshot):
+            self.data = snapshot['data']
+        else:
+            self.data = self.populateUserData()
 
         if (self.data):
-            self.projectData = self.getUserProjectList()
+            self.projectData = snapshot['projects'] if snapshot else self.getUserProjectList()
 
             self.userKey = self.data.user_key
             self.email = self.data.email
@@ -118,6 +130,20 @@ class User():
             self.isLeader = isLeaderBitmask(self.data.group_membership_bitmask)
             self.numNewMessages = self.getNumNewMessages()
 
+    def getSnapshot(self):
+        """
+        Returns the loaded user data as a picklable ``dict`` that can be stored
+        in memcache and passed back to the constructor.  The password hash and
+        salt are left out.
+
+        """
+        data = copy.copy(self.data)
+        data.pop('password', None)
+        data.pop('salt', None)
+
+        return dict(data = data,
+                    projects = self.projectData)
+
     def isProjectAdmin(self, projectId):
         sql = "select is_project_admin from project__user where user_id = $userId and project_id = $projectId and is_project_admin = 1 limit 1"
 
@@ -272,6 +298,7 @@ where u.user_id = $id and u.is_active = 1"""
         try:
             sql = "update user set last_account_page_access_datetime = now() where user_id = $userId"
             self.db.query(sql, {'userId':self.id})
+            mInbox.markRead(self.id)
 
             return True
         except Exception, e:
@@ -332,11 +359,12 @@ where u.user_id = $id and u.is_active = 1"""
                         o.affiliation as owner_affiliation,
                         o.group_membership_bitmask as owner_group_membership_bitmask,
                         o.image_id as owner_image_id,
-                    (select count(cpu.user_id) from project__user cpu where cpu.project_id = p.project_id) as num_members
+                    coalesce(ps.num_members, 0) as num_members
                 from project p
                 inner join project_endorsement pe on pe.project_id = p.project_id and pe.user_id = $id
                 inner join project__user pu on pu.project_id = p.project_id and pu.is_project_creator = 1
                 inner join user o on o.user_id = pu.user_id
+                left join project_stats ps on ps.project_id = p.project_id
                  where p.is_active = 1"""
             data  = list(self.db.query(sql, { 'id': self.id }))
 
@@ -418,66 +446,61 @@ where u.user_id = $id and u.is_active = 1"""
 
         return ideas
 
-    def getMessages(self, limit, offset):
+    def getMessages(self, limit, offset = 0, before = None):
         """
         Returns a list of messages for this user.  The results are paginated
-        (i.e., this will return ``limit`` rows, starting at ``ofsset``-th row).
+        (i.e., this will return ``limit`` rows, starting at ``ofsset``-th row),
+        or, if ``before`` is the cursor of a message, start after that message.
+
+        The messages and invites are read from the user's inbox (see
+        ``giveaminute.inbox``).
 
         """
         messages = []
 
+        cursor = mProject.parseMessageCursor(before) if before else None
+        beforeDatetime, beforeId = cursor or (None, None)
+
+        if (cursor):
+            offset = 0
+
         try:
             sql = """select
+                        ui.user_inbox_id,
+                        ui.created_datetime,
                         p.project_id,
                         p.title,
                         m.project_message_id,
-                        m.message_type,
-                        m.message,
-                        m.created_datetime as created_datetime,
-                        mu.user_id,
-                        mu.first_name,
-                        mu.last_name,
-                        mu.affiliation,
-                        mu.group_membership_bitmask,
-                        mu.image_id,
+                        coalesce(m.message_type, 'invite') as message_type,
+                        if(m.project_message_id is null,
+                            concat('You''ve been invited to the ',
+                                    ucase(p.title),
+                                    ' project!',
+                                    coalesce(concat('<br/><br/>"', inv.message, '"'), '')),
+                            m.message) as message,
+                        u.user_id,
+                        u.first_name,
+                        u.last_name,
+                        u.affiliation,
+                        u.group_membership_bitmask,
+                        u.image_id,
                         i.idea_id,
                         i.description as idea_description,
                         i.submission_type as idea_submission_type,
                         i.created_datetime as idea_created_datetime
-                    from project_message m
-                    inner join project__user pu on pu.project_id = m.project_id and pu.user_id = $userId
-                    inner join project p on p.project_id = pu.project_id and p.is_active = 1
-                    inner join user mu on mu.user_id = m.user_id
-                    left join idea i on i.idea_id = m.idea_id
-                    where m.is_active = 1
-                        union
-                    select
-                        p.project_id,
-                        p.title,
-                        null as project_message_id,
-                        'invite' as message_type,
-                        concat('You''ve been invited to the ',
-                                ucase(p.title),
-                                ' project!',
-                                coalesce(concat('<br/><br/>"', inv.message, '"'), '')) as message,
-                        inv.created_datetime as created_datetime,
-                        iu.user_id,
-                        iu.first_name,
-                        iu.last_name,
-                        iu.affiliation,
-                        iu.group_membership_bitmask,
-                        iu.image_id,
-                        i.idea_id,
-                        i.description as idea_description,
-                        i.submission_type as idea_submission_type,
-                        i.created_datetime as idea_created_datetime
-                    from project_invite inv
-                    inner join project p on p.project_id = inv.project_id and p.is_active = 1
-                    inner join user iu on iu.user_id = inv.inviter_user_id
-                    inner join idea i on i.idea_id = inv.invitee_idea_id and i.user_id =$userId
-                    order by created_datetime desc
-                    limit $limit offset $offset"""
-            data = list(self.db.query(sql, {'userId':self.id, 'limit':limit, 'offset':offset}))
+                    from user_inbox ui
+                    inner join project p on p.project_id = ui.project_id and p.is_active = 1
+                    left join project_message m on m.project_message_id = ui.project_message_id
+                    left join project_invite inv on inv.project_invite_id = ui.project_invite_id
+                    inner join user u on u.user_id = coalesce(m.user_id, inv.inviter_user_id)
+                    left join idea i on i.idea_id = coalesce(m.idea_id, inv.invitee_idea_id)
+                    where ui.user_id = $userId
+                        and (m.is_active = 1 or ui.project_invite_id is not null)
+                    %s
+                    order by ui.created_datetime desc, ui.user_inbox_id desc
+                    limit $limit offset $offset""" % (mProject.KEYSET_WHERE % {'created':'ui.created_datetime', 'id':'ui.user_inbox_id'} if cursor else '')
+            data = list(self.db.query(sql, {'userId':self.id, 'limit':limit, 'offset':offset,
+                                            'beforeDatetime':beforeDatetime, 'beforeId':beforeId}))
 
             for item in data:
                 messages.append(mProject.message(id=item.project_message_id,
@@ -495,7 +518,8 @@ where u.user_id = $id and u.is_active = 1"""
                                         ideaSubType=item.idea_submission_type,
                                         ideaCreatedDatetime=item.idea_created_datetime,
                                         projectId=item.project_id,
-                                        projectTitle=item.title))
+                                        projectTitle=item.title,
+                                        cursor=mProject.messageCursor(item.created_datetime, item.user_inbox_id)))
         except Exception, e:
             log.info("*** couldn't get messages")
             log.error(e)
@@ -504,33 +528,73 @@ where u.user_id = $id and u.is_active = 1"""
 
     def getNumNewMessages(self):
         """
+        Returns the number of messages and invites this user has received
+        since they last looked at their account page.
 
         """
         num = 0
 
         try:
-            # Select the number of times that someone invited this user to a
-            # project based on this user's idea.  TODO: is my interpretation
-            # correct?  Why is it selecting when this user is the invitee?
-
-            # Select the number of times that this user submitted a message
-
-            sql = """select
-                        (select count(inv.project_invite_id) from project_invite inv
-                          inner join idea i on i.idea_id = inv.invitee_idea_id and i.user_id = $userId
-                          where inv.created_datetime > $last) +
-                        (select count(pm.project_message_id) from project_message pm
-                          inner join project__user pu on pu.project_id = pm.project_id  and pu.user_id = $userId
-                          where pm.is_active = 1 and pm.created_datetime > $last) as total"""
-            data = list(self.db.query(sql, {'userId':self.id, 'last':self.data.last_account_page_access_datetime}))
-
-            num = data[0].total
+            num = mInbox.getUnreadCount(self.db, self.id, self.data.last_account_page_access_datetime)
         except Exception, e:
             log.info("*** couldn't get number of new msgs for user id %s" % self.id)
             log.error(e)
 
         return num
 
+def userVersionKey(userId):
+    return 'user_version_%s' % userId
+
+def getCachedUser(db, cache, userId):
+    """
+    Returns a ``User`` for ``userId``, rebuilt from the memcache snapshot if
+    there is a current one; otherwise the user is loaded from the database and
+    the snapshot is stored for the next request.  Snapshots are keyed on a
+    version number that ``expireCachedUser`` bumps, so an expired snapshot is
+    simply never read again.
+
+    """
+    try:
+        version = cache.get(userVersionKey(userId)) or 0
+        key = 'user_snapshot_%s_%s' % (userId, version)
+        snapshot = cache.get(key)
+    except Exception, e:
+        log.info("*** couldn't read user snapshot for user id %s" % userId)
+        log.error(e)
+        return User(db, userId)
+
+    if (snapshot):
+        return User(db, userId, snapshot)
+
+    user = User(db, userId)
+
+    if (user.data):
+        try:
+            cache.set(key, user.getSnapshot(), time = USER_SNAPSHOT_TTL)
+        except Exception, e:
+            log.info("*** couldn't store user snapshot for user id %s" % userId)
+            log.error(e)
+
+    return user
+
+def expireCachedUser(cache, userId):
+    """
+    Invalidates the memcache snapshot of a user by bumping their version.
+    Call this after changing the user's profile or project memberships.
+
+    """
+    try:
+        key = userVersionKey(userId)
+
+        if (cache.incr(key) is None):
+            cache.set(key, 1)
+
+        return True
+    except Exception, e:
+        log.info("*** couldn't expire user snapshot for user id %s" % userId)
+        log.error(e)
+        return False
+
 def createUser(db, email, password, firstName = None, lastName = None, phone = None, imageId = None, locationId = None, affiliation = None, isAdmin = False):
     userId = None
     key = util.random_string(10)
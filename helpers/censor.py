@@ -4,9 +4,91 @@
 """
 
 import os
+import re
+import string
+import threading
 import framework.util as util
+from framework.cache_holder import CacheHolder
 from framework.log import log
 
+# Every kill and warning word is a single whitespace-delimited word, so a text
+# can be scored by splitting it into words and looking each one up in a dict
+# of word -> score, rather than scanning the lists for every word.
+KILL_SCORE = 2
+WARN_SCORE = 1
+
+CACHE_NAMESPACE = 'badwords'
+
+PUNCTUATION = re.compile('[%s]' % re.escape(string.punctuation))
+
+class BadwordMatcher (object):
+    """
+    The kill and warning word lists, compiled into a single lookup table.
+
+    """
+
+    def __init__(self, kill_words, warn_words):
+        self.kill_words = kill_words
+        self.warn_words = warn_words
+
+        self.scores = dict((word, WARN_SCORE) for word in warn_words.split())
+        self.scores.update((word, KILL_SCORE) for word in kill_words.split())
+
+    def score(self, text):
+        """
+        Returns 2 if the text contains any kill words, 1 if it contains any
+        warning words, otherwise 0.
+
+        """
+        score = 0
+
+        for word in PUNCTUATION.sub(" ", text or "").split():
+            score = max(score, self.scores.get(word.lower(), 0))
+
+            if score == KILL_SCORE:
+                break
+
+        return score
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+def load_word_lists(db):
+    badwords = db.query("SELECT * FROM badwords LIMIT 1")[0]
+    return (badwords['kill_words'] or "", badwords['warn_words'] or "")
+
+def get_matcher(db):
+    """
+    Returns the compiled ``BadwordMatcher``.  The word lists are read through
+    the shared cache, and only recompiled when they have changed.
+
+    """
+    global _matcher
+
+    kill_words, warn_words = CacheHolder.get_cache().get_or_set('lists',
+                                                                lambda: load_word_lists(db),
+                                                                namespace=CACHE_NAMESPACE)
+    matcher = _matcher
+
+    if (matcher is None or
+        matcher.kill_words != kill_words or
+        matcher.warn_words != warn_words):
+        with _matcher_lock:
+            matcher = _matcher = BadwordMatcher(kill_words, warn_words)
+
+    return matcher
+
+def invalidate():
+    """
+    Drops the cached word lists.  Call this after the badwords table changes.
+
+    """
+    global _matcher
+
+    CacheHolder.get_cache().bump_namespace(CACHE_NAMESPACE)
+
+    with _matcher_lock:
+        _matcher = None
 
 def has_words(text, words_list):
     """
@@ -24,17 +106,23 @@ def badwords(db, text):
     2 on kill words, 1 on warning words, otherwise 0.
     """
     try:
-        badwords = db.query("SELECT * FROM badwords LIMIT 1")[0]
-        kill_words = badwords['kill_words'] or ""
-        warn_words = badwords['warn_words'] or ""
+        matcher = get_matcher(db)
     except Exception, e:
         log.error(e)
         return False
 
-    if has_words(text, kill_words.split()):
-        return 2
+    return matcher.score(text)
 
-    if has_words(text, warn_words.split()):
-        return 1
+def badwords_many(db, texts):
+    """
+    Checks each of the given texts for "kill" or "warning" words, as in
+    ``badwords``, loading the word lists only once.  Returns a list of scores
+    in the same order as ``texts``.
+    """
+    try:
+        matcher = get_matcher(db)
+    except Exception, e:
+        log.error(e)
+        return False
 
-    return 0
+    return [matcher.score(text) for text in texts]
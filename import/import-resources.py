@@ -19,6 +19,7 @@ import main
 from framework.log import log
 from framework.config import Config
 from giveaminute.projectResource import ProjectResource
+import giveaminute.keywords
 from framework.image_server import ImageServer
 
 if __name__ == "__main__":
@@ -77,6 +78,7 @@ if __name__ == "__main__":
                     created_datetime = None,
                     image_id = str(image_id)
                 )
+                giveaminute.keywords.setItemKeywords(db, 'project_resource', resource_id, row.keywords)
                 print 'Imported: %s' % resource_id
             
             except Exception, e:
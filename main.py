@@ -15,10 +15,12 @@ import sys
 from os import environ
 
 from framework.log import log
+from framework.compression import compress_processor
 from framework.orm_holder import OrmHolder
 from framework.session_holder import *
 from framework.task_manager import *
 from framework.image_server import *
+from framework.template_holder import TemplateHolder
 
 #from giveaminute import models
 
@@ -40,6 +42,10 @@ ROUTES = (  r'/admin/?([^/.]*)/?([^/.]*)/?([^/.]*)', 'controllers.admin.Admin',
             r'/twilio/?([^/.]*)', 'controllers.sms.twilio.Twilio',
             r'/useraccount/?([^/.]*)', 'controllers.user.UserAccount',
 
+            # Resized uploaded images, in the eager derivative sizes only:
+            # /resize/APP/MODE/WIDTHxHEIGHT/ID
+            r'/resize/([^/.]+)/(bounded|exact)/(\d+)x(\d+)/(\d+)', 'framework.image_server.ImageServer',
+
             # RESTufl Resources
             r'/rest/v1/needs/', 'controllers.rest.NeedsList',
             r'/rest/v1/needs/(?P<id>\d+)/', 'controllers.rest.NeedInstance',
@@ -219,9 +225,22 @@ def main():
     #    The basic_processor has been disabled for this reason
     # app.add_processor(basic_processor)
     
+    # Compress text responses for clients that accept it
+    try:
+        if Config.get('compression').get('enabled', True):
+            app.add_processor(compress_processor)
+    except (KeyError, AttributeError):
+        app.add_processor(compress_processor)
+
     # Load SQLAlchemy
     app.add_processor(load_sqla)
 
+    # Compile the templates up front rather than on the first requests
+    try:
+        TemplateHolder.warm_up()
+    except Exception, e:
+        log.error("ERROR: Could not precompile templates: %s" % e)
+
     return app
 
 # Main logic for the CBU application.  Does some basic configuration,
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+#------------------------------------------------------------------------------
+#
+# Micro-benchmark of keyword extraction: the old scan of the whole keyword
+# list with a substring test per keyword, against the KeywordIndex.
+#
+# Doesn't need a database; the keywords and texts are generated.
+#
+#   python scripts/benchmark_keywords.py --num_keywords=2000 --text_length=500
+#
+#------------------------------------------------------------------------------
+
+import os, sys
+import random
+import string
+import timeit
+from optparse import OptionParser
+
+# Assuming we start in the scripts folder, we need
+# to traverse up for everything in our project
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from giveaminute.keywords import KeywordIndex
+
+def randomWord(minLength=3, maxLength=12):
+    return ''.join(random.choice(string.ascii_lowercase)
+                   for i in range(random.randint(minLength, maxLength)))
+
+def scanKeywords(keywords, s):
+    """The previous implementation of getKeywords, minus the query."""
+    words = []
+
+    for keyword in keywords:
+        if (keyword in s):
+            words.append(keyword)
+
+    return words
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-k", "--num_keywords", help="Number of keywords", type="int", default=1000)
+    parser.add_option("-l", "--text_length", help="Number of words in each text", type="int", default=100)
+    parser.add_option("-n", "--number", help="Number of texts to search", type="int", default=200)
+
+    (opts, args) = parser.parse_args()
+
+    random.seed(0)
+    keywords = list(set(randomWord() for i in range(opts.num_keywords)))
+    vocabulary = keywords + [randomWord() for i in range(opts.num_keywords)]
+    texts = [' '.join(random.choice(vocabulary) for i in range(opts.text_length))
+             for j in range(opts.number)]
+
+    buildTime = timeit.timeit(lambda: KeywordIndex(keywords).build(), number=1)
+    index = KeywordIndex(keywords)
+    index.build()
+
+    for text in texts:
+        assert set(index.find(text)) == set(scanKeywords(keywords, text))
+
+    scanTime = timeit.timeit(lambda: [scanKeywords(keywords, text) for text in texts], number=1)
+    indexTime = timeit.timeit(lambda: [index.find(text) for text in texts], number=1)
+
+    print "%s keywords, %s texts of %s words" % (len(keywords), opts.number, opts.text_length)
+    print "index build:   %8.2f ms" % (buildTime * 1000)
+    print "scan:          %8.3f ms per text" % (scanTime * 1000 / opts.number)
+    print "keyword index: %8.3f ms per text (%.1fx)" % (indexTime * 1000 / opts.number, scanTime / indexTime)
+
+if __name__ == "__main__":
+    main()
+    exit(0)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+#------------------------------------------------------------------------------
+#
+# Run the media jobs queued by uploads (see framework/media_tasks.py): make
+# the final PNGs, thumbnails and derivatives of uploaded images, and mirror
+# uploads to S3.
+#
+# Each worker is a separate process with its own beanstalk connection, so
+# jobs are processed concurrently, one per worker.  Run it from the project
+# directory (where config.yaml is), under upstart or similar so that it is
+# restarted if it dies:
+#
+#     python scripts/media_worker.py --workers 4
+#
+#------------------------------------------------------------------------------
+
+import os, sys
+import multiprocessing
+import time
+from optparse import OptionParser
+
+# Assuming we start in the scripts folder, we need
+# to traverse up for everything in our project
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from framework.log import log
+from framework.task_manager import Tasks
+import framework.media_tasks as media_tasks
+
+def work(tube):
+    # Keep reconnecting if beanstalk goes away.
+    while True:
+        try:
+            Tasks().process(handler=media_tasks.handle, tube=tube)
+        except Exception, e:
+            log.error("*** media worker: %s" % e)
+        time.sleep(5)
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-w", "--workers", help="Number of jobs to process at once", type="int", default=multiprocessing.cpu_count())
+    parser.add_option("-t", "--tube", help="Beanstalk tube to take jobs from", default=media_tasks.MEDIA_TUBE)
+
+    (opts, args) = parser.parse_args()
+
+    workers = [multiprocessing.Process(target=work, args=(opts.tube,)) for i in range(max(opts.workers, 1))]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+
+    log.info("Started %s media workers on the %s tube" % (len(workers), opts.tube))
+
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+
+if __name__ == "__main__":
+    main()
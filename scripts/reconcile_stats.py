@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+#------------------------------------------------------------------------------
+#
+# Recount the denormalized project_stats, location_stats and keyword_stats
+# tables from the source tables, and reconcile the user_inbox table with the
+# project messages and invites.
+#
+# The counters and inboxes are kept current on every write, so this only needs to run
+# occasionally to correct any drift (e.g. rows changed by hand in the db).
+# Enable the etc/cron.daily/reconcile_stats task on the appropriate user.
+#
+#------------------------------------------------------------------------------
+
+import yaml
+import os, sys
+from optparse import OptionParser
+
+# Assuming we start in the scripts folder, we need
+# to traverse up for everything in our project
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from lib import web
+import giveaminute.inbox
+import giveaminute.stats
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-c", "--config_file", help="Configuration Yaml file", default="config.yaml")
+    parser.add_option("-p", "--project_id", help="Only reconcile the stats for this project", type="int", default=None)
+
+    (opts, args) = parser.parse_args()
+
+    if not os.path.exists(opts.config_file):
+        raise IOError("Could not open %s" % opts.config_file)
+
+    f = open(opts.config_file)
+    dbParams = yaml.load(f).get('database')
+    f.close()
+
+    db = web.database(dbn=dbParams.get('dbn'), user=dbParams.get('user'), pw=dbParams.get('password'), db=dbParams.get('db'), host=dbParams.get('host'))
+
+    if not giveaminute.stats.reconcileProjectStats(db, opts.project_id):
+        exit(1)
+
+    if opts.project_id is None and not giveaminute.stats.reconcileLocationStats(db):
+        exit(1)
+
+    if opts.project_id is None and not giveaminute.stats.reconcileKeywordStats(db):
+        exit(1)
+
+    if opts.project_id is None and not giveaminute.inbox.reconcileInbox(db):
+        exit(1)
+
+if __name__ == "__main__":
+
+    # We don't want all the debug stuff that webpy gives us
+    # .. especially not the SQL statements
+    web.webapi.config.debug = False
+
+    main()
+    exit(0)
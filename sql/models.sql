@@ -277,8 +277,10 @@ CREATE TABLE `idea` (
   `last_name` varchar(50) DEFAULT NULL,
   `num_flags` smallint(6) NOT NULL DEFAULT '0',
   `is_active` tinyint(1) NOT NULL DEFAULT '1',
-  `created_datetime` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `created_datetime` timestamp NOT NULL DEFAULT '0000-00-00 00:00:00',
+  `updated_datetime` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (`idea_id`),
+  KEY `user_id` (`user_id`),
   FULLTEXT KEY `description` (`description`)
 ) ENGINE=MyISAM AUTO_INCREMENT=2;
 /*!40101 SET character_set_client = @saved_cs_client */;
@@ -342,6 +344,30 @@ LOCK TABLES `keyword` WRITE;
 /*!40000 ALTER TABLE `keyword` ENABLE KEYS */;
 UNLOCK TABLES;
 
+--
+-- Table structure for table `keyword_stats`
+--
+
+DROP TABLE IF EXISTS `keyword_stats`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `keyword_stats` (
+  `keyword` varchar(100) CHARACTER SET utf8 COLLATE utf8_bin NOT NULL,
+  `num_projects` int(11) NOT NULL DEFAULT '0',
+  PRIMARY KEY (`keyword`),
+  KEY `num_projects` (`num_projects`)
+) ENGINE=MyISAM;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `keyword_stats`
+--
+
+LOCK TABLES `keyword_stats` WRITE;
+/*!40000 ALTER TABLE `keyword_stats` DISABLE KEYS */;
+/*!40000 ALTER TABLE `keyword_stats` ENABLE KEYS */;
+UNLOCK TABLES;
+
 --
 -- Table structure for table `location`
 --
@@ -371,6 +397,32 @@ LOCK TABLES `location` WRITE;
 /*!40000 ALTER TABLE `location` ENABLE KEYS */;
 UNLOCK TABLES;
 
+--
+-- Table structure for table `location_stats`
+--
+
+DROP TABLE IF EXISTS `location_stats`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `location_stats` (
+  `location_id` int(11) NOT NULL,
+  `num_projects` int(11) unsigned NOT NULL DEFAULT '0',
+  `num_ideas` int(11) unsigned NOT NULL DEFAULT '0',
+  `num_project_resources` int(11) unsigned NOT NULL DEFAULT '0',
+  `updated_datetime` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`location_id`)
+) ENGINE=MyISAM;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `location_stats`
+--
+
+LOCK TABLES `location_stats` WRITE;
+/*!40000 ALTER TABLE `location_stats` DISABLE KEYS */;
+/*!40000 ALTER TABLE `location_stats` ENABLE KEYS */;
+UNLOCK TABLES;
+
 --
 -- Table structure for table `migrate_version`
 --
@@ -491,7 +543,8 @@ CREATE TABLE `project__user` (
   `is_project_admin` tinyint(1) NOT NULL DEFAULT '0',
   `is_project_creator` tinyint(1) NOT NULL DEFAULT '0',
   `created_datetime` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
-  PRIMARY KEY (`project_id`,`user_id`)
+  PRIMARY KEY (`project_id`,`user_id`),
+  KEY `user_id` (`user_id`)
 ) ENGINE=MyISAM;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -575,7 +628,8 @@ CREATE TABLE `project_invite` (
   `invitee_email` int(11) DEFAULT NULL,
   `accepted_datetime` timestamp NULL DEFAULT NULL,
   `created_datetime` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
-  PRIMARY KEY (`project_invite_id`)
+  PRIMARY KEY (`project_invite_id`),
+  KEY `invitee_idea_feed` (`invitee_idea_id`,`created_datetime`,`project_invite_id`)
 ) ENGINE=MyISAM;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -588,6 +642,32 @@ LOCK TABLES `project_invite` WRITE;
 /*!40000 ALTER TABLE `project_invite` ENABLE KEYS */;
 UNLOCK TABLES;
 
+--
+-- Table structure for table `project_keyword`
+--
+
+DROP TABLE IF EXISTS `project_keyword`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `project_keyword` (
+  `project_keyword_id` int(11) NOT NULL AUTO_INCREMENT,
+  `project_id` int(11) NOT NULL,
+  `keyword` varchar(100) CHARACTER SET utf8 COLLATE utf8_bin NOT NULL,
+  PRIMARY KEY (`project_keyword_id`),
+  UNIQUE KEY `project_id_keyword` (`project_id`,`keyword`),
+  KEY `keyword` (`keyword`,`project_id`)
+) ENGINE=MyISAM;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `project_keyword`
+--
+
+LOCK TABLES `project_keyword` WRITE;
+/*!40000 ALTER TABLE `project_keyword` DISABLE KEYS */;
+/*!40000 ALTER TABLE `project_keyword` ENABLE KEYS */;
+UNLOCK TABLES;
+
 --
 -- Table structure for table `project_leader`
 --
@@ -613,6 +693,32 @@ LOCK TABLES `project_leader` WRITE;
 /*!40000 ALTER TABLE `project_leader` ENABLE KEYS */;
 UNLOCK TABLES;
 
+--
+-- Table structure for table `project_leaderboard`
+--
+
+DROP TABLE IF EXISTS `project_leaderboard`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `project_leaderboard` (
+  `project_id` int(11) NOT NULL,
+  `num_members` int(11) unsigned NOT NULL DEFAULT '0',
+  `is_ranked` tinyint(1) NOT NULL DEFAULT '0',
+  `updated_datetime` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`project_id`),
+  KEY `updated_datetime` (`updated_datetime`)
+) ENGINE=MyISAM;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `project_leaderboard`
+--
+
+LOCK TABLES `project_leaderboard` WRITE;
+/*!40000 ALTER TABLE `project_leaderboard` DISABLE KEYS */;
+/*!40000 ALTER TABLE `project_leaderboard` ENABLE KEYS */;
+UNLOCK TABLES;
+
 --
 -- Table structure for table `project_link`
 --
@@ -660,7 +766,9 @@ CREATE TABLE `project_message` (
   `is_active` tinyint(1) NOT NULL DEFAULT '1',
   `created_datetime` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
   `file_id` int(11) DEFAULT NULL,
-  PRIMARY KEY (`project_message_id`)
+  PRIMARY KEY (`project_message_id`),
+  KEY `project_feed` (`project_id`,`is_active`,`created_datetime`,`project_message_id`),
+  KEY `project_type_feed` (`project_id`,`message_type`,`created_datetime`,`project_message_id`)
 ) ENGINE=MyISAM;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -773,6 +881,60 @@ LOCK TABLES `project_resource` WRITE;
 /*!40000 ALTER TABLE `project_resource` ENABLE KEYS */;
 UNLOCK TABLES;
 
+--
+-- Table structure for table `project_stats`
+--
+
+DROP TABLE IF EXISTS `project_stats`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `project_stats` (
+  `project_id` int(11) NOT NULL,
+  `num_members` int(11) unsigned NOT NULL DEFAULT '0',
+  `num_ideas` int(11) unsigned NOT NULL DEFAULT '0',
+  `num_project_resources` int(11) unsigned NOT NULL DEFAULT '0',
+  `num_endorsements` int(11) unsigned NOT NULL DEFAULT '0',
+  `updated_datetime` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`project_id`),
+  KEY `num_members` (`num_members`)
+) ENGINE=MyISAM;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `project_stats`
+--
+
+LOCK TABLES `project_stats` WRITE;
+/*!40000 ALTER TABLE `project_stats` DISABLE KEYS */;
+/*!40000 ALTER TABLE `project_stats` ENABLE KEYS */;
+UNLOCK TABLES;
+
+--
+-- Table structure for table `resource_keyword`
+--
+
+DROP TABLE IF EXISTS `resource_keyword`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `resource_keyword` (
+  `resource_keyword_id` int(11) NOT NULL AUTO_INCREMENT,
+  `project_resource_id` int(11) NOT NULL,
+  `keyword` varchar(100) CHARACTER SET utf8 COLLATE utf8_bin NOT NULL,
+  PRIMARY KEY (`resource_keyword_id`),
+  UNIQUE KEY `project_resource_id_keyword` (`project_resource_id`,`keyword`),
+  KEY `keyword` (`keyword`,`project_resource_id`)
+) ENGINE=MyISAM;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `resource_keyword`
+--
+
+LOCK TABLES `resource_keyword` WRITE;
+/*!40000 ALTER TABLE `resource_keyword` DISABLE KEYS */;
+/*!40000 ALTER TABLE `resource_keyword` ENABLE KEYS */;
+UNLOCK TABLES;
+
 --
 -- Table structure for table `site_feedback`
 --
@@ -1001,6 +1163,37 @@ LOCK TABLES `user_group` WRITE;
 /*!40000 ALTER TABLE `user_group` ENABLE KEYS */;
 UNLOCK TABLES;
 
+--
+-- Table structure for table `user_inbox`
+--
+
+DROP TABLE IF EXISTS `user_inbox`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `user_inbox` (
+  `user_inbox_id` int(11) NOT NULL AUTO_INCREMENT,
+  `user_id` int(11) NOT NULL,
+  `project_id` int(11) NOT NULL,
+  `project_message_id` int(11) DEFAULT NULL,
+  `project_invite_id` int(11) DEFAULT NULL,
+  `created_datetime` timestamp NOT NULL DEFAULT '0000-00-00 00:00:00',
+  PRIMARY KEY (`user_inbox_id`),
+  UNIQUE KEY `user_message` (`user_id`,`project_message_id`),
+  UNIQUE KEY `user_invite` (`user_id`,`project_invite_id`),
+  KEY `user_feed` (`user_id`,`created_datetime`,`user_inbox_id`),
+  KEY `project_user` (`project_id`,`user_id`)
+) ENGINE=MyISAM;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `user_inbox`
+--
+
+LOCK TABLES `user_inbox` WRITE;
+/*!40000 ALTER TABLE `user_inbox` DISABLE KEYS */;
+/*!40000 ALTER TABLE `user_inbox` ENABLE KEYS */;
+UNLOCK TABLES;
+
 --
 -- Table structure for table `web_session`
 --
@@ -17,7 +17,8 @@ tc.gam.project_widgets.conversation = function(options){
         runtime_data = {
             message_filter:'all',
             n_to_fetch:10,
-            offset: options.project_data.info.messages.n_returned
+            offset: options.project_data.info.messages.n_returned,
+            cursor: last_cursor(options.project_data.info.messages.items)
         },
         state = {
             widgetId: 'conversation-comment', //The activated widget id
@@ -28,6 +29,11 @@ tc.gam.project_widgets.conversation = function(options){
         $window = tc.jQ(window),
         self = {};
     
+    //The cursor of the oldest message shown, to fetch the next page after it
+    function last_cursor(items) {
+        return (items && items.length) ? items[items.length - 1].cursor : null;
+    }
+    
     tc.util.dump(options);
 
     var refreshUi = function() {
@@ -201,6 +207,7 @@ tc.gam.project_widgets.conversation = function(options){
             
             elements.message_stack.children().remove();
             runtime_data.offset = 0;
+            runtime_data.cursor = null;
             if(t.hasClass('changed')){
                 runtime_data.message_filter = t.text();
             } else {
@@ -214,6 +221,7 @@ tc.gam.project_widgets.conversation = function(options){
                     project_id: options.project_data.project_id,
                     n_messages: runtime_data.n_to_fetch,
                     offset: runtime_data.offset,
+                    before: runtime_data.cursor,
                     filter: runtime_data.message_filter
                 },
                 dataType:"text",
@@ -236,6 +244,7 @@ tc.gam.project_widgets.conversation = function(options){
                         elements.message_stack.append(generate_message(d[i]));
                         runtime_data.offset++;
                     }
+                    runtime_data.cursor = last_cursor(d);
                     dom.find('a.close').unbind('click').bind('click', handlers.remove_comment);
                 }
             });
@@ -249,6 +258,7 @@ tc.gam.project_widgets.conversation = function(options){
                     project_id: options.project_data.project_id,
                     n_messages: runtime_data.n_to_fetch,
                     offset: runtime_data.offset,
+                    before: runtime_data.cursor,
                     filter: runtime_data.message_filter
                 },
                 dataType:"text",
@@ -272,6 +282,7 @@ tc.gam.project_widgets.conversation = function(options){
                         elements.message_stack.append(generate_message(d[i]));
                         runtime_data.offset++;
                     }
+                    runtime_data.cursor = last_cursor(d);
                     dom.find('a.close').unbind('click').bind('click', handlers.remove_comment);
                     dom.find('.message-text').each(handlers.handle_message_body);
                 }
@@ -245,7 +245,7 @@ app_page.features.push(function(app){
 					tempcell = tc.jQ('<td style="width:361px;"></td>').append(tc.jQ('.template-content.project-cell').html());
 					tempcell.find('.delete-project').attr('href','#removeProject,'+d.results[i].project_id);
 					if(d.results[i].image_id > -1){
-						tempcell.find('img').attr('src',app.app_page.media_root + 'images/'+d.results[i].image_id%10+'/'+d.results[i].image_id+'.png');
+						tempcell.find('img').attr('src','/resize/giveaminute/exact/50x50/'+d.results[i].image_id);
 					} else {
 						tempcell.find('img').attr('src','/static/images/thumb_genAvatar50.png');
 					}
@@ -287,7 +287,7 @@ app_page.features.push(function(app){
 					tempcell = tc.jQ('<td  style="width:227px;" class="' + (d.results[i].is_official ? "official-resource" : "") + '"></td>').append(tc.jQ('.template-content.resource-cell').html());
 					tempcell.find('.add-button').attr('href','#addProject,'+d.results[i].link_id);
 					if(d.results[i].image_id){
-						tempcell.find('img').attr('src',app.app_page.media_root + 'images/'+(d.results[i].image_id%10)+'/'+d.results[i].image_id+'.png')
+						tempcell.find('img').attr('src','/resize/giveaminute/exact/35x35/'+d.results[i].image_id)
 					}
 					tempcell.find('.resource-tooltip_trigger').attr('rel','#organization,'+d.results[i].link_id);
 					tempcell.find('.delete-resource').attr('href','#removeResource,'+d.results[i].link_id);
@@ -41,11 +41,15 @@
 	
 	app_page.features.push(function(app){
 		tc.util.log('Give A Minute: User Account');
-		var offset;
+		var offset, cursor;
 		
 		offset = 0;
+		cursor = null;
 		if(app.app_page.data.user_activity && app.app_page.data.user_activity.messages){
 			offset = app.app_page.data.user_activity.messages.length;
+			if(offset){
+				cursor = app.app_page.data.user_activity.messages[offset - 1].cursor;
+			}
 		}
 		
 		if(window.location.hash == ''){
@@ -107,6 +111,7 @@
 				'messages':{
 					selector:'.messages-view',
 					current_offset: offset,
+					current_cursor: cursor,
 					n_to_fetch:5,
 					has_run_init: false,
 					init:function(merlin,dom){
@@ -184,7 +189,8 @@
 								url:"/useraccount/messages",
 								data:{
 									n_messages: e.data.merlin.current_step.n_to_fetch,
-									offset: e.data.merlin.current_step.current_offset
+									offset: e.data.merlin.current_step.current_offset,
+									before: e.data.merlin.current_step.current_cursor
 								},
 								context:merlin,
 								dataType:"text",
@@ -242,6 +248,7 @@
 										if (template) {
 											dom_stack.append(template);
 											me.current_step.current_offset += 1;
+											me.current_step.current_cursor = message.cursor;
 										} else {
 											tc.util.log("no template for message", "warn");
 										}
@@ -27,6 +27,38 @@ from controllers.rest import NeedVolunteerList
 from controllers.rest import RestController
 from controllers.rest import Serializer
 
+from sqlalchemy import event
+from framework.orm_holder import OrmHolder
+
+# Statements sent to the ORM engine while counting; see counting_queries.
+_counted_queries = None
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if _counted_queries is not None:
+        _counted_queries.append(statement)
+
+class counting_queries (object):
+    """
+    Collects the statements the ORM runs inside a ``with`` block.
+    """
+    _is_listening = False
+
+    def __enter__(self):
+        global _counted_queries
+
+        if not counting_queries._is_listening:
+            orm_holder = OrmHolder()
+            engine = orm_holder.get_db_engine(orm_holder.get_db_config())
+            event.listen(engine, 'before_cursor_execute', _count_query)
+            counting_queries._is_listening = True
+
+        _counted_queries = []
+        return _counted_queries
+
+    def __exit__(self, *exc_info):
+        global _counted_queries
+        _counted_queries = None
+
 class Test_RestController_instanceToDict (AppSetupMixin, TestCase):
     fixtures = ['aarons_db_20110826.sql']
 
@@ -592,3 +624,66 @@ class Test_NonProjectAdminReadOnly_canCreate (AppSetupMixin, TestCase):
             ok_(False)
         except BadRequest:
             pass
+
+
+class Test_RestListEndpoints_paging (AppSetupMixin, TestCase):
+    fixtures = ['aarons_db_20110826.sql']
+
+    @istest
+    def should_return_a_page_and_the_cursor_for_the_next_one(self):
+        response = self.app.get('/rest/v1/needs/?limit=2', status=200)
+
+        response_list = json.loads(response.body)
+        assert_equal([int(need['id']) for need in response_list], [1, 2])
+        assert_equal(response.header('X-Next-Cursor'), '2')
+
+        response = self.app.get('/rest/v1/needs/?limit=2&cursor=2', status=200)
+
+        response_list = json.loads(response.body)
+        assert_equal([int(need['id']) for need in response_list], [3, 4])
+
+    @istest
+    def should_not_filter_on_the_paging_parameters(self):
+        response = self.app.get('/rest/v1/needs/?limit=10&cursor=0&fields=id', status=200)
+
+        assert_equal(len(json.loads(response.body)), 4)
+
+    @istest
+    def should_reject_a_bad_limit(self):
+        self.app.get('/rest/v1/needs/?limit=many', status=400)
+
+    @istest
+    def should_return_only_the_selected_fields(self):
+        response = self.app.get('/rest/v1/needs/?fields=id,request', status=200)
+
+        response_list = json.loads(response.body)
+        assert_equal(set(response_list[0].keys()), set(['id', 'request']))
+
+    @istest
+    def should_load_needs_in_the_same_number_of_queries_for_any_page_size(self):
+        with counting_queries() as one_need:
+            self.app.get('/rest/v1/needs/?limit=1', status=200)
+
+        with counting_queries() as all_needs:
+            self.app.get('/rest/v1/needs/', status=200)
+
+        assert_equal(len(all_needs), len(one_need))
+        assert_true(len(all_needs) <= 3, all_needs)
+
+    @istest
+    def should_load_events_in_the_same_number_of_queries_for_any_page_size(self):
+        with counting_queries() as one_event:
+            self.app.get('/rest/v1/events/?limit=1', status=200)
+
+        with counting_queries() as all_events:
+            self.app.get('/rest/v1/events/', status=200)
+
+        assert_equal(len(all_events), len(one_event))
+        assert_true(len(all_events) <= 4, all_events)
+
+    @istest
+    def should_not_load_relationships_for_fields_that_are_not_selected(self):
+        with counting_queries() as queries:
+            self.app.get('/rest/v1/needs/?fields=id,request', status=200)
+
+        assert_equal(len(queries), 1)
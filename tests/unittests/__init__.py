@@ -0,0 +1,60 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+"""
+Shared fixtures for the unit tests.
+
+The unit tests don't use a config.yaml from the working copy.  Before any test
+module (or any framework module that reads the config when it is imported) is
+loaded, a config is built from etc/config.yaml.tmpl with placeholder values,
+in a temporary directory that is removed when the tests finish.
+
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+from framework.config import Config
+
+class PlaceholderSettings (dict):
+    """
+    Values for the placeholders in etc/config.yaml.tmpl.  Any that the tests
+    don't care about are 'x'.
+
+    """
+
+    def __missing__(self, key):
+        return 'x'
+
+def write_config(directory):
+    """
+    Write a config.yaml for the tests into ``directory``, and return its path.
+
+    """
+    settings = PlaceholderSettings(dev = 'Yes',
+                            logfile = os.path.join(directory, 'cbu.log'),
+                            log_level = 'DEBUG',
+                            database_db = 'cbu',
+                            database_test = 'cbu_test',
+                            file_path = 'data/files')
+
+    template_path = os.path.join(os.path.dirname(__file__), '..', '..', 'etc', 'config.yaml.tmpl')
+    f = open(template_path)
+    template = f.read()
+    f.close()
+
+    path = os.path.join(directory, 'config.yaml')
+    f = open(path, 'w')
+    f.write(template % settings)
+    f.close()
+
+    return path
+
+_config_dir = tempfile.mkdtemp(prefix='cbu-tests-')
+atexit.register(shutil.rmtree, _config_dir, True)
+
+Config.path = write_config(_config_dir)
+Config.data = None
@@ -0,0 +1,103 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+import threading
+import time
+
+from unittest2 import TestCase
+from nose.tools import *
+from mock import Mock
+
+from framework.cache_holder import LruCache, Cache
+from unittests.fakes import FakeMemcache
+
+class Test_LruCache (TestCase):
+
+    @istest
+    def evicts_the_least_recently_used_item(self):
+        lru = LruCache(max_items=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+
+        assert_equal(lru.get('a'), 1)
+        assert_is_none(lru.get('b'))
+        assert_equal(lru.get('c'), 3)
+        assert_equal(lru.get_stats()['evictions'], 1)
+
+    @istest
+    def expires_items(self):
+        lru = LruCache(max_items=2, ttl=-1)
+        lru.set('a', 1)
+
+        assert_is_none(lru.get('a'))
+
+    @istest
+    def gives_each_caller_its_own_copy(self):
+        lru = LruCache(max_items=2, ttl=60)
+        value = {'ids': [1, 2]}
+        lru.set('a', value)
+        value['ids'].append(3)
+        lru.get('a')['ids'].append(4)
+
+        assert_equal(lru.get('a'), {'ids': [1, 2]})
+
+class Test_Cache (TestCase):
+
+    def setUp(self):
+        self.client = FakeMemcache()
+        self.cache = Cache(self.client, LruCache(ttl=60), lock_timeout=1, lock_wait=0.01)
+
+    @istest
+    def serves_repeat_reads_from_the_local_tier(self):
+        self.cache.set('key', 'value')
+        self.client.values.clear()
+
+        assert_equal(self.cache.get('key'), 'value')
+
+    @istest
+    def keeps_large_values_out_of_the_local_tier(self):
+        self.cache.max_local_size = 4
+        self.cache.set('key', 'a long value')
+        self.client.values.clear()
+
+        assert_is_none(self.cache.get('key'))
+
+    @istest
+    def bumping_a_namespace_invalidates_its_keys(self):
+        self.cache.set(self.cache.namespace_key('projects', 'featured'), 'old')
+        self.cache.bump_namespace('projects')
+
+        assert_is_none(self.cache.get(self.cache.namespace_key('projects', 'featured')))
+
+    @istest
+    def get_or_set_builds_a_missing_value_once(self):
+        create = Mock(return_value='value')
+
+        assert_equal(self.cache.get_or_set('key', create, namespace='ns'), 'value')
+        assert_equal(self.cache.get_or_set('key', create, namespace='ns'), 'value')
+        assert_equal(create.call_count, 1)
+
+    @istest
+    def get_or_set_waits_for_a_value_being_built_elsewhere(self):
+        self.client.add('lock_key', 1)
+        create = Mock(return_value='mine')
+
+        def build_elsewhere():
+            time.sleep(0.05)
+            self.client.set('key', 'theirs')
+        threading.Thread(target=build_elsewhere).start()
+
+        assert_equal(self.cache.get_or_set('key', create), 'theirs')
+        assert_false(create.called)
+
+    @istest
+    def get_or_set_builds_the_value_if_memcache_is_down(self):
+        self.client.add = Mock(return_value=0)
+        create = Mock(return_value='value')
+
+        assert_equal(self.cache.get_or_set('key', create), 'value')
+        assert_equal(create.call_count, 1)
@@ -11,11 +11,17 @@ from mock import Mock
 
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../.."))
 import helpers.censor as censor
+from framework.cache_holder import CacheHolder
+from unittests.fakes import stub_cache
 from framework.controller import Controller
 
 class CensorTests (unittest.TestCase):
     def setUp(self):
         self.db = Controller.get_db()
+        stub_cache(ttl=60)
+
+    def tearDown(self):
+        CacheHolder.set(None)
 
     def test_has_words(self):
         text = "the quick brown fox jumped over the lazy dog."
@@ -35,6 +41,45 @@ class CensorTests (unittest.TestCase):
         self.assertEqual(censor.badwords(db, "asshole"), 2)
         self.assertEqual(censor.badwords(db, "jerk"), 1)
         self.assertEqual(censor.badwords(db, "unicorn"), 0)
-    
+
+class BadwordMatcherTests (unittest.TestCase):
+    def setUp(self):
+        stub_cache(ttl=60)
+        censor.invalidate()
+
+        self.db = Mock()
+        self.db.query = Mock(return_value=[{
+            'kill_words' : 'dirty words',
+            'warn_words' : 'jerk bad words',
+        }])
+
+    def tearDown(self):
+        CacheHolder.set(None)
+
+    def test_kill_words_outrank_warning_words(self):
+        matcher = censor.BadwordMatcher('dirty words', 'jerk bad words')
+
+        self.assertEqual(matcher.score("Such bad, DIRTY talk!"), 2)
+        self.assertEqual(matcher.score("what a jerk."), 1)
+        self.assertEqual(matcher.score("words"), 2)
+        self.assertEqual(matcher.score(""), 0)
+
+    def test_loads_the_word_lists_once(self):
+        censor.badwords(self.db, "jerk")
+        censor.badwords(self.db, "unicorn")
+
+        self.assertEqual(self.db.query.call_count, 1)
+
+    def test_scores_many_texts_at_once(self):
+        self.assertEqual(censor.badwords_many(self.db, ["jerk", "unicorn", "dirty jerk"]), [1, 0, 2])
+        self.assertEqual(self.db.query.call_count, 1)
+
+    def test_reloads_the_word_lists_after_invalidation(self):
+        censor.badwords(self.db, "jerk")
+        censor.invalidate()
+        self.db.query.return_value = [{'kill_words' : 'jerk', 'warn_words' : ''}]
+
+        self.assertEqual(censor.badwords(self.db, "jerk"), 2)
+
 if __name__ == "__main__":
     unittest.main()
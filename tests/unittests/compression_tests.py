@@ -0,0 +1,100 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+import gzip
+from cStringIO import StringIO
+from unittest2 import TestCase
+from nose.tools import *
+from mock import Mock
+
+from lib import web
+from framework.cache_holder import LruCache
+from framework.compression import Compressor, parse_accept_encoding, strip_etag_suffix
+
+def gunzip(data):
+    return gzip.GzipFile(fileobj=StringIO(data)).read()
+
+class Test_negotiation (TestCase):
+
+    def setUp(self):
+        self.compressor = Compressor()
+        self.compressor.encodings = ('gzip',)
+
+    @istest
+    def parses_quality_values(self):
+        assert_equal(parse_accept_encoding('gzip;q=0.5, deflate, br;q=x'),
+                     {'gzip':0.5, 'deflate':1.0, 'br':0.0})
+
+    @istest
+    def picks_gzip_when_accepted(self):
+        assert_equal(self.compressor.negotiate('gzip, deflate'), 'gzip')
+        assert_equal(self.compressor.negotiate('*'), 'gzip')
+
+    @istest
+    def sends_identity_otherwise(self):
+        assert_is_none(self.compressor.negotiate(None))
+        assert_is_none(self.compressor.negotiate('deflate'))
+        assert_is_none(self.compressor.negotiate('gzip;q=0, *'))
+
+    @istest
+    def prefers_brotli_when_it_is_available(self):
+        self.compressor.encodings = ('br', 'gzip')
+
+        assert_equal(self.compressor.negotiate('gzip, br'), 'br')
+        assert_equal(self.compressor.negotiate('gzip, br;q=0.5'), 'gzip')
+
+class Test_Compressor_process (TestCase):
+
+    def setUp(self):
+        web.ctx.env = {'HTTP_ACCEPT_ENCODING':'gzip'}
+        web.ctx.status = '200 OK'
+        web.ctx.headers = [('Content-Type', 'text/plain'), ('ETag', '"abc"')]
+
+        self.cache = LruCache(max_items=10, ttl=60)
+        self.compressor = Compressor(min_size=100, cache=self.cache)
+        self.compressor.encodings = ('gzip',)
+        self.body = '{"projects": [%s]}' % ', '.join(['"a project"'] * 100)
+
+    @istest
+    def gzips_large_text_responses(self):
+        compressed = self.compressor.process(lambda: self.body)
+
+        assert_equal(gunzip(compressed), self.body)
+        assert_in(('Content-Encoding', 'gzip'), web.ctx.headers)
+        assert_in(('Vary', 'Accept-Encoding'), web.ctx.headers)
+        assert_in(('ETag', '"abc-gzip"'), web.ctx.headers)
+        assert_not_in(('ETag', '"abc"'), web.ctx.headers)
+
+    @istest
+    def reuses_the_compressed_body_for_the_same_etag(self):
+        first = self.compressor.process(lambda: self.body)
+
+        web.ctx.headers = [('Content-Type', 'text/plain'), ('ETag', '"abc"')]
+        assert_equal(self.compressor.process(lambda: self.body), first)
+        assert_equal(self.cache.get_stats()['hits'], 1)
+
+    @istest
+    def leaves_small_responses_alone(self):
+        assert_equal(self.compressor.process(lambda: '{}'), '{}')
+        assert_equal(web.ctx.headers, [('Content-Type', 'text/plain'), ('ETag', '"abc"')])
+
+    @istest
+    def leaves_images_alone(self):
+        web.ctx.headers = [('Content-Type', 'image/png')]
+
+        assert_equal(self.compressor.process(lambda: self.body), self.body)
+
+    @istest
+    def varies_on_accept_encoding_without_compressing(self):
+        web.ctx.env = {}
+
+        assert_equal(self.compressor.process(lambda: self.body), self.body)
+        assert_in(('Vary', 'Accept-Encoding'), web.ctx.headers)
+
+    @istest
+    def strips_the_encoding_from_returned_etags(self):
+        assert_equal(strip_etag_suffix('"abc-gzip"'), '"abc"')
+        assert_equal(strip_etag_suffix('W/"abc-br"'), 'W/"abc"')
+        assert_equal(strip_etag_suffix('"abc"'), '"abc"')
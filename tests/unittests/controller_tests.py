@@ -3,6 +3,8 @@
     :license: Affero GNU GPL v3, see LICENSE for more details.
 """
 
+import time
+from datetime import datetime, timedelta
 from unittest2 import TestCase
 from paste.fixture import TestApp
 from lib import web
@@ -40,3 +42,68 @@ class I18nTests (TestCase):
         langs = controller.get_supported_languages()
         self.assertEqual(langs, {'en_TEST':'L33t'})
 
+
+class ConditionalGetTests (TestCase):
+
+    def setUp(self):
+        web.ctx.method = 'GET'
+        web.ctx.env = {}
+        web.ctx.headers = []
+        web.ctx.status = '200 OK'
+        self.controller = Controller.__new__(Controller)
+
+    def test_AnswersAMatchingETagWithNotModified(self):
+        web.ctx.env['HTTP_IF_NONE_MATCH'] = '"abc", "def"'
+
+        self.assertTrue(self.controller.not_modified(etag='def'))
+        self.assertEqual(web.ctx.status, '304 Not Modified')
+        self.assertIn(('ETag', '"def"'), web.ctx.headers)
+
+    def test_MatchesTheETagOfACompressedResponse(self):
+        web.ctx.env['HTTP_IF_NONE_MATCH'] = '"def-gzip"'
+
+        self.assertTrue(self.controller.not_modified(etag='def'))
+        self.assertEqual([value for key, value in web.ctx.headers if key == 'ETag'], ['"def-gzip"'])
+        self.assertIn(('Vary', 'Accept-Encoding'), web.ctx.headers)
+
+    def test_SendsTheResponseForAStaleETag(self):
+        web.ctx.env['HTTP_IF_NONE_MATCH'] = '"abc"'
+
+        self.assertFalse(self.controller.not_modified(etag='def'))
+        self.assertEqual(web.ctx.status, '200 OK')
+
+    def test_ComparesLastModifiedToTheSecond(self):
+        modified = datetime(2011, 9, 6, 19, 0, 0, 500000)
+        web.ctx.env['HTTP_IF_MODIFIED_SINCE'] = web.httpdate(
+            datetime.utcfromtimestamp(time.mktime(modified.timetuple())))
+
+        self.assertTrue(self.controller.not_modified(last_modified=modified))
+
+        web.ctx.status = '200 OK'
+        self.assertFalse(self.controller.not_modified(last_modified=modified + timedelta(seconds=1)))
+
+    def test_PrefersIfNoneMatchToIfModifiedSince(self):
+        modified = datetime(2011, 9, 6, 19, 0, 0)
+        web.ctx.env['HTTP_IF_NONE_MATCH'] = '"abc"'
+        web.ctx.env['HTTP_IF_MODIFIED_SINCE'] = web.httpdate(datetime(2020, 1, 1))
+
+        self.assertFalse(self.controller.not_modified(etag='def', last_modified=modified))
+
+    def test_LeavesOtherMethodsAlone(self):
+        web.ctx.method = 'POST'
+        web.ctx.env['HTTP_IF_NONE_MATCH'] = '*'
+
+        self.assertFalse(self.controller.not_modified(etag='def'))
+        self.assertEqual(web.ctx.headers, [])
+
+    def test_EmptiesABodyTheClientAlreadyHas(self):
+        web.ctx.env['HTTP_IF_NONE_MATCH'] = '"%s"' % self.controller.make_etag('{"a": 1}')
+
+        self.assertEqual(self.controller.conditional('{"a": 1}'), '')
+        self.assertEqual(web.ctx.status, '304 Not Modified')
+
+    def test_KeepsValidatorsThatWereAlreadySet(self):
+        self.controller.not_modified(etag='version')
+
+        self.assertEqual(self.controller.conditional('{"a": 1}'), '{"a": 1}')
+        self.assertEqual([value for key, value in web.ctx.headers if key == 'ETag'], ['"version"'])
@@ -0,0 +1,200 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+import os
+import shutil
+import tempfile
+from cStringIO import StringIO
+from unittest2 import TestCase
+from nose.tools import *
+from mock import Mock, patch
+from PIL import Image
+
+from lib import web
+from framework.config import Config
+from framework.controller import Controller
+from framework.derivative_store import DerivativeStore, DerivativeStoreHolder
+from framework.image_server import ImageServer
+
+class Test_DerivativeStore (TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = DerivativeStore(self.root, max_size=25)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    @istest
+    def stores_derivatives_by_id_mode_size_and_format(self):
+        assert_true(self.store.put(12, 'exact', 100, 80, 'png', 'x' * 10))
+
+        assert_equal(self.store.get(12, 'exact', 100, 80, 'png'), 'x' * 10)
+        assert_is_none(self.store.get(12, 'bounded', 100, 80, 'png'))
+        assert_equal(os.listdir(os.path.join(self.root, '2', '12')), ['exact_100_80.png'])
+
+        stats = self.store.get_stats()
+        assert_equal((stats['hits'], stats['misses'], stats['items'], stats['size']), (1, 1, 1, 10))
+
+    @istest
+    def evicts_the_least_recently_used_derivatives(self):
+        self.store.put(1, 'exact', 10, 10, 'png', 'a' * 10)
+        self.store.put(2, 'exact', 10, 10, 'png', 'b' * 10)
+        self.store.get(1, 'exact', 10, 10, 'png')
+
+        self.store.put(3, 'exact', 10, 10, 'png', 'c' * 10)
+
+        assert_is_none(self.store.get(2, 'exact', 10, 10, 'png'))
+        assert_equal(self.store.get(1, 'exact', 10, 10, 'png'), 'a' * 10)
+        assert_equal(self.store.get_stats()['evictions'], 1)
+        assert_equal(self.store.get_stats()['size'], 20)
+
+    @istest
+    def removes_every_derivative_of_an_image(self):
+        self.store.put(4, 'exact', 10, 10, 'png', 'a')
+        self.store.put(4, 'bounded', 0, 0, 'png', 'b')
+
+        self.store.remove(4)
+
+        assert_false(os.path.exists(os.path.join(self.root, '4', '4')))
+        assert_equal(self.store.get_stats()['items'], 0)
+
+    @istest
+    def picks_up_stored_derivatives_after_a_restart(self):
+        self.store.put(5, 'exact', 10, 10, 'png', 'a' * 10)
+
+        store = DerivativeStore(self.root, max_size=25)
+
+        assert_equal(store.get(5, 'exact', 10, 10, 'png'), 'a' * 10)
+        assert_equal(store.get_stats()['size'], 10)
+
+    @istest
+    def forgets_derivatives_evicted_by_another_process(self):
+        self.store.put(6, 'exact', 10, 10, 'png', 'a' * 10)
+        os.remove(self.store.path(6, 'exact', 10, 10, 'png'))
+
+        assert_is_none(self.store.get(6, 'exact', 10, 10, 'png'))
+        assert_equal(self.store.get_stats()['size'], 0)
+
+    @istest
+    def doesnt_store_derivatives_bigger_than_the_budget(self):
+        assert_false(self.store.put(7, 'exact', 10, 10, 'png', 'a' * 26))
+
+    @istest
+    def keeps_changes_made_while_rescanning(self):
+        self.store.put(8, 'exact', 10, 10, 'png', 'a' * 10)
+        self.store.last_scanned = None
+        found = list(os.walk(self.root))
+
+        def walk_then_put(root):
+            # Runs without the lock, and doesn't start a second scan.
+            self.store.put(9, 'exact', 10, 10, 'png', 'b' * 10)
+            return found
+
+        with patch('framework.derivative_store.os.walk', side_effect=walk_then_put):
+            assert_true(self.store.scan())
+
+        assert_equal(self.store.files.keys(), [self.store.path(8, 'exact', 10, 10, 'png'),
+                                               self.store.path(9, 'exact', 10, 10, 'png')])
+        assert_equal(self.store.get_stats()['size'], 20)
+
+class Test_ImageServer_GET (TestCase):
+
+    def setUp(self):
+        web.ctx.headers = []
+        web.ctx.env = {}
+        self.root = tempfile.mkdtemp()
+        self.store = DerivativeStoreHolder.set(DerivativeStore(self.root))
+
+        self.source = os.path.join(self.root, 'source.png')
+        Image.new('RGB', (160, 80), (255, 0, 0)).save(self.source, 'PNG')
+
+        self.server = ImageServer.__new__(ImageServer)
+        self.server.cache = Mock()
+        self.server.cache.get = Mock(return_value=None)
+
+    def tearDown(self):
+        DerivativeStoreHolder.set(None)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    @istest
+    def renders_and_stores_a_missing_derivative(self):
+        db = Mock()
+        db.query = Mock(return_value=[web.storage(id=3)])
+
+        with patch.object(Controller, 'get_db', return_value=db):
+            with patch.object(Config, 'get', return_value={}):
+                with patch.object(ImageServer, 'path', return_value=self.source):
+                    data = self.server.GET('giveaminute', 'bounded', '80', '80', '3')
+
+        assert_equal(Image.open(StringIO(data)).size, (80, 40))
+        assert_equal(self.store.get(3, 'bounded', 80, 80, 'png'), data)
+        assert_true(self.server.cache.set.called)
+
+    @istest
+    def refuses_sizes_the_templates_do_not_use(self):
+        self.server.error = Mock(return_value='400')
+
+        with patch.object(Controller, 'get_db') as get_db:
+            with patch.object(Config, 'get', return_value={}):
+                assert_equal(self.server.GET('giveaminute', 'exact', '30000', '30000', '3'), '400')
+                assert_equal(self.server.GET('giveaminute', 'bounded', '35', '35', '3'), '400')
+
+        assert_false(get_db.called)
+        assert_equal(self.store.get_stats()['writes'], 0)
+
+    @istest
+    def serves_a_stored_derivative_without_reading_the_source(self):
+        self.store.put(3, 'exact', 35, 35, 'png', 'stored png')
+
+        with patch.object(Controller, 'get_db') as get_db:
+            with patch.object(Config, 'get', return_value={}):
+                assert_equal(self.server.GET('giveaminute', 'exact', '35', '35', '3'), 'stored png')
+                assert_false(get_db.called)
+
+    @istest
+    def leaves_stored_derivatives_to_nginx(self):
+        self.store.put(3, 'exact', 35, 35, 'png', 'stored png')
+        media = {'sendfile':'x-accel-redirect', 'derivative_uri':'/_derivatives/'}
+
+        with patch.object(Config, 'get', return_value=media):
+            assert_equal(self.server.GET('giveaminute', 'exact', '35', '35', '3'), '')
+
+        assert_in(('X-Accel-Redirect', '/_derivatives/3/3/exact_35_35.png'), web.ctx.headers)
+        assert_in(('Content-Type', 'image/png'), web.ctx.headers)
+        assert_false(self.server.cache.get.called)
+
+    @istest
+    def leaves_stored_derivatives_to_lighttpd(self):
+        self.store.put(3, 'exact', 35, 35, 'png', 'stored png')
+
+        with patch.object(Config, 'get', return_value={'sendfile':'X-Sendfile'}):
+            assert_equal(self.server.GET('giveaminute', 'exact', '35', '35', '3'), '')
+
+        assert_in(('X-Sendfile', self.store.path(3, 'exact', 35, 35, 'png')), web.ctx.headers)
+
+    @istest
+    def sends_photos_in_the_format_the_client_accepts(self):
+        db = Mock()
+        db.query = Mock(return_value=[web.storage(id=3)])
+        photo = Image.merge('RGB', (Image.linear_gradient('L'), Image.radial_gradient('L'),
+                                    Image.effect_noise((256, 256), 64)))
+        photo.resize((80, 40)).save(self.source, 'PNG')
+
+        with patch.object(Controller, 'get_db', return_value=db):
+            with patch.object(Config, 'get', return_value={}):
+                with patch.object(ImageServer, 'path', return_value=self.source):
+                    jpeg = self.server.GET('giveaminute', 'bounded', '80', '80', '3')
+
+                    web.ctx.env = {'HTTP_ACCEPT': 'image/webp,*/*'}
+                    webp = self.server.GET('giveaminute', 'bounded', '80', '80', '3')
+
+        assert_equal(Image.open(StringIO(jpeg)).format, 'JPEG')
+        assert_equal(Image.open(StringIO(webp)).format, 'WEBP')
+        assert_in(('Content-Type', 'image/webp'), web.ctx.headers)
+        assert_in(('Vary', 'Accept'), web.ctx.headers)
+        assert_equal(self.store.get(3, 'bounded', 80, 80, 'jpeg'), jpeg)
+        assert_equal(self.store.get(3, 'bounded', 80, 80, 'webp'), webp)
+        assert_is_none(self.store.get(3, 'bounded', 80, 80, 'png'))
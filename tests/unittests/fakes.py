@@ -0,0 +1,52 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+"""
+Stand-ins shared by the unit tests.
+
+"""
+import threading
+
+from framework.cache_holder import CacheHolder, Cache, LruCache
+
+class FakeMemcache (object):
+    """A dict-backed stand-in for a memcache client."""
+
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, time=0):
+        self.values[key] = value
+        return True
+
+    def add(self, key, value, time=0):
+        with self.lock:
+            if key in self.values:
+                return False
+            self.values[key] = value
+            return True
+
+    def delete(self, key):
+        return self.values.pop(key, None) is not None
+
+    def incr(self, key, delta=1):
+        with self.lock:
+            if key not in self.values:
+                return None
+            self.values[key] += delta
+            return self.values[key]
+
+def stub_cache(**lru_options):
+    """
+    Install a shared cache backed by a ``FakeMemcache`` as the process-wide
+    cache, and return it.  ``lru_options`` go to the local ``LruCache``;
+    ``max_items=0`` turns it off so that every read reaches the fake.
+
+    """
+    return CacheHolder.set(Cache(FakeMemcache(), LruCache(**lru_options)))
@@ -0,0 +1,101 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+import time
+
+from unittest2 import TestCase
+from nose.tools import *
+from mock import Mock, patch
+
+from unittests.fakes import stub_cache
+
+# Load the controller first to sidestep the circular model imports.
+import framework.controller
+import giveaminute.homepage as mHomepage
+
+class Test_getHomepageData (TestCase):
+
+    def setUp(self):
+        self.cache = stub_cache(max_items=0)
+        self.db = Mock()
+
+        self.patches = [patch.object(mHomepage, 'buildHomepageData', Mock(return_value=dict(locations=[], all_ideas=['idea']))),
+                        patch.object(mHomepage, 'getRefreshInterval', Mock(side_effect=lambda name, default: default)),
+                        patch.object(mHomepage, 'requestRefresh', Mock())]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def refreshed(self):
+        return [args[1] for args, kwargs in mHomepage.requestRefresh.call_args_list]
+
+    @istest
+    def builds_the_first_bundle_during_the_request(self):
+        data = mHomepage.getHomepageData(self.db)
+
+        assert_equal(data['all_ideas'], ['idea'])
+        assert_equal(data['news'], [])
+        assert_equal(self.refreshed(), ['homepage_news'])
+
+    @istest
+    def serves_a_fresh_bundle_without_building_or_refreshing(self):
+        mHomepage.refreshHomepageData(self.db)
+        self.cache.set('homepage_news', dict(built=time.time(), items=['news']))
+        mHomepage.buildHomepageData.reset_mock()
+
+        data = mHomepage.getHomepageData(self.db)
+
+        assert_equal(data['news'], ['news'])
+        assert_false(mHomepage.buildHomepageData.called)
+        assert_equal(self.refreshed(), [])
+
+    @istest
+    def serves_a_stale_bundle_and_refreshes_it_in_the_background(self):
+        mHomepage.refreshHomepageData(self.db)
+        self.cache.set('homepage_news', dict(built=time.time() - 3600, items=['old news']))
+        bundle = self.cache.get('homepage_data')
+        bundle['built'] -= 3600
+        self.cache.set('homepage_data', bundle)
+        mHomepage.buildHomepageData.reset_mock()
+
+        data = mHomepage.getHomepageData(self.db)
+
+        assert_equal(data['news'], ['old news'])
+        assert_false(mHomepage.buildHomepageData.called)
+        assert_equal(self.refreshed(), ['homepage_data', 'homepage_news'])
+
+    @istest
+    def refreshes_an_expired_bundle_in_the_background(self):
+        mHomepage.refreshHomepageData(self.db)
+        self.cache.set('homepage_news', dict(built=time.time(), items=[]))
+
+        mHomepage.expireHomepageData()
+        mHomepage.getHomepageData(self.db)
+
+        assert_equal(self.refreshed(), ['homepage_data'])
+
+class Test_refresh (TestCase):
+
+    def setUp(self):
+        self.cache = stub_cache(max_items=0)
+
+    @istest
+    def only_one_refresh_is_queued_at_a_time(self):
+        self.cache.add('lock_refresh_homepage_news', 1)
+
+        assert_false(mHomepage.requestRefresh(Mock(), 'homepage_news'))
+
+    @istest
+    def keeps_the_last_good_news_when_the_feed_fails(self):
+        self.cache.set('homepage_news', dict(built=0, items=['news']))
+
+        with patch.object(mHomepage, 'getNewsItems', Mock(return_value=None)):
+            bundle = mHomepage.refreshNews(Mock())
+
+        assert_equal(bundle['items'], ['news'])
+        assert_true(bundle['built'] > 0)
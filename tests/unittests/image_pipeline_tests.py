@@ -0,0 +1,144 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+import os
+import shutil
+import tempfile
+from cStringIO import StringIO
+from unittest2 import TestCase
+from nose.tools import *
+from mock import Mock, patch
+from PIL import Image
+
+import framework.image_pipeline as image_pipeline
+from framework.config import Config
+from framework.derivative_store import DerivativeStore, DerivativeStoreHolder
+from framework.image_pipeline import IngestStats
+from framework.image_server import ImageServer
+
+def image_data(size, format):
+    f = StringIO()
+    Image.new('RGB', size, (200, 40, 40)).save(f, format)
+    return f.getvalue()
+
+def photo(size):
+    return Image.merge('RGB', (Image.linear_gradient('L').resize(size),
+                               Image.radial_gradient('L').resize(size),
+                               Image.effect_noise(size, 64)))
+
+class Test_image_pipeline (TestCase):
+
+    def setUp(self):
+        IngestStats.reset()
+
+    @istest
+    def decodes_jpegs_in_draft_mode(self):
+        image = image_pipeline.decode(image_data((800, 600), 'JPEG'), (100, 100))
+
+        assert_equal(image.size, (200, 150))
+        assert_equal(image.format, 'JPEG')
+
+    @istest
+    def decodes_other_formats_at_full_size(self):
+        image = image_pipeline.decode(image_data((800, 600), 'PNG'), (100, 100))
+
+        assert_equal(image.size, (800, 600))
+
+    @istest
+    def raises_ioerror_for_data_that_is_not_an_image(self):
+        assert_raises(IOError, image_pipeline.decode, 'not an image')
+
+    @istest
+    def resizes_to_exact_and_bounded_sizes(self):
+        image = Image.new('RGB', (400, 200))
+
+        assert_equal(image_pipeline.resize(image, 'exact', 60, 60).size, (60, 60))
+        assert_equal(image_pipeline.resize(image, 'bounded', 80, 80).size, (80, 40))
+
+    @istest
+    def records_the_time_each_stage_takes(self):
+        image = image_pipeline.decode(image_data((40, 40), 'PNG'))
+        image_pipeline.encode(image_pipeline.thumbnail(image, (10, 10)), 'PNG')
+
+        stats = IngestStats.get_stats()
+        assert_equal(sorted(stats), ['decode', 'encode', 'resize'])
+        assert_equal(stats['decode']['count'], 1)
+        assert_true(stats['decode']['max_ms'] >= stats['decode']['mean_ms'] >= 0)
+
+class Test_ImageServer_add (TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = DerivativeStoreHolder.set(DerivativeStore(os.path.join(self.root, 'derivatives')))
+        self.db = Mock()
+        self.db.insert.return_value = 17
+
+    def tearDown(self):
+        DerivativeStoreHolder.set(None)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    @istest
+    def decodes_once_and_stores_every_eager_derivative(self):
+        settings = {'file_path': self.root, 'isS3mirror': False}
+
+        with patch.object(Config, 'get', return_value=settings):
+            with patch.object(image_pipeline, 'decode', wraps=image_pipeline.decode) as decode:
+                id = ImageServer.add(self.db, image_data((400, 300), 'JPEG'), 'giveaminute')
+            path = ImageServer.path('giveaminute', 17)
+
+        assert_equal(id, 17)
+        assert_equal(decode.call_count, 1)
+        assert_true(os.path.exists(path))
+        for mode, width, height in ImageServer.EAGER_DERIVATIVES:
+            assert_is_not_none(self.store.get(17, mode, width, height, 'png'))
+
+        assert_equal(Image.open(StringIO(self.store.get(17, 'exact', 60, 60, 'png'))).size, (60, 60))
+
+    @istest
+    def rejects_data_that_is_not_an_image_before_adding_a_row(self):
+        with patch.object(Config, 'get', return_value={'file_path': self.root}):
+            assert_is_none(ImageServer.add(self.db, 'not an image', 'giveaminute'))
+
+        assert_false(self.db.insert.called)
+
+class Test_output_formats (TestCase):
+
+    def setUp(self):
+        self.photo = photo((80, 80))
+
+    @istest
+    def keeps_flat_graphics_and_transparent_images_as_png(self):
+        graphic = Image.new('RGB', (80, 80), (255, 255, 255))
+        transparent = self.photo.convert('RGBA')
+        transparent.putpixel((0, 0), (0, 0, 0, 0))
+
+        assert_equal(image_pipeline.choose_format(graphic, 'image/webp'), 'png')
+        assert_equal(image_pipeline.choose_format(transparent, 'image/webp'), 'png')
+
+    @istest
+    def sends_photos_as_jpeg_or_webp(self):
+        assert_equal(image_pipeline.choose_format(self.photo, 'image/png,*/*'), 'jpeg')
+        assert_equal(image_pipeline.choose_format(self.photo.convert('RGBA'), None), 'jpeg')
+
+        if image_pipeline.can_encode('webp'):
+            assert_equal(image_pipeline.choose_format(self.photo, 'image/webp,*/*'), 'webp')
+            assert_equal(image_pipeline.choose_format(self.photo, 'image/webp;q=0'), 'jpeg')
+
+    @istest
+    def honours_wildcards_in_the_accept_header(self):
+        firefox = 'image/png,image/*;q=0.8,*/*;q=0.5'
+        assert_equal(image_pipeline.photo_format(firefox), 'jpeg')
+        assert_equal(image_pipeline.photo_format('image/*;q=0.8,image/webp;q=0'), 'jpeg')
+
+        if image_pipeline.can_encode('webp'):
+            assert_equal(image_pipeline.photo_format('image/jpeg;q=0.5,image/*'), 'webp')
+            assert_equal(image_pipeline.photo_format('image/webp;q=0.5,*/*;q=0.1'), 'webp')
+
+    @istest
+    def knows_the_content_type_of_encoded_data(self):
+        for format, (pil_format, content_type, options) in image_pipeline.FORMATS.items():
+            if image_pipeline.can_encode(format):
+                data = image_pipeline.encode(self.photo, pil_format)
+                assert_equal(image_pipeline.content_type(data), content_type)
@@ -0,0 +1,154 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+from unittest2 import TestCase
+from nose.tools import *
+from mock import Mock, patch
+
+from lib import web
+from framework.cache_holder import CacheHolder
+from unittests.fakes import stub_cache
+import framework.controller
+import giveaminute.keywords as mKeywords
+import giveaminute.project as mProject
+import giveaminute.stats as mStats
+import helpers.censor
+
+class Test_KeywordIndex (TestCase):
+
+    @istest
+    def finds_every_keyword_in_the_string(self):
+        index = mKeywords.KeywordIndex(['garden', 'den', 'art', 'park'])
+
+        assert_equal(index.find('the art garden'), ['art', 'garden', 'den'])
+        assert_equal(index.find('parking lot'), ['park'])
+        assert_equal(index.find('nothing here'), [])
+
+    @istest
+    def finds_the_same_keywords_as_a_substring_scan(self):
+        keywords = ['he', 'she', 'his', 'hers', 'us', 'ushers']
+        s = 'ushers and his sheep'
+        index = mKeywords.KeywordIndex(keywords)
+
+        assert_equal(set(index.find(s)), set(k for k in keywords if k in s))
+
+    @istest
+    def updates_only_the_changed_keywords(self):
+        index = mKeywords.KeywordIndex(['garden', 'park'])
+        index.update(['garden', 'trees'])
+
+        assert_equal(index.keywords, set(['garden', 'trees']))
+        assert_equal(index.find('park trees garden'), ['trees', 'garden'])
+
+class Test_getKeywords (TestCase):
+
+    def setUp(self):
+        stub_cache(ttl=60)
+        self.db = Mock()
+        self.db.query = Mock(return_value=[web.storage(keyword='garden'), web.storage(keyword='food')])
+
+    def tearDown(self):
+        CacheHolder.set(None)
+
+    @istest
+    def reads_the_keyword_table_once(self):
+        assert_equal(mKeywords.getKeywords(self.db, 'food garden'), ['food', 'garden'])
+        assert_equal(mKeywords.getKeywords(self.db, 'gardening'), ['garden'])
+        assert_equal(self.db.query.call_count, 1)
+
+    @istest
+    def picks_up_new_keywords_after_they_expire(self):
+        mKeywords.getKeywords(self.db, 'food')
+        mKeywords.expireKeywords()
+        self.db.query.return_value = [web.storage(keyword='bikes')]
+
+        assert_equal(mKeywords.getKeywords(self.db, 'food for bikes'), ['bikes'])
+
+class Test_itemKeywords (TestCase):
+
+    @istest
+    def splits_keywords_into_distinct_words(self):
+        assert_equal(mKeywords.splitKeywords('garden bikes  garden'), ['garden', 'bikes'])
+        assert_equal(mKeywords.splitKeywords(['street art', '', 'bikes']), ['street', 'art', 'bikes'])
+        assert_equal(mKeywords.splitKeywords(None), [])
+
+    @istest
+    def inserts_a_row_per_keyword(self):
+        db = Mock()
+
+        mKeywords.insertItemKeywords(db, 'project_resource', 4, 'garden bikes')
+
+        sql, params = db.query.call_args[0]
+        assert_in('insert ignore into resource_keyword (project_resource_id, keyword)', sql)
+        assert_in('($id, $keyword0), ($id, $keyword1)', sql)
+        assert_equal(params, {'id':4, 'keyword0':'garden', 'keyword1':'bikes'})
+
+    @istest
+    def skips_the_insert_without_keywords(self):
+        db = Mock()
+
+        mKeywords.insertItemKeywords(db, 'project', 4, '')
+        assert_false(db.query.called)
+
+    @istest
+    def rewrites_the_keyword_string_from_the_rows(self):
+        db = Mock()
+        db.query = Mock(side_effect=[[web.storage(keyword='garden'), web.storage(keyword='bikes')], 1])
+
+        mKeywords.updateKeywordString(db, 'project', 7)
+
+        sql, params = db.query.call_args[0]
+        assert_equal(sql, 'update project set keywords = $keywords where project_id = $id')
+        assert_equal(params, {'id':7, 'keywords':'garden bikes'})
+
+class Test_projectKeywords (TestCase):
+
+    def setUp(self):
+        self.adjustKeywordStats = patch.object(mStats, 'adjustKeywordStats').start()
+        self.badwords = patch.object(helpers.censor, 'badwords', return_value=0).start()
+
+    def tearDown(self):
+        patch.stopall()
+
+    @istest
+    def adds_only_the_new_keywords(self):
+        db = Mock()
+        db.query = Mock(side_effect=[[web.storage(is_active=1, keyword='garden')], 1, [], 1])
+
+        assert_true(mProject.addKeywords(db, 3, ['garden', ' bikes', 'bikes']))
+
+        sql, params = db.query.call_args_list[1][0]
+        assert_in('insert ignore into project_keyword', sql)
+        assert_equal(params, {'id':3, 'keyword0':'bikes'})
+        self.adjustKeywordStats.assert_called_once_with(db, ['bikes'], 1)
+
+    @istest
+    def doesnt_count_keywords_on_inactive_projects(self):
+        db = Mock()
+        db.query = Mock(side_effect=[[web.storage(is_active=0, keyword=None)], 1, [], 1])
+
+        assert_true(mProject.addKeywords(db, 3, ['bikes']))
+        assert_false(self.adjustKeywordStats.called)
+
+    @istest
+    def removes_a_keyword_without_reading_the_others(self):
+        db = Mock()
+        db.query = Mock(side_effect=[[web.storage(is_active=1)], 1, [], 1])
+
+        assert_true(mProject.removeKeyword(db, 3, 'bikes'))
+
+        sql, params = db.query.call_args_list[1][0]
+        assert_in('delete from project_keyword', sql)
+        assert_equal(params, {'id':3, 'keywords':['bikes']})
+        self.adjustKeywordStats.assert_called_once_with(db, ['bikes'], -1)
+
+    @istest
+    def leaves_the_project_alone_when_the_keyword_isnt_on_it(self):
+        db = Mock()
+        db.query = Mock(side_effect=[[web.storage(is_active=1)], 0])
+
+        assert_true(mProject.removeKeyword(db, 3, 'bikes'))
+        assert_equal(db.query.call_count, 2)
+        assert_false(self.adjustKeywordStats.called)
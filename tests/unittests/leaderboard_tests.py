@@ -0,0 +1,97 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+from datetime import datetime
+
+from unittest2 import TestCase
+from nose.tools import *
+from mock import Mock
+
+from lib import web
+from unittests.fakes import stub_cache
+
+# Load the controller first to sidestep the circular model imports.
+import framework.controller
+import giveaminute.leaderboard as mLeaderboard
+import giveaminute.project as mProject
+
+def leaderboard_row(project_id, num_members, is_ranked=1, updated_datetime=datetime(2011, 8, 1)):
+    return web.storage(project_id=project_id, num_members=num_members,
+                       is_ranked=is_ranked, updated_datetime=updated_datetime)
+
+class Test_Leaderboard (TestCase):
+
+    def setUp(self):
+        self.leaderboard = mLeaderboard.Leaderboard()
+        self.leaderboard.put(1, 3)
+        self.leaderboard.put(2, 8)
+        self.leaderboard.put(3, 3)
+
+    @istest
+    def ranks_by_members_then_project_id(self):
+        assert_equal(self.leaderboard.page(10), [(2, 8), (1, 3), (3, 3)])
+        assert_equal(self.leaderboard.rank(2), 1)
+        assert_equal(self.leaderboard.rank(3), 3)
+
+    @istest
+    def pages_the_leaderboard(self):
+        assert_equal(self.leaderboard.page(2, 1), [(1, 3), (3, 3)])
+
+    @istest
+    def moves_a_project_when_its_members_change(self):
+        self.leaderboard.put(3, 9)
+
+        assert_equal(self.leaderboard.rank(3), 1)
+        assert_equal(len(self.leaderboard), 3)
+
+    @istest
+    def removes_projects(self):
+        self.leaderboard.remove(2)
+
+        assert_equal(self.leaderboard.rank(2), None)
+        assert_equal(self.leaderboard.rank(1), 1)
+
+    @istest
+    def applies_changed_rows(self):
+        db = Mock()
+        db.query = Mock(return_value=[leaderboard_row(1, 20, updated_datetime=datetime(2011, 9, 1)),
+                                      leaderboard_row(2, 8, is_ranked=0)])
+
+        self.leaderboard.update(db)
+
+        assert_equal(self.leaderboard.page(10), [(1, 20), (3, 3)])
+        assert_equal(self.leaderboard.lastUpdated, datetime(2011, 9, 1))
+
+class Test_getLeaderboard (TestCase):
+
+    def setUp(self):
+        stub_cache(max_items=0)
+        mLeaderboard._leaderboard = mLeaderboard.Leaderboard()
+
+        self.db = Mock()
+        self.db.query = Mock(return_value=[leaderboard_row(1, 3), leaderboard_row(2, 8)])
+
+    @istest
+    def only_rereads_the_table_after_a_change(self):
+        assert_equal(mLeaderboard.getProjectRank(self.db, '1'), 2)
+        assert_equal(mLeaderboard.getProjectRank(self.db, 2), 1)
+        assert_equal(self.db.query.call_count, 1)
+
+        mLeaderboard.updateProjectRank(self.db, 1)
+        self.db.query.return_value = [leaderboard_row(1, 10)]
+
+        assert_equal(mLeaderboard.getProjectRank(self.db, 1), 1)
+        assert_equal(self.db.query.call_count, 3)
+
+    @istest
+    def reads_the_details_for_a_page_of_projects(self):
+        projects = [web.storage(project_id=2, title=u'Bikes'), web.storage(project_id=1, title=u'Garden')]
+        self.db.query = Mock(side_effect=[[leaderboard_row(1, 3), leaderboard_row(2, 8)], projects])
+
+        data = mProject.getLeaderboardProjects(self.db, 10)
+
+        assert_equal([(item.ordinal, item.title, item.user_count) for item in data],
+                     [(1, u'Bikes', 8), (2, u'Garden', 3)])
+        assert_in('in (2,1)', self.db.query.call_args[0][0])
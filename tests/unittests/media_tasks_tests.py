@@ -0,0 +1,157 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+import os
+import shutil
+import tempfile
+from cStringIO import StringIO
+from unittest2 import TestCase
+from nose.tools import *
+from mock import Mock, patch
+from PIL import Image
+
+import framework.image_pipeline
+import framework.media_tasks as media_tasks
+import framework.task_manager
+from lib import web
+from framework.config import Config
+from framework.controller import Controller
+from framework.derivative_store import DerivativeStore, DerivativeStoreHolder
+from framework.file_server import S3FileServer
+from framework.image_server import ImageServer
+from framework.task_manager import Task
+import giveaminute.project as mProject
+
+def image_data(size, format):
+    f = StringIO()
+    Image.new('RGB', size, (40, 200, 40)).save(f, format)
+    return f.getvalue()
+
+class Test_enqueue (TestCase):
+
+    @istest
+    def puts_jobs_on_the_media_tube(self):
+        tasks = Mock()
+        with patch.object(framework.task_manager, 'Tasks', return_value=tasks):
+            with patch.dict(media_tasks.JOBS, {'image': Mock()}):
+                assert_true(media_tasks.enqueue('image', {'id': 3}))
+                assert_false(media_tasks.JOBS['image'].called)
+
+        tasks.add.assert_called_once_with(tube='media', func='image', data={'id': 3}, timeout=300)
+
+    @istest
+    def runs_jobs_now_when_the_queue_is_not_running(self):
+        with patch.object(framework.task_manager, 'Tasks', return_value=Mock(queue=None)):
+            with patch.dict(media_tasks.JOBS, {'image': Mock(return_value=True)}):
+                assert_true(media_tasks.enqueue('image', {'id': 3}))
+                media_tasks.JOBS['image'].assert_called_once_with({'id': 3})
+
+    @istest
+    def reports_failed_and_unknown_jobs_to_the_worker(self):
+        with patch.dict(media_tasks.JOBS, {'image': Mock(side_effect=IOError)}):
+            assert_false(media_tasks.handle(Task('image', {'id': 3})))
+
+        assert_false(media_tasks.handle(Task('video', {'id': 3})))
+
+class Test_deferred_images (TestCase):
+
+    def setUp(self):
+        web.ctx.headers = []
+        web.ctx.env = {}
+        self.root = tempfile.mkdtemp()
+        self.store = DerivativeStoreHolder.set(DerivativeStore(os.path.join(self.root, 'derivatives')))
+        self.media = {'file_path': self.root, 'isS3mirror': False}
+        self.db = Mock()
+        self.db.insert.return_value = 23
+
+    def tearDown(self):
+        DerivativeStoreHolder.set(None)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    @istest
+    def writes_the_png_and_queues_the_rest(self):
+        with patch.object(Config, 'get', return_value=self.media):
+            with patch.object(media_tasks, 'enqueue') as enqueue:
+                id = ImageServer.add(self.db, image_data((300, 200), 'JPEG'), 'giveaminute', [100, 100], defer=True)
+                path = ImageServer.path('giveaminute', 23)
+
+        assert_equal(id, 23)
+        assert_equal(Image.open(path).size, (100, 100))
+        assert_is_none(self.store.get(23, 'exact', 60, 60, 'png'))
+        enqueue.assert_called_once_with('image', {'app': 'giveaminute', 'id': 23, 'mirror': True,
+                                                  'thumb_max_size': None})
+
+    @istest
+    def serves_the_png_before_it_is_processed(self):
+        server = ImageServer.__new__(ImageServer)
+        server.cache = Mock()
+        server.cache.get = Mock(return_value=None)
+        db = Mock()
+        db.query = Mock(return_value=[web.storage(id=23)])
+
+        with patch.object(Config, 'get', return_value=self.media):
+            with patch.object(Controller, 'get_db', return_value=db):
+                with patch.object(media_tasks, 'enqueue'):
+                    ImageServer.add(self.db, image_data((300, 200), 'JPEG'), 'giveaminute', defer=True)
+                    data = server.GET('giveaminute', 'bounded', '80', '80', '23')
+
+        assert_equal(Image.open(StringIO(data)).size, (80, 53))
+
+    @istest
+    def processes_the_png_into_the_thumbnail_and_derivatives(self):
+        with patch.object(Config, 'get', return_value=self.media):
+            with patch.object(media_tasks, 'enqueue', side_effect=media_tasks.run):
+                ImageServer.add(self.db, image_data((300, 200), 'JPEG'), 'giveaminute', [100, 100],
+                                thumb_max_size=[50, 50], defer=True)
+                path = ImageServer.path('giveaminute', 23)
+
+        assert_equal(Image.open(path).size, (100, 100))
+        assert_equal(Image.open(path[:-4] + "_thumb.png").size, (50, 50))
+        assert_is_not_none(self.store.get(23, 'exact', 60, 60, 'png'))
+
+class Test_S3FileServer_process (TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.fs = S3FileServer(None)
+        self.fs.getConfigVar = Mock(return_value={'file_path': self.root, 'isS3mirror': False})
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    @istest
+    def makes_every_thumbnail_from_one_decode(self):
+        with patch.object(Config, 'get', return_value={'file_path': self.root}):
+            self.fs.saveFile('abc-photo', image_data((800, 600), 'JPEG'), mirror=False)
+
+            with patch('framework.image_pipeline.decode', wraps=framework.image_pipeline.decode) as decode:
+                assert_true(self.fs.process('abc-photo', [('abc-photo_thumb_small', (100, 100)),
+                                                          ('abc-photo_thumb_large', (360, 360))]))
+
+        assert_equal(decode.call_count, 1)
+        small = Image.open(os.path.join(self.root, 'abc-photo_thumb_small'))
+        assert_equal((small.format, small.size), ('JPEG', (100, 75)))
+        assert_equal(Image.open(os.path.join(self.root, 'abc-photo_thumb_large')).size, (360, 270))
+
+    @istest
+    def is_pending_until_processed(self):
+        with patch.object(Config, 'get', return_value={'file_path': self.root}):
+            self.fs.saveFile('abc-photo', image_data((800, 600), 'JPEG'), mirror=False)
+            self.fs.markPending('abc-photo')
+            assert_true(self.fs.isPending('abc-photo'))
+
+            assert_true(self.fs.process('abc-photo', [('abc-photo_thumb_small', (100, 100))]))
+            assert_false(self.fs.isPending('abc-photo'))
+
+    @istest
+    def links_pending_thumbnails_to_the_local_copy(self):
+        with patch.object(Config, 'get', return_value={'file_path': self.root, 'root': 'http://media/'}):
+            self.fs.markPending('abc-photo')
+            assert_equal(mProject.getAttachmentThumbUrl('image', 'abc-photo', 'small'),
+                         '/create/attachment?media_id=abc-photo&size=small')
+
+            self.fs.clearPending('abc-photo')
+            assert_equal(mProject.getAttachmentThumbUrl('image', 'abc-photo', 'small'),
+                         'http://media/abc-photo_thumb_small')
@@ -0,0 +1,71 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+from datetime import datetime
+
+from unittest2 import TestCase
+from nose.tools import *
+from mock import Mock
+
+# Load the controller first to sidestep the circular model imports.
+import framework.controller
+import giveaminute.project as mProject
+from giveaminute.user import User
+
+class Test_messageCursor (TestCase):
+
+    @istest
+    def round_trips_the_created_datetime_and_id(self):
+        cursor = mProject.messageCursor(datetime(2011, 8, 1, 12, 30, 5), 42)
+
+        assert_equal(mProject.parseMessageCursor(cursor), (datetime(2011, 8, 1, 12, 30, 5), 42))
+
+    @istest
+    def round_trips_negative_ids(self):
+        cursor = mProject.messageCursor(datetime(2011, 8, 1), -7)
+
+        assert_equal(mProject.parseMessageCursor(cursor), (datetime(2011, 8, 1), -7))
+
+    @istest
+    def ignores_malformed_cursors(self):
+        assert_is_none(mProject.parseMessageCursor('garbage'))
+        assert_is_none(mProject.parseMessageCursor('20110801_x'))
+
+class Test_getMessages (TestCase):
+
+    def setUp(self):
+        self.db = Mock()
+        self.db.query = Mock(return_value=[])
+
+    @istest
+    def reads_from_the_top_without_a_cursor(self):
+        mProject.getMessages(self.db, 1, 10, 20)
+
+        sql, vars = self.db.query.call_args[0]
+        assert_false('$beforeDatetime' in sql)
+        assert_equal(vars['offset'], 20)
+
+    @istest
+    def reads_after_the_cursor_instead_of_the_offset(self):
+        cursor = mProject.messageCursor(datetime(2011, 8, 1), 42)
+
+        mProject.getMessages(self.db, 1, 10, 20, before=cursor)
+
+        sql, vars = self.db.query.call_args[0]
+        assert_true('$beforeDatetime' in sql)
+        assert_equal(vars['offset'], 0)
+        assert_equal((vars['beforeDatetime'], vars['beforeId']), (datetime(2011, 8, 1), 42))
+
+    @istest
+    def user_feed_reads_the_inbox_after_the_cursor(self):
+        user = User(self.db, 3)
+        cursor = mProject.messageCursor(datetime(2011, 8, 1), 5)
+
+        user.getMessages(10, 20, cursor)
+
+        sql, vars = self.db.query.call_args[0]
+        assert_true('ui.created_datetime < $beforeDatetime' in sql)
+        assert_equal(vars['offset'], 0)
+        assert_equal(vars['beforeId'], 5)
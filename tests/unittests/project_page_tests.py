@@ -0,0 +1,105 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+from datetime import datetime
+
+from unittest2 import TestCase
+from nose.tools import *
+from mock import Mock
+
+from lib import web
+
+# Load the controller first to sidestep the circular model imports.
+import framework.controller
+import giveaminute.project as mProject
+
+def page_row(**kwargs):
+    row = web.storage((name, None) for name in mProject.PAGE_DATA_COLUMNS)
+    row.update(kwargs)
+    return row
+
+class Test_Project_getFullDictionary (TestCase):
+
+    def setUp(self):
+        self.project_row = web.storage(
+            project_id=1, title=u'Garden', description=u'Grow things',
+            keywords=u'garden food', image_id=None, is_active=1,
+            is_featured=0, is_official=0, num_members=2, location_id=5,
+            location_name=u'Downtown', location_lat=1.0, location_lon=2.0,
+            owner_user_id=3, owner_first_name=u'Mjumbe', owner_last_name=u'Poe',
+            owner_email=u'mjumbe@example.com', owner_image_id=None,
+            owner_affiliation=None, owner_group_membership_bitmask=1)
+
+        self.page_rows = [
+            page_row(section='message', item_id=7, user_id=3,
+                     first_name=u'Mjumbe', last_name=u'Poe',
+                     group_membership_bitmask=1, message_type='member_comment',
+                     body=u'Hello', created_datetime=datetime(2011, 8, 2, 12)),
+            page_row(section='idea', item_id=11, user_id=None,
+                     idea_description=u'More trees', idea_submission_type='web',
+                     created_datetime=datetime(2011, 8, 1)),
+            page_row(section='member', item_id=3, user_id=3,
+                     first_name=u'Mjumbe', last_name=u'Poe',
+                     group_membership_bitmask=1),
+            page_row(section='link', item_id=9, title=u'Blog',
+                     url=u'http://example.com/'),
+            page_row(section='resource', item_id=4, title=u'Seed Co.',
+                     url=u'http://seeds.example.com/', is_official=1),
+        ]
+
+        self.db = Mock()
+        self.db.query = Mock(side_effect=[[self.project_row], self.page_rows])
+
+    @istest
+    def loads_the_page_in_two_queries(self):
+        project = mProject.Project(self.db, 1)
+        project.getFullDictionary()
+
+        assert_equal(self.db.query.call_count, 2)
+        assert_equal(project.numQueries, 2)
+
+    @istest
+    def assembles_each_section_of_the_page(self):
+        project = mProject.Project(self.db, 1)
+        info = project.getFullDictionary()['info']
+
+        assert_equal(info['members']['items'], [{'u_id': 3, 'image_id': None, 'name': u'Mjumbe P.'}])
+        assert_equal(info['endorsements']['items'], [])
+        assert_equal(info['resources']['links']['items'],
+                     [{'link_id': 9, 'title': u'Blog', 'url': u'http://example.com/', 'image_id': None}])
+        assert_equal(info['resources']['organizations']['items'][0]['organization'], 4)
+        assert_equal(info['messages']['n_returned'], 1)
+        assert_equal(info['messages']['items'][0]['body'], u'Hello')
+        assert_equal(info['related_ideas']['items'][0]['message'], u'More trees')
+        assert_is_none(info['related_ideas']['items'][0]['owner'])
+
+    @istest
+    def looks_for_related_ideas_by_keyword(self):
+        mProject.Project(self.db, 1).getFullDictionary()
+
+        assert_equal(self.db.query.call_args[0][0], mProject.PAGE_DATA_SQL)
+
+    @istest
+    def skips_related_ideas_without_keywords(self):
+        self.project_row.keywords = u''
+        self.page_rows = [row for row in self.page_rows if row.section != 'idea']
+        self.db.query = Mock(side_effect=[[self.project_row], self.page_rows])
+
+        info = mProject.Project(self.db, 1).getFullDictionary()['info']
+
+        assert_equal(self.db.query.call_args[0][0], mProject.PAGE_DATA_NO_IDEAS_SQL)
+        assert_not_in("'idea'", mProject.PAGE_DATA_NO_IDEAS_SQL)
+        assert_equal(info['related_ideas']['items'], [])
+
+    @istest
+    def builds_the_conversation_feed_from_the_messages_only(self):
+        self.db.query = Mock(side_effect=[[self.project_row], []])
+
+        project = mProject.Project(self.db, 1)
+        data = project.getConversationDictionary()
+
+        assert_equal(data['info']['title'], u'Garden')
+        assert_equal(data['info']['messages']['items'], [])
+        assert_equal(project.numQueries, 2)
@@ -3,6 +3,7 @@
     :license: Affero GNU GPL v3, see LICENSE for more details.
 """
 
+import json
 from unittest2 import TestCase
 from nose.tools import *
 from mock import Mock
@@ -13,7 +14,10 @@ from mock import Mock
 
 from controllers.rest import Serializer
 from controllers.rest import NeedInstance
+from controllers.rest import PopularKeywordList
+from controllers.rest import RestController
 from giveaminute import models
+from lib import web
 
 class Test_Serializer_get_fields (TestCase):
 
@@ -33,3 +37,100 @@ class Test_Serializer_get_fields (TestCase):
 
 #    @istest
 #    def should_return_the_set_of_field_names_and_keys_to_use_for_a_model_instance(self):
+
+
+class Test_Serializer_field_plans (TestCase):
+
+    @istest
+    def should_compile_each_field_once_per_serializer_class(self):
+        class RenamingSerializer (Serializer):
+            rename = {'f1': 'first'}
+
+        serializer = RenamingSerializer()
+        serializer.serialize([{'f1': 'a', 'f2': 1}, {'f1': 'b', 'f2': 2}])
+
+        plan = serializer.get_field_plan('f1')
+        assert_equal(plan.key, 'first')
+        assert_true(plan is RenamingSerializer().get_field_plan('f1'))
+
+    @istest
+    def should_use_serializer_methods_for_fields(self):
+        class MethodSerializer (Serializer):
+            fields = ('name', 'shout')
+
+            def shout(self, obj):
+                return obj['name'].upper()
+
+        serialized = MethodSerializer().serialize({'name': 'garden', 'other': 1})
+
+        assert_equal(serialized, {'name': 'garden', 'shout': 'GARDEN'})
+
+    @istest
+    def should_reuse_on_the_fly_serializers_for_nested_fields(self):
+        class NestedSerializer (Serializer):
+            fields = ('name', ('owner', ('first_name',)))
+
+        serializer = NestedSerializer()
+        serialized = serializer.serialize({'name': 'garden', 'owner': {'first_name': 'Mjumbe', 'salt': 'x'}})
+
+        assert_equal(serialized, {'name': 'garden', 'owner': {'first_name': 'Mjumbe'}})
+        assert_true(serializer.get_field_plan('owner').serializer is
+                    NestedSerializer().get_field_plan('owner').serializer)
+
+
+class Test_RestController_column_plan (TestCase):
+
+    @istest
+    def should_unescape_only_varchar_columns(self):
+        controller = RestController.__new__(RestController)
+        need = models.Need(id=1, request=u'Caf&#233; painters', description=u'a &amp; b', quantity=5)
+
+        need_dict = controller.instance_to_dict(need)
+
+        assert_equal(need_dict['request'], u'Caf\xe9 painters')
+        assert_equal(need_dict['description'], u'a &amp; b')
+        assert_equal(need_dict['quantity'], 5)
+        assert_is_none(need_dict['address'])
+
+
+class Test_RestController_conditional_get (TestCase):
+
+    def setUp(self):
+        web.ctx.method = 'GET'
+        web.ctx.fullpath = '/rest/v1/keywords/'
+        web.ctx.env = {'REQUEST_METHOD':'GET'}
+        web.ctx.headers = []
+        web.ctx.status = '200 OK'
+
+        self.controller = PopularKeywordList.__new__(PopularKeywordList)
+        self.controller.user = None
+        self.controller.cache = Mock()
+        self.controller.cache.namespace_version = Mock(return_value=7)
+        self.controller.replace_gam_user_with_sqla_user = Mock()
+        self.controller.parameters = Mock(return_value={})
+        self.controller.REST_INDEX = Mock(return_value=[{'name':'garden', 'count':3}])
+
+    @istest
+    def should_answer_from_the_version_without_building_the_response(self):
+        etag, last_modified = self.controller.get_version('REST_INDEX')
+        web.ctx.env['HTTP_IF_NONE_MATCH'] = '"%s"' % etag
+
+        assert_equal(self.controller.GET(), '')
+        assert_equal(web.ctx.status, '304 Not Modified')
+        assert_false(self.controller.REST_INDEX.called)
+
+    @istest
+    def should_send_the_response_with_its_version_when_it_has_changed(self):
+        web.ctx.env['HTTP_IF_NONE_MATCH'] = '"stale"'
+
+        assert_equal(json.loads(self.controller.GET()), [{'name':'garden', 'count':3}])
+        assert_equal(web.ctx.status, '200 OK')
+        assert_equal([value for key, value in web.ctx.headers if key == 'ETag'],
+                     ['"%s"' % self.controller.get_version('REST_INDEX')[0]])
+
+    @istest
+    def should_change_version_when_the_keyword_stats_do(self):
+        etag, last_modified = self.controller.get_version('REST_INDEX')
+        self.controller.cache.namespace_version.return_value = 8
+
+        assert_not_equal(self.controller.get_version('REST_INDEX')[0], etag)
@@ -0,0 +1,118 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+from datetime import datetime
+
+from unittest2 import TestCase
+from nose.tools import *
+from mock import Mock
+
+from lib import web
+from framework.cache_holder import CacheHolder
+from unittests.fakes import stub_cache
+
+# Load the controller first to sidestep the circular model imports.
+import framework.controller
+import giveaminute.location as mLocation
+import giveaminute.search as mSearch
+
+def search_row(**kwargs):
+    row = web.storage((name, None) for name in mSearch.SEARCH_COLUMNS)
+    row.update(kwargs)
+    return row
+
+class Test_search (TestCase):
+
+    def setUp(self):
+        stub_cache(ttl=60)
+
+        self.rows = [
+            search_row(section='projects', item_id=1, title=u'Garden',
+                       user_id=3, first_name=u'Mjumbe', last_name=u'Poe',
+                       group_membership_bitmask=1, num_members=2),
+            search_row(section='projects', item_id=2, title=u'Bikes',
+                       user_id=3, first_name=u'Mjumbe', last_name=u'Poe',
+                       group_membership_bitmask=1, num_members=5),
+            search_row(section='projects_total', total=12),
+            search_row(section='resources', item_id=4, title=u'Seed Co.',
+                       url=u'http://seeds.example.com/', is_official=1,
+                       created_datetime=datetime(2011, 8, 1)),
+            search_row(section='resources_total', total=1),
+            search_row(section='ideas', item_id=7, description=u'More trees',
+                       submission_type=u'web', created_datetime=datetime(2011, 8, 2)),
+            search_row(section='ideas_total', total=3),
+        ]
+
+        self.db = Mock()
+        self.db.query = Mock(return_value=self.rows)
+
+    def tearDown(self):
+        CacheHolder.set(None)
+
+    @istest
+    def searches_everything_in_one_query(self):
+        data = mSearch.search(self.db, [u'garden'], None, 6, 0)
+
+        assert_equal(self.db.query.call_count, 1)
+        assert_equal(data['total_count'], dict(projects=12, resources=1, ideas=3))
+        assert_equal([p['project_id'] for p in data['results']['projects']], [2, 1])
+        assert_equal(data['results']['resources'][0]['link_id'], 4)
+        assert_equal(data['results']['ideas'][0]['message'], u'More trees')
+        assert_is_none(data['results']['ideas'][0]['owner'])
+
+    @istest
+    def caches_equivalent_searches_together(self):
+        mSearch.search(self.db, [u'Garden', u'food'], '5', 6, 0)
+        mSearch.search(self.db, [u'food', u'garden', u'food'], 5, 6, 0)
+
+        assert_equal(self.db.query.call_count, 1)
+
+    @istest
+    def only_selects_the_requested_entities(self):
+        self.db.query.return_value = [row for row in self.rows if row.section.startswith('ideas')]
+        data = mSearch.search(self.db, [], None, 6, 0, ['ideas'])
+
+        sql = self.db.query.call_args[0][0]
+        assert_not_in('from project p', sql)
+        assert_equal(data['results'].keys(), ['ideas'])
+        assert_equal(data['total_count'], dict(ideas=3))
+
+    @istest
+    def can_skip_the_counts(self):
+        self.db.query.return_value = [row for row in self.rows if row.section == 'ideas']
+        data = mSearch.search(self.db, [], None, 6, 0, ['ideas'], withCounts = False)
+
+        sql = self.db.query.call_args[0][0]
+        assert_not_in('count(*)', sql)
+        assert_equal(data['results']['ideas'][0]['message'], u'More trees')
+        assert_is_none(data['total_count'])
+
+    @istest
+    def does_not_cache_a_failed_search(self):
+        self.db.query.side_effect = [Exception('db went away'), self.rows]
+
+        assert_equal(mSearch.search(self.db, [], None)['results']['projects'], [])
+        assert_equal(len(mSearch.search(self.db, [], None)['results']['projects']), 2)
+
+class Test_getScoredLocations (TestCase):
+
+    def setUp(self):
+        stub_cache(ttl=60)
+
+    def tearDown(self):
+        CacheHolder.set(None)
+
+    @istest
+    def does_not_cache_a_failed_or_empty_lookup(self):
+        db = Mock()
+        db.query = Mock(side_effect=[Exception('db went away'), [],
+                                     [web.storage(location_id=7, name=u'Bronx', lat=1, lon=2,
+                                                  num_projects=1, num_ideas=2, num_project_resources=0)]])
+
+        assert_equal(mLocation.getScoredLocations(db), [])
+        assert_equal(mLocation.getScoredLocations(db), [])
+        assert_equal(mLocation.getScoredLocations(db)[0]['score'], 3)
+        assert_equal(mLocation.getScoredLocations(db)[0]['score'], 3)
+        assert_equal(db.query.call_count, 3)
@@ -0,0 +1,205 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+import os
+import tempfile
+from datetime import datetime
+
+from unittest2 import TestCase
+from nose.tools import *
+from mock import Mock, patch
+
+from lib import web
+
+# Load the controller first to sidestep the circular model imports.
+import framework.controller
+import giveaminute.searchindex as mSearchIndex
+import giveaminute.search as mSearch
+
+def project_row(item_id, title, num_members=0, location_id=1, **kwargs):
+    row = web.storage(item_id=item_id, title=title, description=u'',
+                      keywords=u'', location_id=location_id,
+                      num_members=num_members, is_searchable=1,
+                      updated_datetime=datetime(2011, 8, 1))
+    row.update(kwargs)
+    return row
+
+def idea_row(item_id, description, created_datetime, **kwargs):
+    row = web.storage(item_id=item_id, description=description,
+                      location_id=1, created_datetime=created_datetime,
+                      is_searchable=1, updated_datetime=created_datetime)
+    row.update(kwargs)
+    return row
+
+class Test_SearchIndex (TestCase):
+
+    def setUp(self):
+        self.index = mSearchIndex.SearchIndex()
+        self.index.put('projects', project_row(1, u'Community Garden', num_members=2))
+        self.index.put('projects', project_row(2, u'Bike Lanes', num_members=5,
+                                               description=u'Safer streets for gardeners'))
+        self.index.put('projects', project_row(3, u'Park Benches', num_members=9, location_id=2))
+
+    @istest
+    def matches_term_prefixes_in_any_field(self):
+        rows, total = self.index.search('projects', [u'garden'], None, 10, 0)
+
+        assert_equal(total, 2)
+        assert_equal(set([row.item_id for row in rows]), set([1, 2]))
+
+    @istest
+    def ranks_title_matches_above_description_matches(self):
+        rows, total = self.index.search('projects', [u'garden'], None, 10, 0)
+
+        assert_equal([row.item_id for row in rows], [1, 2])
+
+    @istest
+    def matches_any_of_the_terms(self):
+        rows, total = self.index.search('projects', [u'bike', u'park'], None, 10, 0)
+
+        assert_equal(total, 2)
+
+    @istest
+    def only_the_end_of_a_term_is_a_prefix(self):
+        rows, total = self.index.search('projects', [u'gard comm'], None, 10, 0)
+
+        assert_equal([row.item_id for row in rows], [1])
+
+    @istest
+    def orders_by_members_without_terms(self):
+        rows, total = self.index.search('projects', [], None, 10, 0)
+
+        assert_equal([row.item_id for row in rows], [3, 2, 1])
+
+    @istest
+    def filters_by_location(self):
+        rows, total = self.index.search('projects', [], '2', 10, 0)
+
+        assert_equal([row.item_id for row in rows], [3])
+
+    @istest
+    def pages_the_results(self):
+        rows, total = self.index.search('projects', [], None, 2, 1)
+
+        assert_equal([row.item_id for row in rows], [2, 1])
+        assert_equal(total, 3)
+
+    @istest
+    def orders_ideas_by_date_without_terms(self):
+        self.index.put('ideas', idea_row(1, u'More trees', datetime(2011, 8, 1)))
+        self.index.put('ideas', idea_row(2, u'Fewer cars', datetime(2011, 8, 2)))
+
+        rows, total = self.index.search('ideas', [], None, 10, 0)
+
+        assert_equal([row.item_id for row in rows], [2, 1])
+
+    @istest
+    def replaces_changed_items(self):
+        self.index.put('projects', project_row(1, u'Community Orchard', num_members=2))
+
+        assert_equal(self.index.search('projects', [u'garden'], None, 10, 0)[1], 1)
+        assert_equal(self.index.search('projects', [u'orchard'], None, 10, 0)[1], 1)
+
+    @istest
+    def forgets_removed_items(self):
+        self.index.remove('projects', 1)
+
+        assert_equal(self.index.search('projects', [u'community'], None, 10, 0)[1], 0)
+        assert_false('community' in self.index.postings['projects'])
+
+    @istest
+    def update_puts_searchable_rows_and_removes_the_rest(self):
+        rows = dict(projects=[project_row(1, u'Community Garden', is_searchable=0,
+                                          updated_datetime=datetime(2011, 9, 1))],
+                    resources=[],
+                    ideas=[idea_row(5, u'More trees', datetime(2011, 9, 2))])
+        db = Mock()
+        db.query = Mock(side_effect=lambda sql, vars: rows[[entity for entity in rows if mSearchIndex.INDEX_SQL[entity] == sql][0]])
+
+        assert_equal(self.index.update(db), 2)
+
+        assert_equal(self.index.search('projects', [u'community'], None, 10, 0)[1], 0)
+        assert_equal(self.index.search('ideas', [u'trees'], None, 10, 0)[1], 1)
+        assert_equal(self.index.lastUpdated, datetime(2011, 9, 2))
+
+    @istest
+    def update_reads_only_rows_changed_since_the_last_update(self):
+        self.index.lastUpdated = datetime(2011, 9, 2)
+        db = Mock()
+        db.query = Mock(return_value=[])
+
+        self.index.update(db)
+
+        for args, kwargs in db.query.call_args_list:
+            assert_equal(args[1], {'since':datetime(2011, 9, 2)})
+
+    @istest
+    def saves_and_loads_a_snapshot(self):
+        self.index.lastUpdated = datetime(2011, 9, 2)
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+
+        try:
+            self.index.save(path)
+            index = mSearchIndex.SearchIndex.load(path)
+        finally:
+            os.remove(path)
+
+        assert_equal(index.lastUpdated, datetime(2011, 9, 2))
+        assert_equal([row.item_id for row in index.search('projects', [u'garden'], None, 10, 0)[0]], [1, 2])
+
+    @istest
+    def keeps_the_snapshot_private(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+
+        try:
+            self.index.save(path)
+            mode = os.stat(path).st_mode & 0777
+        finally:
+            os.remove(path)
+
+        assert_equal(mode, 0600)
+
+    @istest
+    def refuses_a_snapshot_others_could_have_written(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+
+        try:
+            self.index.save(path)
+            os.chmod(path, 0666)
+            assert_raises(IOError, mSearchIndex.SearchIndex.load, path)
+        finally:
+            os.remove(path)
+
+class Test_search_backend (TestCase):
+
+    @istest
+    def uses_the_index_when_enabled(self):
+        row = project_row(1, u'Community Garden', image_id=None, user_id=3,
+                          first_name=u'Mjumbe', last_name=u'Poe', affiliation=None,
+                          group_membership_bitmask=1, user_image_id=None)
+        db = Mock()
+
+        with patch.object(mSearchIndex, 'isEnabled', Mock(return_value=True)):
+            with patch.object(mSearchIndex, 'search', Mock(return_value=([row], 1))):
+                data = mSearch.searchAll(db, [u'garden'], None, entities=['projects'])
+
+        assert_equal(data['total_count'], {'projects':1})
+        assert_equal(data['results']['projects'][0]['project_id'], 1)
+        assert_false(db.query.called)
+
+    @istest
+    def falls_back_to_mysql_when_the_index_fails(self):
+        db = Mock()
+        db.query = Mock(return_value=[])
+
+        with patch.object(mSearchIndex, 'isEnabled', Mock(return_value=True)):
+            with patch.object(mSearchIndex, 'search', Mock(side_effect=Exception('boom'))):
+                data = mSearch.searchAll(db, [u'garden'], None, entities=['projects'])
+
+        assert_equal(data['total_count'], {'projects':0})
+        assert_true(db.query.called)
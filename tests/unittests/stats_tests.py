@@ -0,0 +1,226 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+from unittest2 import TestCase
+from nose.tools import *
+from mock import Mock
+
+from lib import web
+from unittests.fakes import stub_cache
+import giveaminute.location as mLocation
+import giveaminute.stats as mStats
+
+class Test_adjustProjectStats (TestCase):
+
+    def setUp(self):
+        stub_cache(ttl=60)
+
+    @istest
+    def upserts_the_counter_for_the_project(self):
+        db = Mock()
+
+        assert_true(mStats.adjustProjectStats(db, 5, 'num_members', 1))
+
+        sql, params = db.query.call_args_list[0][0]
+        assert_in('insert into project_stats (project_id, num_members)', sql)
+        assert_in('on duplicate key update num_members', sql)
+        assert_equal(params, {'projectId':5, 'delta':1})
+
+    @istest
+    def updates_the_leaderboard_when_the_members_change(self):
+        db = Mock()
+
+        mStats.adjustProjectStats(db, 5, 'num_members', 1)
+
+        sql, params = db.query.call_args[0]
+        assert_in('insert into project_leaderboard', sql)
+        assert_equal(params, {'projectId':5})
+
+    @istest
+    def refuses_unknown_columns(self):
+        db = Mock()
+
+        assert_false(mStats.adjustProjectStats(db, 5, 'project_id; drop table project', 1))
+        assert_false(db.query.called)
+
+    @istest
+    def reports_failure_when_the_query_fails(self):
+        db = Mock()
+        db.query.side_effect = Exception('db went away')
+
+        assert_false(mStats.adjustProjectStats(db, 5, 'num_ideas', -1))
+
+class Test_updateItemProjectStats (TestCase):
+
+    def setUp(self):
+        stub_cache(ttl=60)
+
+    def db_returning(self, *results):
+        db = Mock()
+        db.query.side_effect = list(results) + [None] * 10
+        return db
+
+    @istest
+    def decrements_every_project_of_a_deactivated_idea(self):
+        db = self.db_returning([], [web.storage(project_id=5), web.storage(project_id=6)])
+
+        assert_true(mStats.updateItemProjectStats(db, 'idea', 12, True))
+
+        adjusted = [call[0][1] for call in db.query.call_args_list if 'insert into project_stats' in call[0][0]]
+        assert_equal(adjusted, [{'projectId':5, 'delta':-1}, {'projectId':6, 'delta':-1}])
+
+    @istest
+    def counts_a_resource_only_while_it_is_active_and_shown(self):
+        db = self.db_returning([web.storage(project_resource_id=3)], [web.storage(project_id=5)])
+
+        mStats.updateItemProjectStats(db, 'project_resource', 3, False)
+
+        assert_in('is_active = 1 and is_hidden = 0', db.query.call_args_list[0][0][0])
+        assert_in({'projectId':5, 'delta':1}, [call[0][1] for call in db.query.call_args_list])
+
+    @istest
+    def leaves_the_counters_alone_when_nothing_changed(self):
+        db = self.db_returning([web.storage(user_id=7)])
+
+        assert_true(mStats.updateItemProjectStats(db, 'user', 7, True))
+        assert_equal(db.query.call_count, 1)
+
+class Test_adjustLocationStats (TestCase):
+
+    def setUp(self):
+        stub_cache(ttl=60)
+
+    @istest
+    def upserts_the_counter_for_the_location(self):
+        db = Mock()
+
+        assert_true(mStats.adjustLocationStats(db, 7, 'num_ideas', 1))
+
+        sql, params = db.query.call_args[0]
+        assert_in('insert into location_stats (location_id, num_ideas)', sql)
+        assert_in('on duplicate key update num_ideas', sql)
+        assert_equal(params, {'locationId':7, 'delta':1})
+
+    @istest
+    def refuses_unknown_columns(self):
+        db = Mock()
+
+        assert_false(mStats.adjustLocationStats(db, 7, 'num_members', 1))
+        assert_false(db.query.called)
+
+    @istest
+    def expires_the_cached_scores(self):
+        db = Mock()
+        db.query = Mock(return_value=[web.storage(location_id=7, name=u'Bronx', lat=1, lon=2,
+                                                  num_projects=1, num_ideas=0, num_project_resources=0)])
+        assert_equal(mLocation.getScoredLocations(db)[0]['score'], 1)
+
+        db.query.return_value = []
+        mStats.adjustLocationStats(db, 7, 'num_ideas', 1)
+
+        db.query.return_value = [web.storage(location_id=7, name=u'Bronx', lat=1, lon=2,
+                                             num_projects=1, num_ideas=1, num_project_resources=0)]
+        assert_equal(mLocation.getScoredLocations(db)[0]['score'], 2)
+
+class Test_updateItemLocationStats (TestCase):
+
+    def setUp(self):
+        stub_cache(ttl=60)
+
+    def counted_in(self, locationId):
+        db = Mock()
+        db.query = Mock(return_value=[web.storage(location_id=locationId)] if locationId else [])
+        return db
+
+    def adjustments(self, db):
+        return [(args[1]['locationId'], args[1]['delta'])
+                for args, kwargs in db.query.call_args_list
+                if 'location_stats' in args[0]]
+
+    @istest
+    def counts_a_new_item(self):
+        db = self.counted_in(3)
+
+        mStats.updateItemLocationStats(db, 'idea', 10, None)
+
+        assert_equal(self.adjustments(db), [(3, 1)])
+
+    @istest
+    def uncounts_a_deactivated_item(self):
+        db = self.counted_in(None)
+
+        mStats.updateItemLocationStats(db, 'project', 10, 3)
+
+        assert_equal(self.adjustments(db), [(3, -1)])
+
+    @istest
+    def moves_a_relocated_item(self):
+        db = self.counted_in(4)
+
+        mStats.updateItemLocationStats(db, 'project_resource', 10, 3)
+
+        assert_equal(self.adjustments(db), [(3, -1), (4, 1)])
+
+    @istest
+    def leaves_an_unchanged_item_alone(self):
+        db = self.counted_in(3)
+
+        mStats.updateItemLocationStats(db, 'idea', 10, 3)
+
+        assert_equal(self.adjustments(db), [])
+
+    @istest
+    def only_counts_visible_resources(self):
+        db = self.counted_in(3)
+
+        mStats.getCountedLocationId(db, 'project_resource', 10)
+
+        assert_in('is_hidden = 0', db.query.call_args[0][0])
+
+class Test_keywordStats (TestCase):
+
+    def setUp(self):
+        self.cache = stub_cache(max_items=0)
+
+    @istest
+    def upserts_a_counter_per_keyword(self):
+        db = Mock()
+
+        assert_true(mStats.adjustKeywordStats(db, ['garden', '', 'bikes'], -1))
+
+        sql, params = db.query.call_args[0]
+        assert_in('($keyword0, greatest($delta, 0)), ($keyword1, greatest($delta, 0))', sql)
+        assert_equal(params, {'keyword0':'garden', 'keyword1':'bikes', 'delta':-1})
+
+    @istest
+    def skips_the_query_without_keywords(self):
+        db = Mock()
+
+        assert_true(mStats.adjustKeywordStats(db, [], 1))
+        assert_false(db.query.called)
+
+    @istest
+    def only_counts_active_projects(self):
+        db = Mock()
+        db.query = Mock(return_value=[])
+
+        assert_true(mStats.adjustProjectKeywordStats(db, 5, -1))
+
+        sql, params = db.query.call_args[0]
+        assert_in('is_active = 1', sql)
+        assert_equal(db.query.call_count, 1)
+
+    @istest
+    def serves_the_popular_keywords_from_the_cache_until_they_change(self):
+        db = Mock()
+        db.query = Mock(return_value=[web.storage(keyword='garden', num_projects=3)])
+
+        assert_equal(mStats.getPopularKeywords(db, 10), [{'name':'garden', 'count':3}])
+        mStats.getPopularKeywords(db, 10)
+        assert_equal(db.query.call_count, 1)
+
+        mStats.adjustKeywordStats(db, ['bikes'], 1)
+        mStats.getPopularKeywords(db, 10)
+        assert_equal(db.query.call_count, 3)
@@ -0,0 +1,104 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+import os
+import shutil
+import tempfile
+
+from unittest2 import TestCase
+from nose.tools import *
+from mock import patch
+
+from framework.template_holder import TemplateHolder
+
+class Test_TemplateHolder (TestCase):
+
+    def setUp(self):
+        self.template_dir = tempfile.mkdtemp()
+        self.write_template('hello.html', 'Hello {{ name }}')
+        self.write_template('404.html', 'Not found')
+        self.write_template('email/hello.txt', '{{ _("Hello") }} {{ name }}')
+
+        self.old_template_dir = TemplateHolder.template_dir
+        TemplateHolder.template_dir = self.template_dir
+        TemplateHolder.environments = {}
+        TemplateHolder.render_stats = {}
+
+        self.languages = patch.object(TemplateHolder, 'get_languages', return_value=['en'])
+        self.languages.start()
+
+    def tearDown(self):
+        self.languages.stop()
+        TemplateHolder.template_dir = self.old_template_dir
+        TemplateHolder.environments = {}
+        TemplateHolder.render_stats = {}
+        shutil.rmtree(self.template_dir)
+
+    def write_template(self, name, source):
+        path = os.path.join(self.template_dir, name)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        f = open(path, 'w')
+        f.write(source)
+        f.close()
+
+    @istest
+    def reuses_the_environment_for_a_language(self):
+        environment = TemplateHolder.get_environment('en')
+
+        assert_is(TemplateHolder.get_environment('en'), environment)
+        assert_is_not(TemplateHolder.get_environment(None), environment)
+
+    @istest
+    def uses_the_default_environment_for_unknown_languages(self):
+        environment = TemplateHolder.get_environment('')
+
+        assert_is(TemplateHolder.get_environment('xx_NOPE'), environment)
+        assert_is(TemplateHolder.get_environment('<script>'), environment)
+        assert_equal(TemplateHolder.environments.keys(), [''])
+
+    @istest
+    def renders_and_counts_each_template(self):
+        assert_equal(TemplateHolder.render('hello.html', {'name':'Mjumbe'}), u'Hello Mjumbe')
+        assert_equal(TemplateHolder.render('hello.html', {'name':'Poe'}), u'Hello Poe')
+
+        stats = TemplateHolder.get_render_stats()
+        assert_equal(stats['hello.html']['count'], 2)
+
+    @istest
+    def falls_back_to_the_404_template(self):
+        assert_equal(TemplateHolder.render('missing.html', {}), u'Not found')
+
+    @istest
+    def warm_up_compiles_every_template_for_each_language(self):
+        assert_equal(TemplateHolder.warm_up(['en']), 9)
+        assert_equal(TemplateHolder.render('email/hello.txt', {'name':'Mjumbe'}, 'en'), u'Hello Mjumbe')
+
+class Test_TemplateHolder_bytecode_cache (TestCase):
+
+    def setUp(self):
+        TemplateHolder._bytecode_cache = None
+        TemplateHolder._bytecode_cache_checked = False
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        TemplateHolder._bytecode_cache = None
+        TemplateHolder._bytecode_cache_checked = False
+        shutil.rmtree(self.cache_dir)
+
+    @istest
+    def is_off_without_a_configured_directory(self):
+        with patch('framework.template_holder.Config.get', side_effect=KeyError('template_cache_path')):
+            assert_is_none(TemplateHolder.get_bytecode_cache())
+
+    @istest
+    def creates_a_private_directory(self):
+        path = os.path.join(self.cache_dir, 'templates')
+
+        with patch('framework.template_holder.Config.get', return_value=path):
+            cache = TemplateHolder.get_bytecode_cache()
+
+        assert_equal(cache.directory, path)
+        assert_equal(os.stat(path).st_mode & 0777, 0700)
@@ -0,0 +1,131 @@
+"""
+    :copyright: (c) 2011 Local Projects, all rights reserved
+    :license: Affero GNU GPL v3, see LICENSE for more details.
+"""
+
+from datetime import datetime
+
+from unittest2 import TestCase
+from nose.tools import *
+from mock import Mock
+
+from lib import web
+from unittests.fakes import FakeMemcache, stub_cache
+
+# Load the controller first to sidestep the circular model imports.
+import framework.controller
+import giveaminute.user as mUser
+import giveaminute.inbox as mInbox
+
+class Test_getCachedUser (TestCase):
+
+    def setUp(self):
+        self.user_row = web.storage(
+            user_key=u'abc', email=u'mjumbe@example.com', password=u'hash',
+            salt=u'salt', phone=None, first_name=u'Mjumbe', last_name=u'Poe',
+            image_id=None, location_id=5, location_name=u'Downtown',
+            description=None, affiliation=None, group_membership_bitmask=1,
+            email_notification=u'digest',
+            last_account_page_access_datetime=datetime(2011, 8, 1),
+            title=None, organization=None)
+        self.project_rows = [web.storage(project_id=1, title=u'Garden', is_project_admin=1)]
+        self.count_rows = [web.storage(total=2)]
+
+        self.db = Mock()
+        self.db.query = Mock(side_effect=[[self.user_row], self.project_rows, self.count_rows])
+        self.cache = FakeMemcache()
+        self.shared_cache = stub_cache(max_items=0)
+
+    @istest
+    def loads_from_the_db_and_stores_a_snapshot(self):
+        user = mUser.getCachedUser(self.db, self.cache, 3)
+
+        assert_equal(self.db.query.call_count, 3)
+        assert_equal(user.firstName, u'Mjumbe')
+        assert_equal(user.numNewMessages, 2)
+        assert_equal(len(self.cache.values), 1)
+
+    @istest
+    def rebuilds_the_user_from_the_snapshot_without_queries(self):
+        first = mUser.getCachedUser(self.db, self.cache, 3)
+        second = mUser.getCachedUser(self.db, self.cache, 3)
+
+        assert_equal(self.db.query.call_count, 3)
+        assert_equal(second.getDictionary(), first.getDictionary())
+
+    @istest
+    def leaves_the_password_out_of_the_snapshot(self):
+        mUser.getCachedUser(self.db, self.cache, 3)
+
+        snapshot = self.cache.values.values()[0]
+        assert_not_in('password', snapshot['data'])
+        assert_not_in('salt', snapshot['data'])
+
+    @istest
+    def reloads_the_user_after_it_is_expired(self):
+        mUser.getCachedUser(self.db, self.cache, 3)
+        mUser.expireCachedUser(self.cache, 3)
+
+        self.db.query.side_effect = [[self.user_row], []]
+        user = mUser.getCachedUser(self.db, self.cache, 3)
+
+        assert_equal(self.db.query.call_count, 5)
+        assert_equal(user.projectData, [])
+
+    @istest
+    def reads_the_unread_count_fresh_for_a_snapshot(self):
+        mUser.getCachedUser(self.db, self.cache, 3)
+        mInbox.incrUnreadCounts([3])
+
+        user = mUser.getCachedUser(self.db, self.cache, 3)
+
+        assert_equal(user.numNewMessages, 3)
+        assert_equal(self.db.query.call_count, 3)
+
+class Test_inbox (TestCase):
+
+    def setUp(self):
+        self.shared_cache = stub_cache(max_items=0)
+        self.db = Mock()
+
+    @istest
+    def counts_unread_items_once_then_reads_the_counter(self):
+        self.db.query = Mock(return_value=[web.storage(total=4)])
+
+        assert_equal(mInbox.getUnreadCount(self.db, 3, datetime(2011, 8, 1)), 4)
+        assert_equal(mInbox.getUnreadCount(self.db, 3, datetime(2011, 8, 1)), 4)
+        assert_equal(self.db.query.call_count, 1)
+
+    @istest
+    def delivers_a_message_to_every_member(self):
+        self.shared_cache.set(mInbox.unreadCountKey(3), 1)
+        self.db.query = Mock(side_effect=[1, [web.storage(user_id=3), web.storage(user_id=4)]])
+
+        assert_true(mInbox.addMessage(self.db, 1, 10))
+
+        sql, vars = self.db.query.call_args_list[0][0]
+        assert_equal(sql, mInbox.MESSAGE_FANOUT_SQL)
+        assert_equal(vars, {'messageId':10, 'projectId':1, 'userId':None})
+        assert_equal(self.shared_cache.get(mInbox.unreadCountKey(3)), 2)
+        assert_is_none(self.shared_cache.get(mInbox.unreadCountKey(4)))
+
+    @istest
+    def reconciles_the_inbox_without_emptying_it(self):
+        self.shared_cache.set(mInbox.unreadCountKey(3), 5)
+        self.db.query = Mock(return_value=0)
+
+        assert_true(mInbox.reconcileInbox(self.db, 3))
+
+        statements = [args[0] for args, kwargs in self.db.query.call_args_list]
+        assert_equal(statements, [mInbox.MESSAGE_FANOUT_SQL, mInbox.INVITE_FANOUT_SQL,
+                                  mInbox.STALE_MESSAGES_SQL, mInbox.STALE_INVITES_SQL])
+        assert_is_none(self.shared_cache.get(mInbox.unreadCountKey(3)))
+
+    @istest
+    def marking_read_resets_the_counter(self):
+        self.shared_cache.set(mInbox.unreadCountKey(3), 5)
+
+        mInbox.markRead(3)
+
+        assert_equal(mInbox.getUnreadCount(self.db, 3, datetime(2011, 8, 1)), 0)
+        assert_false(self.db.query.called)